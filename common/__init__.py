@@ -0,0 +1 @@
+# Code shared by the sales agent servers (src/, sales_bot/) and the quote bot
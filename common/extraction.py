@@ -0,0 +1,234 @@
+"""
+Local intent and slot extraction for inbound SMS.
+
+The vocabularies below are compiled into one case-insensitive regex each when the module is imported, so
+pulling the vehicle, services, car condition, intent and location out of a message is a handful of regex
+scans (microseconds) rather than an LLM round trip. The agents route on these slots and keep them in the
+conversation context, so the LLM only has to write the reply.
+"""
+import re
+from typing import Any, Dict, Iterable, List, Optional
+
+from common.text_patterns import ADDRESS_PATTERN
+
+# Spellings customers use for each make
+VEHICLE_MAKES = {
+    'acura': 'Acura', 'audi': 'Audi', 'bmw': 'BMW', 'buick': 'Buick', 'cadillac': 'Cadillac',
+    'chevrolet': 'Chevrolet', 'chevy': 'Chevrolet', 'chrysler': 'Chrysler', 'dodge': 'Dodge', 'ford': 'Ford',
+    'genesis': 'Genesis', 'gmc': 'GMC', 'honda': 'Honda', 'hyundai': 'Hyundai', 'infiniti': 'Infiniti',
+    'jaguar': 'Jaguar', 'jeep': 'Jeep', 'kia': 'Kia', 'land rover': 'Land Rover', 'range rover': 'Land Rover',
+    'lexus': 'Lexus', 'lincoln': 'Lincoln', 'mazda': 'Mazda', 'mercedes': 'Mercedes-Benz',
+    'mercedes-benz': 'Mercedes-Benz', 'benz': 'Mercedes-Benz', 'mini': 'MINI', 'mitsubishi': 'Mitsubishi',
+    'nissan': 'Nissan', 'porsche': 'Porsche', 'ram': 'Ram', 'rivian': 'Rivian', 'subaru': 'Subaru',
+    'tesla': 'Tesla', 'toyota': 'Toyota', 'volkswagen': 'Volkswagen', 'vw': 'Volkswagen', 'volvo': 'Volvo'
+}
+
+# Models with their make and size, so "my tacoma" is enough to know it's a Toyota truck
+VEHICLE_MODELS = {
+    'Camry': ('Toyota', 'sedan'), 'Corolla': ('Toyota', 'sedan'), 'Prius': ('Toyota', 'sedan'),
+    'RAV4': ('Toyota', 'suv'), 'Highlander': ('Toyota', 'suv'), '4Runner': ('Toyota', 'suv'),
+    'Sequoia': ('Toyota', 'suv'), 'Sienna': ('Toyota', 'van'), 'Tacoma': ('Toyota', 'truck'),
+    'Tundra': ('Toyota', 'truck'), 'Civic': ('Honda', 'sedan'), 'Accord': ('Honda', 'sedan'),
+    'CR-V': ('Honda', 'suv'), 'Pilot': ('Honda', 'suv'), 'Odyssey': ('Honda', 'van'),
+    'Ridgeline': ('Honda', 'truck'), 'F-150': ('Ford', 'truck'), 'F-250': ('Ford', 'truck'),
+    'Ranger': ('Ford', 'truck'), 'Maverick': ('Ford', 'truck'), 'Mustang': ('Ford', 'coupe'),
+    'Explorer': ('Ford', 'suv'), 'Escape': ('Ford', 'suv'), 'Expedition': ('Ford', 'suv'),
+    'Bronco': ('Ford', 'suv'), 'Silverado': ('Chevrolet', 'truck'), 'Colorado': ('Chevrolet', 'truck'),
+    'Tahoe': ('Chevrolet', 'suv'), 'Suburban': ('Chevrolet', 'suv'), 'Equinox': ('Chevrolet', 'suv'),
+    'Traverse': ('Chevrolet', 'suv'), 'Malibu': ('Chevrolet', 'sedan'), 'Camaro': ('Chevrolet', 'coupe'),
+    'Corvette': ('Chevrolet', 'coupe'), 'Sierra': ('GMC', 'truck'), 'Yukon': ('GMC', 'suv'),
+    'Wrangler': ('Jeep', 'suv'), 'Grand Cherokee': ('Jeep', 'suv'), 'Cherokee': ('Jeep', 'suv'),
+    'Gladiator': ('Jeep', 'truck'), 'Rebel': ('Ram', 'truck'), 'ProMaster': ('Ram', 'van'),
+    'Charger': ('Dodge', 'sedan'), 'Challenger': ('Dodge', 'coupe'), 'Durango': ('Dodge', 'suv'),
+    'Altima': ('Nissan', 'sedan'), 'Sentra': ('Nissan', 'sedan'), 'Rogue': ('Nissan', 'suv'),
+    'Pathfinder': ('Nissan', 'suv'), 'Frontier': ('Nissan', 'truck'), 'Titan': ('Nissan', 'truck'),
+    'Model 3': ('Tesla', 'sedan'), 'Model S': ('Tesla', 'sedan'), 'Model Y': ('Tesla', 'suv'),
+    'Model X': ('Tesla', 'suv'), 'Cybertruck': ('Tesla', 'truck'), 'Outback': ('Subaru', 'suv'),
+    'Forester': ('Subaru', 'suv'), 'Crosstrek': ('Subaru', 'suv'), 'WRX': ('Subaru', 'sedan'),
+    'Elantra': ('Hyundai', 'sedan'), 'Sonata': ('Hyundai', 'sedan'), 'Tucson': ('Hyundai', 'suv'),
+    'Santa Fe': ('Hyundai', 'suv'), 'Palisade': ('Hyundai', 'suv'), 'Sorento': ('Kia', 'suv'),
+    'Telluride': ('Kia', 'suv'), 'Sportage': ('Kia', 'suv'), 'Jetta': ('Volkswagen', 'sedan'),
+    'Tiguan': ('Volkswagen', 'suv'), 'Atlas': ('Volkswagen', 'suv'), 'CX-5': ('Mazda', 'suv'),
+    'CX-9': ('Mazda', 'suv'), 'Miata': ('Mazda', 'coupe'), 'RX 350': ('Lexus', 'suv'),
+    'Escalade': ('Cadillac', 'suv'), 'R1T': ('Rivian', 'truck'), 'R1S': ('Rivian', 'suv')
+}
+
+VEHICLE_SIZES = {
+    'sedan': 'sedan', 'hatchback': 'sedan', 'coupe': 'coupe', 'convertible': 'coupe',
+    'suv': 'suv', 'crossover': 'suv', 'truck': 'truck', 'pickup': 'truck', 'van': 'van', 'minivan': 'van'
+}
+
+SERVICES = {
+    'full detail': 'full detail', 'interior': 'interior detail', 'inside': 'interior detail',
+    'exterior': 'exterior detail', 'outside': 'exterior detail', 'wash': 'wash', 'wax': 'wax',
+    'ceramic': 'ceramic coating', 'ceramic coating': 'ceramic coating', 'paint correction': 'paint correction',
+    'polish': 'paint correction', 'buff': 'paint correction', 'headlight': 'headlight restoration',
+    'headlights': 'headlight restoration', 'engine bay': 'engine bay', 'shampoo': 'carpet shampoo',
+    'odor removal': 'odor removal', 'pet hair removal': 'pet hair removal'
+}
+
+# What customers say about the state of the car
+CONDITIONS = {
+    'dirty': 'dirty', 'filthy': 'dirty', 'nasty': 'dirty', 'gross': 'dirty', 'messy': 'dirty', 'mess': 'dirty',
+    'muddy': 'mud', 'mud': 'mud', 'dusty': 'dust', 'dust': 'dust', 'sand': 'sand', 'sandy': 'sand',
+    'crumbs': 'crumbs', 'stain': 'stains', 'stains': 'stains', 'stained': 'stains', 'spill': 'spills',
+    'spilled': 'spills', 'sticky': 'sticky', 'dog hair': 'pet hair', 'pet hair': 'pet hair',
+    'cat hair': 'pet hair', 'smell': 'odor', 'smells': 'odor', 'smelly': 'odor', 'odor': 'odor',
+    'stinks': 'odor', 'mold': 'mold', 'scratch': 'scratches', 'scratches': 'scratches', 'swirl': 'swirls',
+    'swirls': 'swirls', 'water spots': 'water spots', 'bird poop': 'bird droppings',
+    'bird droppings': 'bird droppings', 'tree sap': 'tree sap', 'sap': 'tree sap', 'faded': 'faded paint',
+    'oxidized': 'faded paint', 'pretty clean': 'mostly clean', 'mostly clean': 'mostly clean',
+    'good shape': 'mostly clean', 'good condition': 'mostly clean', 'decent shape': 'mostly clean'
+}
+
+AFFIRMATIVE_PHRASES = (
+    'yes', 'yeah', 'yea', 'yep', 'yup', 'sure', 'ok', 'okay', 'sounds good', 'sounds great', "let's do it",
+    'lets do it', 'absolutely', 'definitely', 'of course', 'please do', 'works for me', "i'm in", 'go ahead'
+)
+NEGATIVE_PHRASES = (
+    'no', 'nope', 'nah', 'no thanks', 'no thank you', 'not interested', "i'm not interested", 'not now',
+    'not right now', 'maybe later', 'pass', "don't", 'do not', 'never mind', 'nevermind'
+)
+# Asking about price or booking shows interest in the service
+INTEREST_PHRASES = (
+    'price', 'pricing', 'cost', 'how much', 'quote', 'estimate', 'book', 'booking', 'schedule', 'appointment',
+    'available', 'availability', 'interested', 'sign me up'
+)
+
+# Slots describing only the current message, reset on every message rather than kept from earlier ones
+MESSAGE_SLOTS = ('intent', 'interest')
+# Slots that collect every value mentioned over the conversation
+LIST_SLOTS = ('services', 'car_condition')
+SLOT_NAMES = (
+    'vehicle_year', 'vehicle_make', 'vehicle_model', 'vehicle_size', 'services', 'car_condition',
+    'zip_code', 'address'
+) + MESSAGE_SLOTS
+
+def _phrase_pattern(phrases: Iterable[str]) -> re.Pattern:
+    """One alternation over the phrases, longest first so "full detail" wins over "detail" """
+    alternatives = []
+    for phrase in sorted(set(phrase.lower() for phrase in phrases), key=len, reverse=True):
+        # Hyphens and spaces are optional inside a phrase: "F-150", "f150" and "f 150" all match
+        parts = [re.escape(part) for part in re.split(r'[- ]', phrase)]
+        alternatives.append(r'[- ]?'.join(parts))
+    return re.compile(r"(?<![\w'])(?:" + '|'.join(alternatives) + r")(?![\w'])", re.I)
+
+def _key(match: str) -> str:
+    return re.sub(r'[- ]', '', match.lower())
+
+def _lookup(mapping: Dict[str, Any]) -> Dict[str, Any]:
+    """The mapping keyed by the normalised form _key() gives a match"""
+    return {_key(phrase): value for phrase, value in mapping.items()}
+
+MAKE_PATTERN = _phrase_pattern(VEHICLE_MAKES)
+MODEL_PATTERN = _phrase_pattern(VEHICLE_MODELS)
+SIZE_PATTERN = _phrase_pattern(VEHICLE_SIZES)
+SERVICE_PATTERN = _phrase_pattern(SERVICES)
+CONDITION_PATTERN = _phrase_pattern(CONDITIONS)
+AFFIRMATIVE_PATTERN = _phrase_pattern(AFFIRMATIVE_PHRASES)
+NEGATIVE_PATTERN = _phrase_pattern(NEGATIVE_PHRASES)
+INTEREST_PATTERN = _phrase_pattern(INTEREST_PHRASES)
+
+_MAKES = _lookup(VEHICLE_MAKES)
+_MODELS = _lookup({model: (model, make, size) for model, (make, size) in VEHICLE_MODELS.items()})
+_SIZES = _lookup(VEHICLE_SIZES)
+_SERVICES = _lookup(SERVICES)
+_CONDITIONS = _lookup(CONDITIONS)
+
+# 1950-2049, or the '18 shorthand
+YEAR_PATTERN = re.compile(r"(?<![\w$])(19[5-9]\d|20[0-4]\d)(?!\w)|(?<!\w)['’](\d\d)(?!\w)")
+ZIP_PATTERN = re.compile(r'(?<![\w$.-])(\d{5})(?:-\d{4})?(?![\w.-])')
+
+def _ordered_unique(values: Iterable[Any]) -> List[Any]:
+    return list(dict.fromkeys(values))
+
+def _year(match: re.Match) -> int:
+    if match.group(1):
+        return int(match.group(1))
+    short = int(match.group(2))
+    return 2000 + short if short <= 49 else 1900 + short
+
+def extract_slots(text: Optional[str]) -> Dict[str, Any]:
+    """
+    Slots found in one message. Vehicle, service, condition and location slots are only included when the
+    message mentions them; intent ("affirmative", "negative" or None) and interest (asked about price or
+    booking) are always included, since they describe this message alone.
+    """
+    text = text or ''
+    slots: Dict[str, Any] = {}
+
+    model = MODEL_PATTERN.search(text)
+    if model:
+        name, make, size = _MODELS[_key(model.group())]
+        slots.update(vehicle_model=name, vehicle_make=make, vehicle_size=size)
+    make = MAKE_PATTERN.search(text)
+    if make:
+        slots['vehicle_make'] = _MAKES[_key(make.group())]
+    if 'vehicle_size' not in slots:
+        size = SIZE_PATTERN.search(text)
+        if size:
+            slots['vehicle_size'] = _SIZES[_key(size.group())]
+
+    address = ADDRESS_PATTERN.search(text)
+    if address:
+        slots['address'] = address.group().strip()
+    # Street numbers and ZIP codes look like years, don't read them as one
+    located = text[:address.start()] + text[address.end():] if address else text
+    zip_code = ZIP_PATTERN.search(text)
+    if zip_code:
+        slots['zip_code'] = zip_code.group(1)
+        located = located.replace(slots['zip_code'], ' ')
+    year = YEAR_PATTERN.search(located)
+    if year:
+        slots['vehicle_year'] = _year(year)
+
+    services = _ordered_unique(_SERVICES[_key(match)] for match in SERVICE_PATTERN.findall(text))
+    if services:
+        slots['services'] = services
+    conditions = _ordered_unique(_CONDITIONS[_key(match)] for match in CONDITION_PATTERN.findall(text))
+    if conditions:
+        slots['car_condition'] = conditions
+
+    # Whichever answer comes first is the answer ("no, yes that's fine" is rare, "yes, no rush" is not)
+    affirmative = AFFIRMATIVE_PATTERN.search(text)
+    negative = NEGATIVE_PATTERN.search(text)
+    if affirmative and (not negative or affirmative.start() < negative.start()):
+        slots['intent'] = 'affirmative'
+    elif negative:
+        slots['intent'] = 'negative'
+    else:
+        slots['intent'] = None
+    # "not interested" is a no, not interest
+    slots['interest'] = bool(INTEREST_PATTERN.search(NEGATIVE_PATTERN.sub(' ', text)))
+    return slots
+
+def merge_slots(known: Dict[str, Any], slots: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    The context updates for a message's slots: list slots add to what earlier messages gave,
+    everything else replaces it.
+    """
+    updates = dict(slots)
+    for name in LIST_SLOTS:
+        if name in slots:
+            updates[name] = _ordered_unique(list(known.get(name) or []) + list(slots[name]))
+    return updates
+
+def describe_slots(slots: Dict[str, Any]) -> str:
+    """The known details as one line for a prompt, e.g. "2018 Ford F-150 (truck); services: interior detail" """
+    parts = []
+    vehicle = ' '.join(str(slots[name]) for name in ('vehicle_year', 'vehicle_make', 'vehicle_model')
+                       if slots.get(name))
+    if vehicle and slots.get('vehicle_size'):
+        vehicle += f" ({slots['vehicle_size']})"
+    elif slots.get('vehicle_size'):
+        vehicle = slots['vehicle_size']
+    if vehicle:
+        parts.append(f"vehicle: {vehicle}")
+    for name, label in (('services', 'services'), ('car_condition', 'condition')):
+        if slots.get(name):
+            parts.append(f"{label}: {', '.join(slots[name])}")
+    if slots.get('address'):
+        parts.append(f"address: {slots['address']}")
+    if slots.get('zip_code'):
+        parts.append(f"ZIP: {slots['zip_code']}")
+    return '; '.join(parts)
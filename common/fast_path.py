@@ -0,0 +1,110 @@
+"""
+Rule based replies for messages that don't need the LLM.
+
+Opt-outs (STOP, UNSUBSCRIBE...), opt-ins (START), acknowledgements ("thanks", "ok", "👍") and messages with no
+text at all are answered from templates, or not at all, before any agent runs. Opt-outs are saved in the store
+and nothing but the opt-out confirmation is sent to the customer until they text START. Conversations that look
+like a loop with an auto-responder (see common/loop_detection.py) get no replies while they're suspended.
+"""
+import re
+from dataclasses import dataclass
+from typing import Optional
+
+from common.loop_detection import LOOP_HISTORY, detect_loop, replies_suspended, suspension
+from common.metrics import FAST_PATH
+
+# Carrier standard keywords plus the ways customers usually put it
+OPT_OUT_PATTERN = re.compile(
+    r"^(?:stop|stop ?all|unsubscribe|cancel|end|quit|opt ?out|"
+    r"(?:please )?(?:stop|quit) (?:texting|messaging|contacting) me|(?:please )?remove me(?: from (?:this|your) list)?|"
+    r"(?:please )?(?:do not|don't|dont) (?:text|message|contact) me(?: again)?|unsubscribe me)$"
+)
+OPT_IN_PATTERN = re.compile(r"^(?:start|unstop|resubscribe)$")
+THANKS = r"thanks|thank you|thank u|thanks so much|thank you so much|thx|ty|tysm|appreciate it"
+ACKNOWLEDGEMENT = THANKS + r"|ok|okay|okie|k|kk|got it|cool|great|perfect|awesome|will do|noted"
+# One or more acknowledgements, e.g. "ok thanks!" or "Got it, thank you"
+ACKNOWLEDGEMENT_PATTERN = re.compile(rf"^(?:{ACKNOWLEDGEMENT})(?:[\s,.!]+(?:{ACKNOWLEDGEMENT}))*$")
+THANKS_PATTERN = re.compile(rf"(?<!\w)(?:{THANKS})(?!\w)")
+# Anything that could be an answer: letters, digits or a question mark
+TEXT_PATTERN = re.compile(r"[^\W_]|\?")
+
+OPT_OUT_REPLY = ("You've been unsubscribed from WAXD Car Detailing texts and won't get any more messages. "
+                 "Reply START to resubscribe.")
+OPT_IN_REPLY = "You're resubscribed to WAXD Car Detailing texts. Reply STOP to unsubscribe at any time."
+THANKS_REPLY = "You're welcome! Just text us if there's anything else we can help with."
+
+@dataclass
+class FastPathResult:
+    kind: str             # 'opt_out', 'opt_in', 'opted_out', 'acknowledgement', 'empty', 'loop_detected'
+                          # or 'loop_suspended'
+    reply: Optional[str]  # Text to send back, None to send nothing
+
+def _normalise(message: str) -> str:
+    """Lower case with emoji, trailing punctuation and repeated spaces removed"""
+    text = ''.join(char for char in (message or '') if char.isascii())
+    text = re.sub(r'\s+', ' ', text.lower()).strip()
+    return text.strip(' .!,')
+
+def classify_message(message: str, last_reply: Optional[str] = None) -> Optional[FastPathResult]:
+    """
+    The templated reply for a message that doesn't need the agent, or None if it does.
+
+    Args:
+        message: The customer's message
+        last_reply: The last message sent to the customer. An "ok" that answers a question goes to the agent.
+    """
+    if not TEXT_PATTERN.search(message or ''):
+        return FastPathResult('empty', None)
+
+    text = _normalise(message)
+    if OPT_OUT_PATTERN.match(text):
+        return FastPathResult('opt_out', OPT_OUT_REPLY)
+    if OPT_IN_PATTERN.match(text):
+        return FastPathResult('opt_in', OPT_IN_REPLY)
+    if ACKNOWLEDGEMENT_PATTERN.match(text) and not (last_reply or '').rstrip().endswith('?'):
+        return FastPathResult('acknowledgement', THANKS_REPLY if THANKS_PATTERN.search(text) else None)
+    return None
+
+def handle_fast_path(store, ghl_customer_id: str, conversation_id: int, message: str) -> Optional[FastPathResult]:
+    """
+    Answer a message without the LLM if it can be, recording it (and any reply) in the conversation and
+    saving opt-outs. Customers who have opted out get no reply to anything but START, and conversations
+    with an auto-responder get none while their replies are suspended.
+
+    Returns:
+        The result if the message was handled, None if the agent should answer it
+    """
+    opted_out = store.is_opted_out(ghl_customer_id)
+    last_messages = store.get_conversation_messages(conversation_id, limit=LOOP_HISTORY)
+    last_reply = last_messages[-1]['content'] if last_messages and last_messages[-1]['role'] == 'assistant' else None
+
+    result = classify_message(message, last_reply)
+    if result and result.kind == 'opt_out':
+        store.set_opt_out(ghl_customer_id, keyword=(message or '').strip()[:50])
+        if opted_out:
+            # Already confirmed once
+            result.reply = None
+    elif result and result.kind == 'opt_in':
+        store.set_opt_out(ghl_customer_id, opted_out=False)
+    elif opted_out:
+        result = FastPathResult('opted_out', None)
+
+    if result is None or result.kind == 'acknowledgement':
+        # Anything we'd reply to, unless we're trading messages with another bot
+        context = (store.get_conversation(conversation_id) or {}).get('context', {})
+        if replies_suspended(context):
+            result = FastPathResult('loop_suspended', None)
+        else:
+            reason = detect_loop(message, last_messages)
+            if reason:
+                store.update_conversation_context(conversation_id, {'replies_suspended': suspension(reason)})
+                result = FastPathResult('loop_detected', None)
+
+    if result is None:
+        return None
+
+    FAST_PATH.inc(kind=result.kind)
+    store.add_message(conversation_id, 'user', message)
+    if result.reply:
+        store.add_message(conversation_id, 'assistant', result.reply)
+    return result
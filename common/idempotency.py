@@ -0,0 +1,104 @@
+"""
+Drops webhook deliveries that GHL has already sent us.
+
+GHL retries a webhook that doesn't answer quickly, and answering an SMS can take an LLM call or two, so the same
+message often arrives twice. Each delivery's message id is claimed before any work is done: recent ids are checked
+in a bounded in-memory LRU first, then in the store's webhook_deliveries table, which is shared by every worker and
+survives restarts. Ids are forgotten after WEBHOOK_DEDUP_TTL_SECONDS, and a claim is released if handling the
+message fails so GHL's retry gets answered.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from common.metrics import DUPLICATE_WEBHOOKS
+
+# How long a message id is remembered, and how many are kept in memory
+WEBHOOK_DEDUP_TTL_SECONDS = float(os.getenv('WEBHOOK_DEDUP_TTL_SECONDS', 24 * 60 * 60))
+WEBHOOK_DEDUP_MEMORY = int(os.getenv('WEBHOOK_DEDUP_MEMORY', 10000))
+# Expired ids are deleted from the store at most this often
+WEBHOOK_DEDUP_PRUNE_SECONDS = float(os.getenv('WEBHOOK_DEDUP_PRUNE_SECONDS', 60 * 60))
+
+def delivery_id(payload: Dict[str, Any]) -> Optional[str]:
+    """
+    The GHL message id of a webhook payload, or None if it doesn't have one.
+
+    Handles the src/ servers' payload ({"messageId": ...} or {"message": {"id": ...}}) and the sales bot's
+    event payload ({"event": "sms.received", "data": {"id": ...}}).
+    """
+    for container in (payload, payload.get('message'), payload.get('data')):
+        if not isinstance(container, dict):
+            continue
+        for key in ('messageId', 'message_id', 'id'):
+            if container is payload and key == 'id':
+                # A top level id is the webhook's, not the message's
+                continue
+            if container.get(key):
+                return str(container[key])
+    return None
+
+class WebhookDeduplicator:
+    """Claims each message id once, in memory and (when given a store) in its webhook_deliveries table"""
+
+    def __init__(self, store=None, server: str = '', ttl_seconds: float = WEBHOOK_DEDUP_TTL_SECONDS,
+                 max_memory: int = WEBHOOK_DEDUP_MEMORY, prune_seconds: float = WEBHOOK_DEDUP_PRUNE_SECONDS):
+        self.store = store
+        self.server = server
+        self.ttl_seconds = ttl_seconds
+        self.max_memory = max_memory
+        self.prune_seconds = prune_seconds
+        self._lock = threading.Lock()
+        self._recent = OrderedDict()  # message id -> when it expires
+        self._next_prune = time.monotonic() + prune_seconds
+
+    def _seen_recently(self, message_id: str) -> bool:
+        with self._lock:
+            expires = self._recent.get(message_id)
+            return expires is not None and expires > time.monotonic()
+
+    def _remember(self, message_id: str) -> bool:
+        """Add a claimed id to the LRU, False if another thread got there first"""
+        now = time.monotonic()
+        with self._lock:
+            expires = self._recent.get(message_id)
+            if expires is not None and expires > now:
+                return False
+            self._recent[message_id] = now + self.ttl_seconds
+            self._recent.move_to_end(message_id)
+            while len(self._recent) > self.max_memory:
+                self._recent.popitem(last=False)
+            return True
+
+    def _claim_in_store(self, message_id: str) -> bool:
+        if time.monotonic() >= self._next_prune:
+            self._next_prune = time.monotonic() + self.prune_seconds
+            self.store.prune_webhook_deliveries(self.ttl_seconds)
+        # False when another worker (or this one before a restart) already has it
+        return self.store.claim_webhook_delivery(message_id, self.ttl_seconds)
+
+    def claim(self, message_id: Optional[str]) -> bool:
+        """
+        Whether this delivery should be handled: True the first time a message id is seen, False for a
+        repeat within the TTL. Deliveries without an id are always handled.
+        """
+        if not message_id:
+            return True
+
+        # Only ids claimed here are kept in memory, so a release by another worker isn't missed
+        if not self._seen_recently(message_id) \
+                and (self.store is None or self._claim_in_store(message_id)) and self._remember(message_id):
+            return True
+
+        DUPLICATE_WEBHOOKS.inc(server=self.server)
+        return False
+
+    def release(self, message_id: Optional[str]):
+        """Forget a claim whose message couldn't be handled, so GHL's retry is"""
+        if not message_id:
+            return
+        with self._lock:
+            self._recent.pop(message_id, None)
+        if self.store is not None:
+            self.store.release_webhook_delivery(message_id)
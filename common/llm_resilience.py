@@ -0,0 +1,357 @@
+"""
+Deadlines, hedging and a circuit breaker around LLM calls.
+
+Each webhook runs inside request_deadline(WEBHOOK_BUDGET_SECONDS), and an LLM call gets whatever is left of that
+budget (at most LLM_TIMEOUT_SECONDS) minus the time needed to save and answer. A call that runs past its p95
+latency can be hedged with a second identical request, and the first answer wins. After LLM_BREAKER_FAILURES
+failures in a row the breaker opens and calls fail straight away for LLM_BREAKER_RESET_SECONDS, so a degraded
+provider costs the customer a canned reply instead of a worker stuck on a hung request.
+
+How many calls are in flight at once is capped by an AIMD limiter shared by every agent in the process. The limit
+grows by about one per round of calls while they come back quickly, and is cut back when OpenAI answers 429 or
+latency climbs well above normal. Calls waiting for a slot are served booking conversations first, then the rest
+in the order they arrived.
+"""
+import contextvars
+import heapq
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import ContextDecorator
+from typing import Callable, Optional, TypeVar
+
+from common.metrics import LLM_CALLS, LLM_LATENCY, LLM_QUEUE_WAIT
+from common.model_router import ModelChoice
+
+# Time a webhook has to answer, and the part of it kept back for saving and sending the reply
+WEBHOOK_BUDGET_SECONDS = float(os.getenv('WEBHOOK_BUDGET_SECONDS', 20))
+LLM_DEADLINE_RESERVE_SECONDS = float(os.getenv('LLM_DEADLINE_RESERVE_SECONDS', 1))
+# Longest a single LLM call may take, with or without a webhook budget
+LLM_TIMEOUT_SECONDS = float(os.getenv('LLM_TIMEOUT_SECONDS', 15))
+# Send a second request when the first runs past the p95 latency of recent calls
+LLM_HEDGING = os.getenv('LLM_HEDGING', 'False').lower() == 'true'
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv('LLM_HEDGE_MIN_SAMPLES', 20))
+# Failures in a row that open the breaker, and how long it stays open before letting a trial call through
+LLM_BREAKER_FAILURES = int(os.getenv('LLM_BREAKER_FAILURES', 5))
+LLM_BREAKER_RESET_SECONDS = float(os.getenv('LLM_BREAKER_RESET_SECONDS', 30))
+# Threads running LLM calls (hedged requests that lost keep theirs until the client times out)
+LLM_MAX_WORKERS = int(os.getenv('LLM_MAX_WORKERS', 32))
+# Concurrent LLM calls: where the limit starts and the range it adapts in
+LLM_CONCURRENCY_INITIAL = float(os.getenv('LLM_CONCURRENCY_INITIAL', 8))
+LLM_CONCURRENCY_MIN = float(os.getenv('LLM_CONCURRENCY_MIN', 1))
+LLM_CONCURRENCY_MAX = float(os.getenv('LLM_CONCURRENCY_MAX', LLM_MAX_WORKERS))
+# Share of the limit kept after a 429 or a slow call, and how much slower than the model's median is "slow"
+LLM_CONCURRENCY_BACKOFF = float(os.getenv('LLM_CONCURRENCY_BACKOFF', 0.7))
+LLM_LATENCY_TOLERANCE = float(os.getenv('LLM_LATENCY_TOLERANCE', 2.5))
+# Conversations at these pipeline stages (or in these graph nodes) jump the queue for a slot
+PRIORITY_STAGES = tuple(
+    stage.strip() for stage in os.getenv('LLM_PRIORITY_STAGES', 'Qualified,Booking').split(',') if stage.strip()
+)
+PRIORITY_NODES = ('booking_node',)
+
+# Queue order for a slot, lowest first
+PRIORITY_BOOKING = 0
+PRIORITY_NORMAL = 1
+
+# Sent instead of an LLM reply when the provider is down or too slow
+FALLBACK_REPLY = ("Thanks for your message! We're a little busy right now, "
+                  "someone from WAXD will get back to you shortly.")
+
+T = TypeVar('T')
+
+class LLMUnavailable(Exception):
+    """The LLM call timed out, failed or was refused by the open circuit breaker"""
+
+_deadline = contextvars.ContextVar('llm_deadline', default=None)
+
+class request_deadline(ContextDecorator):
+    """Give the LLM calls made inside a with block (or decorated function) a shared time budget"""
+
+    def __init__(self, seconds: float = WEBHOOK_BUDGET_SECONDS):
+        self.seconds = seconds
+
+    def __enter__(self):
+        self._token = _deadline.set(time.monotonic() + self.seconds)
+        return self
+
+    def __exit__(self, *exc_info):
+        _deadline.reset(self._token)
+        return False
+
+    def _recreate_cm(self):
+        # Each call of a decorated function needs its own deadline
+        return request_deadline(self.seconds)
+
+def call_priority(stage: Optional[str] = None, node: Optional[str] = None) -> int:
+    """The queue priority of a conversation's LLM calls: booking conversations first, cold leads after"""
+    if stage in PRIORITY_STAGES or node in PRIORITY_NODES:
+        return PRIORITY_BOOKING
+    return PRIORITY_NORMAL
+
+def is_rate_limited(error: BaseException) -> bool:
+    """Whether an error is OpenAI's 429, from the openai client of either major version"""
+    return getattr(error, 'status_code', None) == 429 or getattr(error, 'http_status', None) == 429 \
+        or type(error).__name__ == 'RateLimitError'
+
+def call_timeout() -> float:
+    """Seconds the next LLM call may take"""
+    deadline = _deadline.get()
+    if deadline is None:
+        return LLM_TIMEOUT_SECONDS
+    return min(LLM_TIMEOUT_SECONDS, deadline - time.monotonic() - LLM_DEADLINE_RESERVE_SECONDS)
+
+class CircuitBreaker:
+    """Closed while calls succeed, open (failing fast) after too many failures, half open to try again"""
+
+    def __init__(self, failure_threshold: int = LLM_BREAKER_FAILURES,
+                 reset_seconds: float = LLM_BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return 'closed'
+            if time.monotonic() - self._opened_at < self.reset_seconds:
+                return 'open'
+            return 'half_open'
+
+    def allow(self) -> bool:
+        """Whether a call may go ahead. Once the reset time has passed, one trial call at a time is let through."""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_seconds or self._trial_running:
+                return False
+            self._trial_running = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_running = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                # A failed trial keeps it open for another reset period
+                self._opened_at = time.monotonic()
+
+class LatencyTracker:
+    """Recent call latencies per model, for the hedging threshold"""
+
+    def __init__(self, window: int = 200):
+        self._lock = threading.Lock()
+        self._window = window
+        self._latencies = {}
+
+    def observe(self, model: str, seconds: float):
+        with self._lock:
+            self._latencies.setdefault(model, deque(maxlen=self._window)).append(seconds)
+
+    def percentile(self, model: str, fraction: float, min_samples: int = LLM_HEDGE_MIN_SAMPLES) -> Optional[float]:
+        """The latency below which that fraction of recent calls finished, or None until there are enough samples"""
+        with self._lock:
+            latencies = sorted(self._latencies.get(model, ()))
+        if len(latencies) < min_samples:
+            return None
+        return latencies[min(len(latencies) - 1, int(len(latencies) * fraction))]
+
+    def p95(self, model: str, min_samples: int = LLM_HEDGE_MIN_SAMPLES) -> Optional[float]:
+        """The 95th percentile, or None until there are enough samples"""
+        return self.percentile(model, 0.95, min_samples)
+
+class ConcurrencyLimiter:
+    """
+    Caps the LLM calls in flight with an AIMD limit: +1/limit for every call that comes back in good time,
+    times backoff for a 429 or a slow one (at most once per round of calls in flight, so one burst of 429s
+    only halves it once). Callers waiting for a slot are served lowest priority number first, then in order.
+    """
+
+    def __init__(self, initial: float = LLM_CONCURRENCY_INITIAL, min_limit: float = LLM_CONCURRENCY_MIN,
+                 max_limit: float = LLM_CONCURRENCY_MAX, backoff: float = LLM_CONCURRENCY_BACKOFF):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self._limit = max(min_limit, min(max_limit, initial))
+        self._in_flight = 0
+        self._condition = threading.Condition()
+        self._waiting = []
+        self._order = itertools.count()
+        # Calls started before the last backoff don't cut the limit again
+        self._started = 0
+        self._backed_off_at = 0
+
+    @property
+    def limit(self) -> int:
+        return max(1, int(self._limit))
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def acquire(self, priority: int = PRIORITY_NORMAL, timeout: Optional[float] = None) -> Optional[int]:
+        """
+        Wait for a slot, behind any caller of a higher priority (lower number).
+
+        Returns:
+            A ticket to hand back to release(), or None if no slot came free within the timeout
+        """
+        entry = (priority, next(self._order))
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            heapq.heappush(self._waiting, entry)
+            try:
+                while self._waiting[0] != entry or self._in_flight >= self.limit:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        return None
+                    self._condition.wait(remaining)
+                heapq.heappop(self._waiting)
+                self._in_flight += 1
+                self._started += 1
+                return self._started
+            finally:
+                if entry in self._waiting:
+                    self._waiting.remove(entry)
+                    heapq.heapify(self._waiting)
+                # The next in line may be able to go now
+                self._condition.notify_all()
+
+    def try_acquire(self) -> Optional[int]:
+        """A slot if one is free right now and nobody is waiting for it, for hedged requests"""
+        with self._condition:
+            if self._waiting or self._in_flight >= self.limit:
+                return None
+            self._in_flight += 1
+            self._started += 1
+            return self._started
+
+    def release(self, ticket: int, overloaded: Optional[bool] = None):
+        """
+        Give a slot back.
+
+        Args:
+            ticket: What acquire() returned
+            overloaded: True after a 429 or slow call, False after a good one, None to leave the limit alone
+        """
+        with self._condition:
+            self._in_flight -= 1
+            if overloaded and ticket > self._backed_off_at:
+                self._limit = max(self.min_limit, self._limit * self.backoff)
+                self._backed_off_at = self._started
+            elif overloaded is False:
+                self._limit = min(self.max_limit, self._limit + 1 / self._limit)
+            self._condition.notify_all()
+
+OPENAI_BREAKER = CircuitBreaker()
+LATENCIES = LatencyTracker()
+LIMITER = ConcurrencyLimiter()
+_executor = ThreadPoolExecutor(max_workers=LLM_MAX_WORKERS, thread_name_prefix='llm')
+
+def _is_slow(elapsed: float, median: Optional[float]) -> bool:
+    if elapsed >= LLM_TIMEOUT_SECONDS:
+        return True
+    return median is not None and elapsed > median * LLM_LATENCY_TOLERANCE
+
+def _timed(call: Callable[[], T], choice: ModelChoice, limiter: ConcurrencyLimiter) -> Callable[[int], T]:
+    """The call, recording its latency and handing its slot back with whether OpenAI looked overloaded"""
+    def run(ticket: int):
+        # Compared with the median from before this call
+        median = LATENCIES.percentile(choice.model, 0.5)
+        started = time.perf_counter()
+        try:
+            result = call()
+        except Exception as e:
+            # Errors other than a 429 or a timeout say nothing about load
+            elapsed = time.perf_counter() - started
+            limiter.release(ticket, True if is_rate_limited(e) or _is_slow(elapsed, median) else None)
+            raise
+        elapsed = time.perf_counter() - started
+        limiter.release(ticket, _is_slow(elapsed, median))
+        LLM_LATENCY.observe(elapsed, model=choice.model, tier=choice.tier)
+        LATENCIES.observe(choice.model, elapsed)
+        return result
+    return run
+
+def call_llm(call: Callable[[], T], choice: ModelChoice, breaker: Optional[CircuitBreaker] = None,
+             hedge: Optional[bool] = None, priority: int = PRIORITY_NORMAL,
+             limiter: Optional[ConcurrencyLimiter] = None) -> T:
+    """
+    Run an LLM call within the current deadline and the concurrency limit, hedging it if it's slow
+    and hedging is on.
+
+    Args:
+        call: Makes the request and returns its response (run on a worker thread, maybe twice when hedged)
+        choice: The model being called, for the latency and outcome metrics
+        breaker: Defaults to the shared OpenAI breaker
+        hedge: Defaults to LLM_HEDGING
+        priority: Place in the queue for a slot, from call_priority()
+        limiter: Defaults to the shared concurrency limiter
+
+    Raises:
+        LLMUnavailable: The breaker is open, the deadline passed waiting for a slot or for the answer,
+            or the call failed
+    """
+    breaker = breaker or OPENAI_BREAKER
+    limiter = limiter or LIMITER
+    hedge = LLM_HEDGING if hedge is None else hedge
+    timeout = call_timeout()
+    if timeout <= 0:
+        # Not worth starting, there's no time left to use the answer
+        LLM_CALLS.inc(model=choice.model, outcome='no_time')
+        raise LLMUnavailable("No time left in the request budget for an LLM call")
+
+    started = time.monotonic()
+    ticket = limiter.acquire(priority, timeout)
+    lane = 'booking' if priority == PRIORITY_BOOKING else 'normal'
+    LLM_QUEUE_WAIT.observe(time.monotonic() - started, priority=lane)
+    if ticket is None:
+        LLM_CALLS.inc(model=choice.model, outcome='throttled')
+        raise LLMUnavailable(f"No LLM slot came free within {timeout:.1f}s")
+    if not breaker.allow():
+        limiter.release(ticket)
+        LLM_CALLS.inc(model=choice.model, outcome='circuit_open')
+        raise LLMUnavailable("LLM circuit breaker is open")
+
+    timed_call = _timed(call, choice, limiter)
+    futures = [_executor.submit(timed_call, ticket)]
+    hedge_after = LATENCIES.p95(choice.model) if hedge else None
+    if hedge_after is not None and time.monotonic() + hedge_after < started + timeout:
+        done, _ = wait(futures, timeout=hedge_after)
+        # Only hedge with a spare slot, a second request is the last thing an overloaded provider needs
+        hedge_ticket = None if done else limiter.try_acquire()
+        if hedge_ticket is not None:
+            futures.append(_executor.submit(timed_call, hedge_ticket))
+
+    error = None
+    pending = set(futures)
+    while pending:
+        done, pending = wait(pending, timeout=max(0, timeout - (time.monotonic() - started)),
+                             return_when=FIRST_COMPLETED)
+        if not done:
+            break
+        for future in done:
+            if future.exception() is None:
+                breaker.record_success()
+                LLM_CALLS.inc(model=choice.model, outcome='hedged' if future is not futures[0] else 'ok')
+                return future.result()
+            error = future.exception()
+
+    breaker.record_failure()
+    if pending:
+        LLM_CALLS.inc(model=choice.model, outcome='timeout')
+        raise LLMUnavailable(f"LLM call took longer than {timeout:.1f}s")
+    LLM_CALLS.inc(model=choice.model, outcome='error')
+    raise LLMUnavailable(f"LLM call failed: {error}") from error
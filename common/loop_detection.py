@@ -0,0 +1,87 @@
+"""
+Spots an auto-responder trading messages with the bot.
+
+A lead's phone set to auto-reply ("I'm driving, I'll text you back") answers every SMS we send, and we answer every
+SMS it sends. Before a message reaches the agent its conversation's recent messages are checked: the same text
+coming back LOOP_REPEATS times, or more inbound messages than a person sends in LOOP_WINDOW_SECONDS, suspends
+automated replies to the conversation for LOOP_SUSPEND_SECONDS. The suspension is kept in the conversation's
+context under replies_suspended, so every worker sees it and a person can clear it.
+"""
+import os
+import re
+from datetime import datetime, timedelta, timezone
+from difflib import SequenceMatcher
+from typing import Any, Dict, List, Optional
+
+# The sliding window, and the inbound messages within it that no person would send
+LOOP_WINDOW_SECONDS = float(os.getenv('LOOP_WINDOW_SECONDS', 10 * 60))
+LOOP_MAX_INBOUND = int(os.getenv('LOOP_MAX_INBOUND', 15))
+# Near-identical inbound messages in the window (this one included) that mean an auto-reply
+LOOP_REPEATS = int(os.getenv('LOOP_REPEATS', 3))
+LOOP_SIMILARITY = float(os.getenv('LOOP_SIMILARITY', 0.9))
+# Shorter messages ("yes", "Tuesday") are repeated by people too
+LOOP_MIN_LENGTH = int(os.getenv('LOOP_MIN_LENGTH', 12))
+# How long replies stay suspended
+LOOP_SUSPEND_SECONDS = float(os.getenv('LOOP_SUSPEND_SECONDS', 6 * 60 * 60))
+# Stored messages read for the window
+LOOP_HISTORY = LOOP_MAX_INBOUND * 2
+
+def _normalise(message: str) -> str:
+    return re.sub(r'\s+', ' ', (message or '').lower()).strip()
+
+def _timestamp(value: Any) -> Optional[datetime]:
+    """A stored message's timestamp as a UTC datetime (SQLite gives text, PostgreSQL a datetime)"""
+    if value is None:
+        return None
+    if not isinstance(value, datetime):
+        try:
+            value = datetime.fromisoformat(str(value))
+        except ValueError:
+            return None
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+def detect_loop(message: str, history: List[Dict[str, Any]], now: Optional[datetime] = None) -> Optional[str]:
+    """
+    Why the conversation looks like it's talking to another bot, or None if it doesn't.
+
+    Args:
+        message: The message just received, not yet in history
+        history: The conversation's latest stored messages, oldest first, with role, content and timestamp
+        now: When the message was received, for tests
+
+    Returns:
+        'repeated_message' or 'message_rate', or None
+    """
+    now = now or datetime.now(timezone.utc)
+    since = now - timedelta(seconds=LOOP_WINDOW_SECONDS)
+    inbound = [
+        _normalise(entry['content']) for entry in history
+        if entry['role'] == 'user' and (_timestamp(entry.get('timestamp')) or now) >= since
+    ]
+
+    if len(inbound) + 1 >= LOOP_MAX_INBOUND:
+        return 'message_rate'
+
+    text = _normalise(message)
+    if len(text) >= LOOP_MIN_LENGTH:
+        repeats = sum(1 for earlier in inbound if SequenceMatcher(None, text, earlier).ratio() >= LOOP_SIMILARITY)
+        if repeats + 1 >= LOOP_REPEATS:
+            return 'repeated_message'
+    return None
+
+def replies_suspended(context: Dict[str, Any], now: Optional[datetime] = None) -> bool:
+    """Whether a conversation's automated replies are suspended right now"""
+    suspension = context.get('replies_suspended')
+    if not suspension:
+        return False
+    until = _timestamp(suspension.get('until'))
+    return until is None or until > (now or datetime.now(timezone.utc))
+
+def suspension(reason: str, now: Optional[datetime] = None) -> Dict[str, str]:
+    """The replies_suspended context entry for a loop detected now"""
+    now = now or datetime.now(timezone.utc)
+    return {
+        'reason': reason,
+        'since': now.isoformat(timespec='seconds'),
+        'until': (now + timedelta(seconds=LOOP_SUSPEND_SECONDS)).isoformat(timespec='seconds')
+    }
@@ -0,0 +1,185 @@
+"""
+In-process Prometheus-style metrics shared by the webhook servers.
+
+Recording a value is a dict lookup and a few additions under a lock, nothing is formatted until
+/metrics is scraped. Each server exposes render_metrics() at /metrics in the Prometheus text format.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ContextDecorator
+from typing import Dict, List, Tuple
+
+# Latency buckets in seconds, from fast SQLite queries up to slow LLM calls
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+class _Timer(ContextDecorator):
+    """Observes the time spent in a with block or decorated function"""
+
+    def __init__(self, observe):
+        self._observe = observe
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._observe(time.perf_counter() - self._started)
+        return False
+
+    def _recreate_cm(self):
+        # Each call of a decorated function needs its own start time
+        return _Timer(self._observe)
+
+class Metric:
+    type_name = 'untyped'
+
+    def __init__(self, name: str, description: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children = {}
+        REGISTRY.register(self)
+
+    def labels(self, **labels):
+        """The child metric for one combination of label values"""
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _format_labels(self, key: Tuple[str, ...], extra: Dict[str, str] = None) -> str:
+        pairs = list(zip(self.labelnames, key)) + list((extra or {}).items())
+        if not pairs:
+            return ''
+        return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} {self.type_name}']
+        lines.extend(self._samples())
+        return '\n'.join(lines)
+
+class _CounterChild:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0.0
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self.value += amount
+
+class Counter(Metric):
+    """A count that only goes up (messages handled, errors, cache hits)"""
+    type_name = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1, **labels):
+        self.labels(**labels).inc(amount)
+
+    def _samples(self) -> List[str]:
+        return [
+            f'{self.name}{self._format_labels(key)} {child.value}'
+            for key, child in list(self._children.items())
+        ]
+
+class _HistogramChild:
+    def __init__(self, buckets: Tuple[float, ...]):
+        self._lock = threading.Lock()
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def time(self) -> _Timer:
+        """Time a with block or function and observe how long it took"""
+        return _Timer(self.observe)
+
+class Histogram(Metric):
+    """Distribution of a value (usually a latency in seconds) over fixed buckets"""
+    type_name = 'histogram'
+
+    def __init__(self, name: str, description: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, description, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float, **labels):
+        self.labels(**labels).observe(value)
+
+    def time(self, **labels) -> _Timer:
+        return self.labels(**labels).time()
+
+    def _samples(self) -> List[str]:
+        lines = []
+        for key, child in list(self._children.items()):
+            with child._lock:
+                counts, total, count = list(child.counts), child.sum, child.count
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{self._format_labels(key, {"le": repr(float(bound))})} {cumulative}')
+            lines.append(f'{self.name}_bucket{self._format_labels(key, {"le": "+Inf"})} {count}')
+            lines.append(f'{self.name}_sum{self._format_labels(key)} {total}')
+            lines.append(f'{self.name}_count{self._format_labels(key)} {count}')
+        return lines
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric: Metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+
+    def render(self) -> str:
+        return '\n'.join(metric.render() for metric in self._metrics.values()) + '\n'
+
+REGISTRY = Registry()
+
+def render_metrics() -> str:
+    """All metrics in the Prometheus text exposition format"""
+    return REGISTRY.render()
+
+# Metrics recorded by the servers and the code they call
+WEBHOOK_LATENCY = Histogram('webhook_latency_seconds', 'Time to handle an incoming webhook', ('server',))
+LLM_LATENCY = Histogram('llm_latency_seconds', 'Time for an LLM call to return', ('model', 'tier'))
+LLM_TOKENS = Counter('llm_tokens_total', 'Tokens used by LLM calls', ('model', 'tier', 'kind'))
+LLM_CALLS = Counter('llm_calls_total',
+                    'LLM calls by outcome (ok, hedged, timeout, error, circuit_open, no_time, throttled)',
+                    ('model', 'outcome'))
+LLM_QUEUE_WAIT = Histogram('llm_queue_wait_seconds', 'Time an LLM call waited for a concurrency slot', ('priority',))
+DB_LATENCY = Histogram('db_latency_seconds', 'Time for a database operation', ('operation',))
+SMS_LATENCY = Histogram('sms_send_latency_seconds', 'Time to send an outbound SMS through GHL', ('status',))
+MESSAGES = Counter('messages_total', 'SMS messages handled', ('direction',))
+ERRORS = Counter('errors_total', 'Errors by the component they happened in', ('component',))
+CACHE_REQUESTS = Counter('cache_requests_total', 'Cache lookups by cache and whether they hit', ('cache', 'result'))
+DUPLICATE_WEBHOOKS = Counter('duplicate_webhooks_total', 'Webhook deliveries dropped as repeats of a message id',
+                             ('server',))
+FAST_PATH = Counter('fast_path_messages_total', 'Messages answered without the LLM, by kind of message', ('kind',))
@@ -0,0 +1,82 @@
+"""
+Picks the LLM for each turn, trading cost and latency against quality.
+
+Greetings and acknowledgements go to a small fast model, pricing and booking turns (and long or multi-question
+messages) to a larger one, everything else to the standard model. A workflow node can pin its tier or model in
+its modelOptions, e.g. {"tier": "large"} or {"model": "gpt-4o"}. Latency and tokens are recorded by tier.
+"""
+import os
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+from common.extraction import extract_slots
+from common.metrics import LLM_TOKENS
+
+MODEL_TIERS = {
+    'small': os.getenv('LLM_MODEL_SMALL', 'gpt-4o-mini'),
+    'standard': os.getenv('LLM_MODEL_STANDARD', 'gpt-3.5-turbo'),
+    'large': os.getenv('LLM_MODEL_LARGE', 'gpt-4o')
+}
+
+# Nodes and pipeline stages where a good answer is worth the larger model
+LARGE_NODES = ('booking_node',)
+LARGE_STAGES = tuple(
+    stage.strip() for stage in os.getenv('LLM_LARGE_STAGES', 'Qualified,Booking').split(',') if stage.strip()
+)
+# Messages up to this many words (and without a question) only need the small model,
+# ones over LARGE_MESSAGE_WORDS get the large one
+SMALL_MESSAGE_WORDS = int(os.getenv('LLM_SMALL_MESSAGE_WORDS', 4))
+LARGE_MESSAGE_WORDS = int(os.getenv('LLM_LARGE_MESSAGE_WORDS', 40))
+
+@dataclass(frozen=True)
+class ModelChoice:
+    tier: str   # 'small', 'standard' or 'large' ('custom' when a node names its own model)
+    model: str
+
+def model_for_tier(tier: str) -> ModelChoice:
+    return ModelChoice(tier, MODEL_TIERS[tier])
+
+def _tier_for_turn(message: str, node: Optional[str], stage: Optional[str]) -> str:
+    if node in LARGE_NODES or stage in LARGE_STAGES:
+        return 'large'
+
+    words = len(message.split())
+    if extract_slots(message)['interest'] or words > LARGE_MESSAGE_WORDS or message.count('?') > 1:
+        return 'large'
+    if words <= SMALL_MESSAGE_WORDS and '?' not in message:
+        return 'small'
+    return 'standard'
+
+def choose_model(message: str = '', node: Optional[str] = None, stage: Optional[str] = None,
+                 model_options: Optional[Dict[str, Any]] = None) -> ModelChoice:
+    """
+    The model for one turn.
+
+    Args:
+        message: The customer's message
+        node: The graph or workflow node answering it
+        stage: The conversation's pipeline stage
+        model_options: A workflow node's modelOptions, "model" or "tier" there override the routing
+    """
+    options = model_options or {}
+    if options.get('model'):
+        return ModelChoice(options.get('tier') or 'custom', options['model'])
+    if options.get('tier') in MODEL_TIERS:
+        return model_for_tier(options['tier'])
+    return model_for_tier(_tier_for_turn(message or '', node, stage))
+
+def record_usage(choice: ModelChoice, response: Any):
+    """
+    Count the tokens an LLM call used, from a LangChain message (usage_metadata)
+    or an OpenAI completion (usage). Responses without usage are skipped.
+    """
+    usage = getattr(response, 'usage_metadata', None)
+    if usage:
+        prompt_tokens, completion_tokens = usage.get('input_tokens', 0), usage.get('output_tokens', 0)
+    elif getattr(response, 'usage', None) is not None:
+        prompt_tokens = getattr(response.usage, 'prompt_tokens', 0)
+        completion_tokens = getattr(response.usage, 'completion_tokens', 0)
+    else:
+        return
+    LLM_TOKENS.inc(prompt_tokens or 0, model=choice.model, tier=choice.tier, kind='prompt')
+    LLM_TOKENS.inc(completion_tokens or 0, model=choice.model, tier=choice.tier, kind='completion')
@@ -0,0 +1,1290 @@
+"""
+Conversation storage shared by the src/ agents and the sales bot.
+
+ConversationStore holds every query, written once in SQL both backends understand. SQLiteStore keeps one tuned
+connection per thread for a single node; PostgresStore draws connections from a pool so several nodes can share
+one database. create_store() picks the backend from CONVERSATION_STORE_URL.
+"""
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+import zlib
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import List, Dict, Optional, Any
+
+from common.metrics import CACHE_REQUESTS, DB_LATENCY
+
+# The SQLite file both bots share by default, at the repo root whichever directory they're started from
+DEFAULT_STORE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'sales_agent.db')
+# A SQLite file path (or sqlite:///path) or a postgresql:// URL
+CONVERSATION_STORE_URL = os.getenv('CONVERSATION_STORE_URL', DEFAULT_STORE_PATH)
+# How long /stats results are reused before reading the counters again
+STATS_CACHE_TTL = float(os.getenv('STATS_CACHE_TTL', 5))
+
+# SQLite tuning: seconds to wait on a locked database, page cache size and memory mapped I/O
+SQLITE_BUSY_TIMEOUT = float(os.getenv('SQLITE_BUSY_TIMEOUT', 5))
+SQLITE_CACHE_KB = int(os.getenv('SQLITE_CACHE_KB', 16384))
+SQLITE_MMAP_BYTES = int(os.getenv('SQLITE_MMAP_BYTES', 64 * 1024 * 1024))
+
+# PostgreSQL pool: connections kept open, most open at once, seconds to wait for a free one
+POSTGRES_POOL_MIN = int(os.getenv('POSTGRES_POOL_MIN', 1))
+POSTGRES_POOL_MAX = int(os.getenv('POSTGRES_POOL_MAX', 10))
+POSTGRES_POOL_TIMEOUT = float(os.getenv('POSTGRES_POOL_TIMEOUT', 10))
+
+# Define ConversationState structure here to avoid circular import
+@dataclass
+class ConversationState:
+    messages: List[Dict[str, str]]  # List of message dictionaries
+    current_node: str               # Current node in the workflow
+    pipeline_stage: str            # Current pipeline stage
+    context: Dict[str, Any]        # Additional context
+    last_updated: datetime         # Timestamp of last update
+    customer_id: str = None        # GHL Customer ID
+
+def _days_ago(days: float) -> str:
+    """UTC timestamp days ago, in the format CURRENT_TIMESTAMP stores"""
+    return (datetime.now(timezone.utc) - timedelta(days=days)).strftime('%Y-%m-%d %H:%M:%S')
+
+class ConversationStore(ABC):
+    """
+    Conversations and their messages for both bots.
+
+    Queries use SQL both SQLite and PostgreSQL accept, with the subclass's param placeholder for parameters.
+    Subclasses supply the connections, the schema (including the triggers that keep the stats counters up to date)
+    and vacuuming.
+    """
+
+    # Parameter placeholder of the database driver's paramstyle
+    param = '?'
+
+    def __init__(self, stats_cache_ttl: float = STATS_CACHE_TTL):
+        self.stats_cache_ttl = stats_cache_ttl
+        self._stats_cache = None  # (expires at, stats)
+        self.init_database()
+
+    def _params(self, count: int) -> str:
+        """Placeholders for count parameters, comma separated"""
+        return ', '.join([self.param] * count)
+
+    @abstractmethod
+    def _cursor(self):
+        """Context manager giving a cursor in a transaction, committed when the block exits cleanly"""
+
+    @abstractmethod
+    def _create_schema(self, cursor):
+        """Create the tables, indexes and stats triggers if they don't exist yet"""
+
+    @abstractmethod
+    def vacuum(self, full: bool = False, pages: Optional[int] = None):
+        """Give the space freed by archiving back"""
+
+    def init_database(self):
+        """Initialize the database with required tables"""
+        with self._cursor() as cursor:
+            self._create_schema(cursor)
+
+            # First run against an existing database: count what's already there, once
+            cursor.execute('SELECT COUNT(*) FROM conversation_stats')
+            if cursor.fetchone()[0] == 0:
+                self._rebuild_stats(cursor)
+
+    def _rebuild_stats(self, cursor):
+        """Recount the stats counters from the conversations table"""
+        cursor.execute('DELETE FROM conversation_stats')
+        cursor.execute('DELETE FROM pipeline_stage_stats')
+        cursor.execute('''
+            INSERT INTO conversation_stats (name, value)
+            SELECT 'total_conversations', COUNT(*) FROM conversations
+            UNION ALL
+            SELECT 'active_conversations', COUNT(*) FROM conversations WHERE is_active = 1
+            UNION ALL
+            SELECT 'unique_customers', COUNT(DISTINCT ghl_customer_id) FROM conversations
+        ''')
+        cursor.execute('''
+            INSERT INTO pipeline_stage_stats (pipeline_stage, active_conversations)
+            SELECT pipeline_stage, COUNT(*)
+            FROM conversations
+            WHERE is_active = 1 AND pipeline_stage IS NOT NULL
+            GROUP BY pipeline_stage
+        ''')
+
+    @DB_LATENCY.time(operation='get_or_create_conversation')
+    def get_or_create_conversation(self, ghl_customer_id: str, pipeline_stage: str = "New Lead") -> int:
+        """Get active conversation or create new one, returns conversation ID"""
+        with self._cursor() as cursor:
+            # Check for active conversation
+            cursor.execute(f'''
+                SELECT id FROM conversations
+                WHERE ghl_customer_id = {self.param} AND is_active = 1
+                ORDER BY last_updated DESC
+                LIMIT 1
+            ''', (ghl_customer_id,))
+
+            existing = cursor.fetchone()
+            if existing:
+                conversation_id = existing[0]
+                # Update last contact date
+                cursor.execute(f'''
+                    UPDATE conversations
+                    SET last_updated = CURRENT_TIMESTAMP
+                    WHERE id = {self.param}
+                ''', (conversation_id,))
+                return conversation_id
+
+            # Create new conversation
+            cursor.execute(f'''
+                INSERT INTO conversations (ghl_customer_id, pipeline_stage, current_node, context)
+                VALUES ({self._params(4)})
+                RETURNING id
+            ''', (ghl_customer_id, pipeline_stage, "sms_handler_node", json.dumps({})))
+
+            return cursor.fetchone()[0]
+
+    @DB_LATENCY.time(operation='add_message')
+    def add_message(self, conversation_id: int, role: str, content: str, timestamp: Optional[str] = None):
+        """Add a message to a conversation, timestamp (UTC, 'YYYY-MM-DD HH:MM:SS') defaults to now"""
+        with self._cursor() as cursor:
+            cursor.execute(f'''
+                INSERT INTO messages (conversation_id, role, content, timestamp)
+                VALUES ({self._params(3)}, COALESCE({self.param}, CURRENT_TIMESTAMP))
+            ''', (conversation_id, role, content, timestamp))
+            # Messages added outside the graph (e.g. fast path replies) are already stored,
+            # so the next checkpoint mustn't add them again
+            cursor.execute(f'''
+                UPDATE graph_checkpoints SET message_count = message_count + 1
+                WHERE thread_id = {self.param} AND checkpoint_ns = ''
+            ''', (conversation_id,))
+
+    def has_message(self, ghl_customer_id: str, role: str, content: str, timestamp: str) -> bool:
+        """Check whether any of a customer's conversations has this message, e.g. before importing it again"""
+        with self._cursor() as cursor:
+            cursor.execute(f'''
+                SELECT 1 FROM messages m
+                JOIN conversations c ON m.conversation_id = c.id
+                WHERE c.ghl_customer_id = {self.param} AND m.role = {self.param}
+                    AND m.content = {self.param} AND m.timestamp = {self.param}
+                LIMIT 1
+            ''', (ghl_customer_id, role, content, timestamp))
+            return cursor.fetchone() is not None
+
+    @DB_LATENCY.time(operation='update_conversation_state')
+    def update_conversation_state(self, conversation_id: int, pipeline_stage: str, current_node: str, context: Dict[str, Any]):
+        """Update conversation state"""
+        with self._cursor() as cursor:
+            cursor.execute(f'''
+                UPDATE conversations
+                SET pipeline_stage = {self.param}, current_node = {self.param}, context = {self.param},
+                    last_updated = CURRENT_TIMESTAMP
+                WHERE id = {self.param}
+            ''', (pipeline_stage, current_node, json.dumps(context), conversation_id))
+
+    @DB_LATENCY.time(operation='update_conversation_context')
+    def update_conversation_context(self, conversation_id: int, updates: Dict[str, Any]):
+        """Set some of a conversation's context keys, leaving the rest of its state as it is"""
+        with self._cursor() as cursor:
+            cursor.execute(f'SELECT context FROM conversations WHERE id = {self.param}', (conversation_id,))
+            row = cursor.fetchone()
+            context = json.loads(row[0]) if row and row[0] else {}
+            context.update(updates)
+            cursor.execute(f'''
+                UPDATE conversations
+                SET context = {self.param}, last_updated = CURRENT_TIMESTAMP
+                WHERE id = {self.param}
+            ''', (json.dumps(context), conversation_id))
+
+    @DB_LATENCY.time(operation='get_conversation_messages')
+    def get_conversation_messages(self, conversation_id: int, limit: Optional[int] = None) -> List[Dict[str, str]]:
+        """Get all messages for a conversation, or only the latest limit of them (oldest first either way)"""
+        with self._cursor() as cursor:
+            if limit is None:
+                cursor.execute(f'''
+                    SELECT role, content, timestamp
+                    FROM messages
+                    WHERE conversation_id = {self.param}
+                    ORDER BY id
+                ''', (conversation_id,))
+                rows = cursor.fetchall()
+            else:
+                cursor.execute(f'''
+                    SELECT role, content, timestamp
+                    FROM messages
+                    WHERE conversation_id = {self.param}
+                    ORDER BY id DESC
+                    LIMIT {self.param}
+                ''', (conversation_id, limit))
+                rows = cursor.fetchall()[::-1]
+
+            messages = []
+            for row in rows:
+                messages.append({
+                    "role": row[0],
+                    "content": row[1],
+                    "timestamp": row[2]
+                })
+
+            return messages
+
+    @DB_LATENCY.time(operation='get_conversation')
+    def get_conversation(self, conversation_id: int) -> Optional[Dict]:
+        """Get a conversation's customer, pipeline stage, current node and context"""
+        with self._cursor() as cursor:
+            cursor.execute(f'''
+                SELECT ghl_customer_id, pipeline_stage, current_node, context, is_active
+                FROM conversations
+                WHERE id = {self.param}
+            ''', (conversation_id,))
+
+            row = cursor.fetchone()
+            if row:
+                return {
+                    "id": conversation_id,
+                    "ghl_customer_id": row[0],
+                    "pipeline_stage": row[1],
+                    "current_node": row[2],
+                    "context": json.loads(row[3]) if row[3] else {},
+                    "is_active": row[4]
+                }
+            return None
+
+    @DB_LATENCY.time(operation='get_recent_messages')
+    def get_recent_messages(self, ghl_customer_id: str, limit: int = 10) -> List[Dict]:
+        """Get a customer's latest messages across all their conversations, newest first"""
+        with self._cursor() as cursor:
+            cursor.execute(f'''
+                SELECT m.id, m.conversation_id, m.role, m.content, m.timestamp
+                FROM messages m
+                JOIN conversations c ON c.id = m.conversation_id
+                WHERE c.ghl_customer_id = {self.param}
+                ORDER BY m.id DESC
+                LIMIT {self.param}
+            ''', (ghl_customer_id, limit))
+
+            return [
+                {
+                    "id": row[0],
+                    "conversation_id": row[1],
+                    "role": row[2],
+                    "content": row[3],
+                    "timestamp": row[4]
+                }
+                for row in cursor.fetchall()
+            ]
+
+    @DB_LATENCY.time(operation='load_conversation_state')
+    def load_conversation_state(self, conversation_id: int) -> Optional[ConversationState]:
+        """Load a ConversationState from database"""
+        with self._cursor() as cursor:
+            # Get conversation details
+            cursor.execute(f'''
+                SELECT pipeline_stage, current_node, context, ghl_customer_id
+                FROM conversations
+                WHERE id = {self.param}
+            ''', (conversation_id,))
+
+            conv_data = cursor.fetchone()
+
+        if not conv_data:
+            return None
+
+        pipeline_stage, current_node, context_json, ghl_customer_id = conv_data
+
+        # Get messages
+        messages = self.get_conversation_messages(conversation_id)
+
+        # Create ConversationState
+        state = ConversationState(
+            messages=messages,
+            current_node=current_node,
+            pipeline_stage=pipeline_stage,
+            context=json.loads(context_json),
+            last_updated=datetime.now(),
+            customer_id=ghl_customer_id
+        )
+
+        return state
+
+    @DB_LATENCY.time(operation='save_conversation_state')
+    def save_conversation_state(self, conversation_id: int, state: ConversationState):
+        """Save a ConversationState to database"""
+        # Update conversation state
+        self.update_conversation_state(
+            conversation_id,
+            state.pipeline_stage,
+            state.current_node,
+            state.context
+        )
+
+        # Add any new messages
+        if state.messages:
+            # Get existing messages to avoid duplicates
+            existing_messages = self.get_conversation_messages(conversation_id)
+            existing_count = len(existing_messages)
+
+            # Add only new messages
+            for message in state.messages[existing_count:]:
+                self.add_message(conversation_id, message["role"], message["content"])
+
+    @DB_LATENCY.time(operation='set_opt_out')
+    def set_opt_out(self, ghl_customer_id: str, opted_out: bool = True, keyword: Optional[str] = None):
+        """Record that a customer texted STOP (or START again), nothing more is sent to opted out customers"""
+        with self._cursor() as cursor:
+            if opted_out:
+                cursor.execute(f'''
+                    INSERT INTO opt_outs (ghl_customer_id, keyword)
+                    VALUES ({self.param}, {self.param})
+                    ON CONFLICT (ghl_customer_id) DO NOTHING
+                ''', (ghl_customer_id, keyword))
+            else:
+                cursor.execute(f'DELETE FROM opt_outs WHERE ghl_customer_id = {self.param}', (ghl_customer_id,))
+
+    @DB_LATENCY.time(operation='is_opted_out')
+    def is_opted_out(self, ghl_customer_id: str) -> bool:
+        """Whether the customer has opted out of messages"""
+        with self._cursor() as cursor:
+            cursor.execute(f'SELECT 1 FROM opt_outs WHERE ghl_customer_id = {self.param}', (ghl_customer_id,))
+            return cursor.fetchone() is not None
+
+    @DB_LATENCY.time(operation='claim_webhook_delivery')
+    def claim_webhook_delivery(self, message_id: str, ttl_seconds: float) -> bool:
+        """
+        Record a webhook's message id, unless it was already recorded within ttl_seconds.
+
+        Returns:
+            bool: True if this is the first delivery of the message, False for a repeat
+        """
+        with self._cursor() as cursor:
+            cursor.execute(f'''
+                DELETE FROM webhook_deliveries WHERE message_id = {self.param} AND received_at < {self.param}
+            ''', (message_id, _days_ago(ttl_seconds / 86400)))
+            cursor.execute(f'''
+                INSERT INTO webhook_deliveries (message_id)
+                VALUES ({self.param})
+                ON CONFLICT (message_id) DO NOTHING
+            ''', (message_id,))
+            return cursor.rowcount == 1
+
+    @DB_LATENCY.time(operation='release_webhook_delivery')
+    def release_webhook_delivery(self, message_id: str):
+        """Forget a message id, so its next delivery is handled"""
+        with self._cursor() as cursor:
+            cursor.execute(f'DELETE FROM webhook_deliveries WHERE message_id = {self.param}', (message_id,))
+
+    @DB_LATENCY.time(operation='prune_webhook_deliveries')
+    def prune_webhook_deliveries(self, ttl_seconds: float) -> int:
+        """Delete message ids recorded more than ttl_seconds ago, returns how many were deleted"""
+        with self._cursor() as cursor:
+            cursor.execute(f'DELETE FROM webhook_deliveries WHERE received_at < {self.param}',
+                           (_days_ago(ttl_seconds / 86400),))
+            return cursor.rowcount
+
+    @DB_LATENCY.time(operation='get_conversation_by_ghl_id')
+    def get_conversation_by_ghl_id(self, ghl_customer_id: str) -> Optional[Dict]:
+        """Get conversation by GHL customer ID"""
+        with self._cursor() as cursor:
+            cursor.execute(f'''
+                SELECT id, ghl_customer_id, pipeline_stage, current_node,
+                       created_date, last_updated, is_active
+                FROM conversations
+                WHERE ghl_customer_id = {self.param} AND is_active = 1
+                ORDER BY last_updated DESC
+                LIMIT 1
+            ''', (ghl_customer_id,))
+
+            row = cursor.fetchone()
+            if row:
+                return {
+                    "id": row[0],
+                    "ghl_customer_id": row[1],
+                    "pipeline_stage": row[2],
+                    "current_node": row[3],
+                    "created_date": row[4],
+                    "last_updated": row[5],
+                    "is_active": row[6]
+                }
+            return None
+
+    def get_conversation_stats(self) -> Dict[str, Any]:
+        """Get basic conversation statistics (cached for stats_cache_ttl seconds)"""
+        cached = self._stats_cache
+        if cached and cached[0] > time.monotonic():
+            CACHE_REQUESTS.inc(cache='stats', result='hit')
+            return cached[1]
+
+        CACHE_REQUESTS.inc(cache='stats', result='miss')
+        stats = self._read_conversation_stats()
+        self._stats_cache = (time.monotonic() + self.stats_cache_ttl, stats)
+        return stats
+
+    @DB_LATENCY.time(operation='get_conversation_stats')
+    def _read_conversation_stats(self) -> Dict[str, Any]:
+        """Read the counters kept up to date by the stats triggers"""
+        with self._cursor() as cursor:
+            cursor.execute('SELECT name, value FROM conversation_stats')
+            counters = dict(cursor.fetchall())
+
+            # Pipeline stage breakdown
+            cursor.execute('''
+                SELECT pipeline_stage, active_conversations
+                FROM pipeline_stage_stats
+                WHERE active_conversations > 0
+            ''')
+            pipeline_breakdown = dict(cursor.fetchall())
+
+            return {
+                "unique_customers": counters.get('unique_customers', 0),
+                "active_conversations": counters.get('active_conversations', 0),
+                "total_conversations": counters.get('total_conversations', 0),
+                "pipeline_breakdown": pipeline_breakdown
+            }
+
+    @DB_LATENCY.time(operation='get_conversation_history')
+    def get_conversation_history(self, ghl_customer_id: str) -> List[Dict]:
+        """Get all conversations for a customer"""
+        with self._cursor() as cursor:
+            cursor.execute(f'''
+                SELECT id, pipeline_stage, created_date, last_updated, is_active
+                FROM conversations
+                WHERE ghl_customer_id = {self.param}
+                ORDER BY created_date DESC
+            ''', (ghl_customer_id,))
+
+            conversations = []
+            for row in cursor.fetchall():
+                conversations.append({
+                    "id": row[0],
+                    "pipeline_stage": row[1],
+                    "created_date": row[2],
+                    "last_updated": row[3],
+                    "is_active": row[4]
+                })
+
+            return conversations
+
+    @DB_LATENCY.time(operation='get_conversations_page')
+    def get_conversations_page(self, ghl_customer_id: str, before_id: Optional[int] = None,
+                               limit: int = 50) -> List[Dict]:
+        """
+        Get one page of a customer's conversations, newest first.
+
+        Args:
+            ghl_customer_id: GHL customer ID
+            before_id: Cursor, the id of the last conversation on the previous page
+            limit: Page size
+        """
+        with self._cursor() as cursor:
+            cursor.execute(f'''
+                SELECT id, pipeline_stage, current_node, created_date, last_updated, is_active
+                FROM conversations
+                WHERE ghl_customer_id = {self.param} AND id < {self.param}
+                ORDER BY id DESC
+                LIMIT {self.param}
+            ''', (ghl_customer_id, before_id if before_id is not None else sys.maxsize, limit))
+
+            return [
+                {
+                    "id": row[0],
+                    "pipeline_stage": row[1],
+                    "current_node": row[2],
+                    "created_date": row[3],
+                    "last_updated": row[4],
+                    "is_active": row[5]
+                }
+                for row in cursor.fetchall()
+            ]
+
+    @DB_LATENCY.time(operation='get_customer_conversation_ids')
+    def get_customer_conversation_ids(self, ghl_customer_id: str) -> List[int]:
+        """Get the ids of all of a customer's conversations"""
+        with self._cursor() as cursor:
+            cursor.execute(f'SELECT id FROM conversations WHERE ghl_customer_id = {self.param}', (ghl_customer_id,))
+            return [row[0] for row in cursor.fetchall()]
+
+    @DB_LATENCY.time(operation='get_messages_page')
+    def get_messages_page(self, conversation_ids: List[int], after_id: int = 0, limit: int = 100) -> List[Dict]:
+        """
+        Get one page of messages from the given conversations, oldest first.
+
+        Args:
+            conversation_ids: Conversations to read messages from
+            after_id: Cursor, the id of the last message on the previous page
+            limit: Page size
+        """
+        if not conversation_ids:
+            return []
+
+        with self._cursor() as cursor:
+            placeholders = self._params(len(conversation_ids))
+            cursor.execute(f'''
+                SELECT id, conversation_id, role, content, timestamp
+                FROM messages
+                WHERE conversation_id IN ({placeholders}) AND id > {self.param}
+                ORDER BY id
+                LIMIT {self.param}
+            ''', (*conversation_ids, after_id, limit))
+
+            return [
+                {
+                    "id": row[0],
+                    "conversation_id": row[1],
+                    "role": row[2],
+                    "content": row[3],
+                    "timestamp": row[4]
+                }
+                for row in cursor.fetchall()
+            ]
+
+    def iter_customer_history(self, ghl_customer_id: str, batch_size: int = 500):
+        """
+        Yield a customer's conversations (newest first), each followed by its messages,
+        reading batch_size rows at a time so large histories never sit in memory.
+        """
+        before_id = None
+        while True:
+            conversations = self.get_conversations_page(ghl_customer_id, before_id, batch_size)
+            for conversation in conversations:
+                yield {"type": "conversation", **conversation}
+
+                for message in self.get_archived_messages(conversation["id"]):
+                    yield {"type": "message", "archived": True, **message}
+
+                after_id = 0
+                while True:
+                    messages = self.get_messages_page([conversation["id"]], after_id, batch_size)
+                    for message in messages:
+                        yield {"type": "message", **message}
+                    if len(messages) < batch_size:
+                        break
+                    after_id = messages[-1]["id"]
+
+            if len(conversations) < batch_size:
+                break
+            before_id = conversations[-1]["id"]
+
+    @DB_LATENCY.time(operation='close_idle_conversations')
+    def close_idle_conversations(self, idle_days: float) -> int:
+        """Mark conversations with no activity for idle_days as inactive, returns how many were closed"""
+        with self._cursor() as cursor:
+            cursor.execute(f'''
+                UPDATE conversations
+                SET is_active = 0
+                WHERE is_active = 1 AND last_updated < {self.param}
+            ''', (_days_ago(idle_days),))
+
+            return cursor.rowcount
+
+    @DB_LATENCY.time(operation='archive_old_messages')
+    def archive_old_messages(self, older_than_days: float, batch_size: int = 100) -> int:
+        """
+        Move the messages of inactive conversations last updated more than older_than_days ago
+        into message_archive, batch_size conversations per transaction.
+
+        Returns:
+            int: Number of messages archived
+        """
+        archived = 0
+        while True:
+            with self._cursor() as cursor:
+                cursor.execute(f'''
+                    SELECT c.id
+                    FROM conversations c
+                    WHERE c.is_active = 0 AND c.last_updated < {self.param}
+                      AND EXISTS (SELECT 1 FROM messages m WHERE m.conversation_id = c.id)
+                    LIMIT {self.param}
+                ''', (_days_ago(older_than_days), batch_size))
+                conversation_ids = [row[0] for row in cursor.fetchall()]
+
+                for conversation_id in conversation_ids:
+                    archived += self._archive_conversation_messages(cursor, conversation_id)
+
+            if len(conversation_ids) < batch_size:
+                return archived
+
+    def _archive_conversation_messages(self, cursor, conversation_id: int) -> int:
+        """Move one conversation's messages into its message_archive row (adding to any already there)"""
+        cursor.execute(f'''
+            SELECT id, role, content, timestamp
+            FROM messages
+            WHERE conversation_id = {self.param}
+            ORDER BY id
+        ''', (conversation_id,))
+        messages = [
+            {"id": row[0], "conversation_id": conversation_id, "role": row[1], "content": row[2], "timestamp": row[3]}
+            for row in cursor.fetchall()
+        ]
+
+        cursor.execute(f'SELECT messages FROM message_archive WHERE conversation_id = {self.param}',
+                       (conversation_id,))
+        existing = cursor.fetchone()
+        if existing:
+            messages = json.loads(zlib.decompress(existing[0])) + messages
+
+        cursor.execute(f'''
+            INSERT INTO message_archive (conversation_id, message_count, messages)
+            VALUES ({self._params(3)})
+            ON CONFLICT (conversation_id) DO UPDATE
+            SET message_count = excluded.message_count, messages = excluded.messages, archived_at = CURRENT_TIMESTAMP
+        ''', (conversation_id, len(messages), zlib.compress(json.dumps(messages, default=str).encode('utf-8'))))
+        cursor.execute(f'DELETE FROM messages WHERE conversation_id = {self.param}', (conversation_id,))
+
+        return cursor.rowcount
+
+    @DB_LATENCY.time(operation='get_archived_messages')
+    def get_archived_messages(self, conversation_id: int) -> List[Dict]:
+        """Get a conversation's archived messages, oldest first"""
+        with self._cursor() as cursor:
+            cursor.execute(f'SELECT messages FROM message_archive WHERE conversation_id = {self.param}',
+                           (conversation_id,))
+            row = cursor.fetchone()
+            return json.loads(zlib.decompress(row[0])) if row else []
+
+    @DB_LATENCY.time(operation='get_graph_checkpoint')
+    def get_graph_checkpoint(self, thread_id: int, checkpoint_ns: str = '',
+                             checkpoint_id: Optional[str] = None) -> Optional[Dict]:
+        """
+        Get a conversation's latest LangGraph checkpoint row (see ConversationCheckpointer in src/).
+        With checkpoint_id, only returns it if that is still the latest.
+        """
+        with self._cursor() as cursor:
+            cursor.execute(f'''
+                SELECT checkpoint_id, parent_checkpoint_id, checkpoint_type, checkpoint, metadata_type, metadata
+                FROM graph_checkpoints
+                WHERE thread_id = {self.param} AND checkpoint_ns = {self.param}
+            ''', (thread_id, checkpoint_ns))
+
+            row = cursor.fetchone()
+            if not row or (checkpoint_id and row[0] != checkpoint_id):
+                return None
+            return {
+                "checkpoint_id": row[0],
+                "parent_checkpoint_id": row[1],
+                "checkpoint": (row[2], bytes(row[3])),
+                "metadata": (row[4], bytes(row[5]))
+            }
+
+    @DB_LATENCY.time(operation='get_graph_checkpoint_blobs')
+    def get_graph_checkpoint_blobs(self, thread_id: int, checkpoint_ns: str,
+                                   versions: Dict[str, str]) -> Dict[str, tuple]:
+        """Get the stored (type, bytes) value of each channel at the given version"""
+        if not versions:
+            return {}
+
+        with self._cursor() as cursor:
+            placeholders = self._params(len(versions))
+            cursor.execute(f'''
+                SELECT channel, version, type, value
+                FROM graph_checkpoint_blobs
+                WHERE thread_id = {self.param} AND checkpoint_ns = {self.param} AND channel IN ({placeholders})
+            ''', (thread_id, checkpoint_ns, *versions))
+
+            return {
+                channel: (value_type, bytes(value))
+                for channel, version, value_type, value in cursor.fetchall()
+                if versions[channel] == version
+            }
+
+    @DB_LATENCY.time(operation='get_graph_checkpoint_writes')
+    def get_graph_checkpoint_writes(self, thread_id: int, checkpoint_ns: str, checkpoint_id: str) -> List[tuple]:
+        """Get the pending writes made against a checkpoint as (task_id, channel, type, bytes, task_path, idx)"""
+        with self._cursor() as cursor:
+            cursor.execute(f'''
+                SELECT task_id, channel, type, value, task_path, idx
+                FROM graph_checkpoint_writes
+                WHERE thread_id = {self.param} AND checkpoint_ns = {self.param} AND checkpoint_id = {self.param}
+            ''', (thread_id, checkpoint_ns, checkpoint_id))
+
+            return [
+                (task_id, channel, value_type, bytes(value), task_path, idx)
+                for task_id, channel, value_type, value, task_path, idx in cursor.fetchall()
+            ]
+
+    @DB_LATENCY.time(operation='save_graph_checkpoint')
+    def save_graph_checkpoint(self, thread_id: int, checkpoint_ns: str, checkpoint_id: str,
+                              parent_checkpoint_id: Optional[str], checkpoint: tuple, metadata: tuple,
+                              blobs: List[tuple], conversation: Optional[Dict[str, Any]] = None,
+                              messages: Optional[List[Dict]] = None, stored_messages: Optional[int] = None):
+        """
+        Save a conversation's new latest checkpoint, writing only what changed in the step, in one transaction.
+
+        Args:
+            checkpoint, metadata: (type, bytes) of the checkpoint (without its channel values) and its metadata
+            blobs: (channel, version, type, bytes) of the changed channels that aren't stored in the conversation
+            conversation: Changed pipeline_stage, current_node and context, saved on the conversations row
+            messages: The message list if it changed, only the messages not yet stored are added
+            stored_messages: How many of the first messages are already stored (e.g. the latest few loaded
+                             for the turn). Without it messages has to be the whole conversation.
+        """
+        with self._cursor() as cursor:
+            cursor.execute(f'''
+                SELECT message_count FROM graph_checkpoints
+                WHERE thread_id = {self.param} AND checkpoint_ns = {self.param}
+            ''', (thread_id, checkpoint_ns))
+            row = cursor.fetchone()
+            if row:
+                message_count = row[0]
+            else:
+                # First checkpoint of a conversation that may already have messages
+                cursor.execute(f'SELECT COUNT(*) FROM messages WHERE conversation_id = {self.param}', (thread_id,))
+                message_count = cursor.fetchone()[0]
+
+            if messages is not None:
+                new_messages = messages[message_count if stored_messages is None else stored_messages:]
+                for message in new_messages:
+                    cursor.execute(f'''
+                        INSERT INTO messages (conversation_id, role, content)
+                        VALUES ({self._params(3)})
+                    ''', (thread_id, message["role"], message["content"]))
+                message_count = max(message_count, len(messages)) if stored_messages is None \
+                    else message_count + len(new_messages)
+
+            updates = {
+                column: json.dumps(value) if column == 'context' else value
+                for column, value in (conversation or {}).items()
+                if column in ('pipeline_stage', 'current_node', 'context')
+            }
+            if updates:
+                assignments = ', '.join(f'{column} = {self.param}' for column in updates)
+                cursor.execute(f'''
+                    UPDATE conversations
+                    SET {assignments}, last_updated = CURRENT_TIMESTAMP
+                    WHERE id = {self.param}
+                ''', (*updates.values(), thread_id))
+
+            for channel, version, value_type, value in blobs:
+                cursor.execute(f'''
+                    INSERT INTO graph_checkpoint_blobs (thread_id, checkpoint_ns, channel, version, type, value)
+                    VALUES ({self._params(6)})
+                    ON CONFLICT (thread_id, checkpoint_ns, channel, version) DO NOTHING
+                ''', (thread_id, checkpoint_ns, channel, version, value_type, value))
+                # Only the latest checkpoint is kept, so older versions of the channel are no longer needed
+                cursor.execute(f'''
+                    DELETE FROM graph_checkpoint_blobs
+                    WHERE thread_id = {self.param} AND checkpoint_ns = {self.param}
+                        AND channel = {self.param} AND version <> {self.param}
+                ''', (thread_id, checkpoint_ns, channel, version))
+
+            cursor.execute(f'''
+                INSERT INTO graph_checkpoints (thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id,
+                                               checkpoint_type, checkpoint, metadata_type, metadata, message_count)
+                VALUES ({self._params(9)})
+                ON CONFLICT (thread_id, checkpoint_ns) DO UPDATE
+                SET checkpoint_id = excluded.checkpoint_id, parent_checkpoint_id = excluded.parent_checkpoint_id,
+                    checkpoint_type = excluded.checkpoint_type, checkpoint = excluded.checkpoint,
+                    metadata_type = excluded.metadata_type, metadata = excluded.metadata,
+                    message_count = excluded.message_count
+            ''', (thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, *checkpoint, *metadata, message_count))
+
+            # Writes against earlier checkpoints have been applied
+            cursor.execute(f'''
+                DELETE FROM graph_checkpoint_writes
+                WHERE thread_id = {self.param} AND checkpoint_ns = {self.param} AND checkpoint_id <> {self.param}
+            ''', (thread_id, checkpoint_ns, checkpoint_id))
+
+    @DB_LATENCY.time(operation='save_graph_checkpoint_writes')
+    def save_graph_checkpoint_writes(self, thread_id: int, checkpoint_ns: str, checkpoint_id: str,
+                                     writes: List[tuple], replace: bool = False):
+        """
+        Save pending writes (task_id, task_path, idx, channel, type, bytes) made against a checkpoint.
+        Existing writes are kept unless replace is set.
+        """
+        conflict = '''
+            DO UPDATE SET channel = excluded.channel, type = excluded.type, value = excluded.value
+        ''' if replace else 'DO NOTHING'
+        with self._cursor() as cursor:
+            for task_id, task_path, idx, channel, value_type, value in writes:
+                cursor.execute(f'''
+                    INSERT INTO graph_checkpoint_writes
+                        (thread_id, checkpoint_ns, checkpoint_id, task_id, task_path, idx, channel, type, value)
+                    VALUES ({self._params(9)})
+                    ON CONFLICT (thread_id, checkpoint_ns, checkpoint_id, task_id, idx) {conflict}
+                ''', (thread_id, checkpoint_ns, checkpoint_id, task_id, task_path, idx, channel, value_type, value))
+
+    @DB_LATENCY.time(operation='delete_graph_checkpoints')
+    def delete_graph_checkpoints(self, thread_id: int):
+        """Forget a conversation's checkpoints, its messages and state stay where they are"""
+        with self._cursor() as cursor:
+            for table in ('graph_checkpoints', 'graph_checkpoint_blobs', 'graph_checkpoint_writes'):
+                cursor.execute(f'DELETE FROM {table} WHERE thread_id = {self.param}', (thread_id,))
+
+class SQLiteStore(ConversationStore):
+    """
+    The store in a single SQLite file. Each thread keeps its own connection, opened once and tuned for a
+    busy webhook server: WAL so readers don't wait on the writer, synchronous=NORMAL (safe with WAL),
+    a bigger page cache, memory mapped reads and a busy timeout instead of failing on a locked database.
+    """
+
+    def __init__(self, db_path: str = DEFAULT_STORE_PATH, stats_cache_ttl: float = STATS_CACHE_TTL):
+        self.db_path = db_path
+        self._local = threading.local()
+        super().__init__(stats_cache_ttl)
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=SQLITE_BUSY_TIMEOUT)
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(f'PRAGMA cache_size=-{SQLITE_CACHE_KB}')
+            conn.execute(f'PRAGMA mmap_size={SQLITE_MMAP_BYTES}')
+            conn.execute('PRAGMA temp_store=MEMORY')
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _cursor(self):
+        conn = self._connection()
+        with conn:
+            yield conn.cursor()
+
+    def _create_schema(self, cursor):
+        # Lets archive_conversations hand freed pages back with an incremental vacuum.
+        # Only takes effect on a new database, existing ones are converted by vacuum(full=True).
+        cursor.execute('PRAGMA auto_vacuum=INCREMENTAL')
+
+        # Let /stats and other readers run while a webhook is writing
+        cursor.execute('PRAGMA journal_mode=WAL')
+
+        # Create conversations table (simplified - no customer table needed)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS conversations (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                ghl_customer_id TEXT,
+                pipeline_stage TEXT,
+                current_node TEXT,
+                context TEXT,  -- JSON string
+                created_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                is_active BOOLEAN DEFAULT 1
+            )
+        ''')
+
+        # Create messages table
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS messages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                conversation_id INTEGER,
+                role TEXT,  -- 'user' or 'assistant'
+                content TEXT,
+                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (conversation_id) REFERENCES conversations (id)
+            )
+        ''')
+
+        # Messages moved out of the messages table by archive_old_messages,
+        # one row per conversation holding its messages as zlib compressed JSON
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS message_archive (
+                conversation_id INTEGER PRIMARY KEY,
+                message_count INTEGER,
+                messages BLOB,
+                archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (conversation_id) REFERENCES conversations (id)
+            )
+        ''')
+
+        # Customers who texted STOP, kept apart from conversations so it outlives archiving
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS opt_outs (
+                ghl_customer_id TEXT PRIMARY KEY,
+                keyword TEXT,  -- what they texted, e.g. 'STOP'
+                opted_out_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+
+        # GHL message ids already handled, so retried webhooks aren't answered twice
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS webhook_deliveries (
+                message_id TEXT PRIMARY KEY,
+                received_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+
+        _create_indexes(cursor)
+        _create_checkpoint_tables(cursor, 'BLOB')
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS conversation_stats (
+                name TEXT PRIMARY KEY,  -- total_conversations, active_conversations or unique_customers
+                value INTEGER DEFAULT 0
+            )
+        ''')
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS pipeline_stage_stats (
+                pipeline_stage TEXT PRIMARY KEY,
+                active_conversations INTEGER DEFAULT 0
+            )
+        ''')
+
+        # Triggers from before NULL pipeline stages (and unchanged updates) were skipped are replaced,
+        # along with the NULL rows they counted
+        cursor.execute('DROP TRIGGER IF EXISTS conversations_stats_insert')
+        cursor.execute('DROP TRIGGER IF EXISTS conversations_stats_update')
+        cursor.execute('DELETE FROM pipeline_stage_stats WHERE pipeline_stage IS NULL')
+
+        # Keep the stats counters up to date, so get_conversation_stats never has to scan the conversations table
+        cursor.execute('''
+            CREATE TRIGGER conversations_stats_insert
+            AFTER INSERT ON conversations
+            BEGIN
+                UPDATE conversation_stats SET value = value + 1 WHERE name = 'total_conversations';
+                UPDATE conversation_stats SET value = value + 1
+                WHERE name = 'active_conversations' AND NEW.is_active;
+                UPDATE conversation_stats SET value = value + 1
+                WHERE name = 'unique_customers' AND NEW.ghl_customer_id IS NOT NULL AND NOT EXISTS (
+                    SELECT 1 FROM conversations WHERE ghl_customer_id = NEW.ghl_customer_id AND id != NEW.id
+                );
+                INSERT INTO pipeline_stage_stats (pipeline_stage, active_conversations)
+                SELECT NEW.pipeline_stage, 1 WHERE NEW.is_active AND NEW.pipeline_stage IS NOT NULL
+                ON CONFLICT(pipeline_stage) DO UPDATE SET active_conversations = active_conversations + 1;
+            END
+        ''')
+
+        cursor.execute('''
+            CREATE TRIGGER conversations_stats_update
+            AFTER UPDATE OF is_active, pipeline_stage ON conversations
+            -- Every turn writes pipeline_stage back unchanged, only real changes touch the counters
+            WHEN OLD.is_active IS NOT NEW.is_active OR OLD.pipeline_stage IS NOT NEW.pipeline_stage
+            BEGIN
+                UPDATE conversation_stats
+                SET value = value + (CASE WHEN NEW.is_active THEN 1 ELSE 0 END)
+                                  - (CASE WHEN OLD.is_active THEN 1 ELSE 0 END)
+                WHERE name = 'active_conversations';
+                UPDATE pipeline_stage_stats SET active_conversations = active_conversations - 1
+                WHERE pipeline_stage IS OLD.pipeline_stage AND OLD.is_active;
+                INSERT INTO pipeline_stage_stats (pipeline_stage, active_conversations)
+                SELECT NEW.pipeline_stage, 1 WHERE NEW.is_active AND NEW.pipeline_stage IS NOT NULL
+                ON CONFLICT(pipeline_stage) DO UPDATE SET active_conversations = active_conversations + 1;
+            END
+        ''')
+
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS conversations_stats_delete
+            AFTER DELETE ON conversations
+            BEGIN
+                UPDATE conversation_stats SET value = value - 1 WHERE name = 'total_conversations';
+                UPDATE conversation_stats SET value = value - 1
+                WHERE name = 'active_conversations' AND OLD.is_active;
+                UPDATE conversation_stats SET value = value - 1
+                WHERE name = 'unique_customers' AND OLD.ghl_customer_id IS NOT NULL AND NOT EXISTS (
+                    SELECT 1 FROM conversations WHERE ghl_customer_id = OLD.ghl_customer_id
+                );
+                UPDATE pipeline_stage_stats SET active_conversations = active_conversations - 1
+                WHERE pipeline_stage IS OLD.pipeline_stage AND OLD.is_active;
+            END
+        ''')
+
+    def vacuum(self, full: bool = False, pages: Optional[int] = None):
+        """
+        Give the space freed by archiving back to the filesystem.
+
+        Args:
+            full: Rebuild the whole file with VACUUM (blocks writers while it runs). Also switches
+                  databases created before auto_vacuum was enabled over to incremental vacuuming.
+            pages: With an incremental vacuum, free at most this many pages (all free pages if None)
+        """
+        # VACUUM can't run inside a transaction
+        conn = sqlite3.connect(self.db_path, isolation_level=None, timeout=SQLITE_BUSY_TIMEOUT)
+        try:
+            if full:
+                conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+                conn.execute('VACUUM')
+            else:
+                # Frees a page per step, so read every row to run it to completion
+                conn.execute(f'PRAGMA incremental_vacuum({int(pages or 0)})').fetchall()
+        finally:
+            conn.close()
+
+class PostgresStore(ConversationStore):
+    """
+    The store in PostgreSQL, for running the servers on more than one node.
+
+    Connections come from a pool of pool_min to pool_max connections; a request that finds them all
+    in use waits up to POSTGRES_POOL_TIMEOUT seconds for one. Needs psycopg2 (pip install psycopg2-binary).
+    """
+
+    # psycopg2's format paramstyle, so a literal % in a query with parameters is written %%
+    param = '%s'
+
+    def __init__(self, dsn: str, stats_cache_ttl: float = STATS_CACHE_TTL,
+                 pool_min: int = POSTGRES_POOL_MIN, pool_max: int = POSTGRES_POOL_MAX):
+        try:
+            import psycopg2
+            import psycopg2.extensions
+            from psycopg2.pool import ThreadedConnectionPool
+        except ImportError:
+            raise ImportError("PostgresStore needs psycopg2, install it with: pip install psycopg2-binary")
+
+        # Timestamps come back as text, the same as from SQLite
+        self._timestamp_text = psycopg2.extensions.new_type((1114, 1184), 'TIMESTAMP_TEXT', lambda value, cursor: value)
+        self._register_type = psycopg2.extensions.register_type
+        # Store UTC timestamps, as SQLite's CURRENT_TIMESTAMP does
+        self._pool = ThreadedConnectionPool(pool_min, pool_max, dsn, options='-c timezone=UTC')
+        # The pool raises as soon as it runs out, wait for a connection instead
+        self._slots = threading.BoundedSemaphore(pool_max)
+        super().__init__(stats_cache_ttl)
+
+    @contextmanager
+    def _connection(self):
+        if not self._slots.acquire(timeout=POSTGRES_POOL_TIMEOUT):
+            raise TimeoutError(f"No database connection free after {POSTGRES_POOL_TIMEOUT}s")
+        try:
+            conn = self._pool.getconn()
+            try:
+                self._register_type(self._timestamp_text, conn)
+                yield conn
+            finally:
+                self._pool.putconn(conn)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def _cursor(self):
+        with self._connection() as conn:
+            # Commits when the block exits cleanly, rolls back otherwise
+            with conn:
+                with conn.cursor() as cursor:
+                    yield cursor
+
+    def close(self):
+        """Close every pooled connection"""
+        self._pool.closeall()
+
+    def _create_schema(self, cursor):
+        # is_active stays an integer so the same queries work on both backends
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS conversations (
+                id BIGSERIAL PRIMARY KEY,
+                ghl_customer_id TEXT,
+                pipeline_stage TEXT,
+                current_node TEXT,
+                context TEXT,  -- JSON string
+                created_date TIMESTAMP(0) DEFAULT CURRENT_TIMESTAMP,
+                last_updated TIMESTAMP(0) DEFAULT CURRENT_TIMESTAMP,
+                is_active SMALLINT DEFAULT 1
+            )
+        ''')
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS messages (
+                id BIGSERIAL PRIMARY KEY,
+                conversation_id BIGINT REFERENCES conversations (id),
+                role TEXT,  -- 'user' or 'assistant'
+                content TEXT,
+                timestamp TIMESTAMP(0) DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS message_archive (
+                conversation_id BIGINT PRIMARY KEY REFERENCES conversations (id),
+                message_count INTEGER,
+                messages BYTEA,
+                archived_at TIMESTAMP(0) DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS opt_outs (
+                ghl_customer_id TEXT PRIMARY KEY,
+                keyword TEXT,
+                opted_out_at TIMESTAMP(0) DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS webhook_deliveries (
+                message_id TEXT PRIMARY KEY,
+                received_at TIMESTAMP(0) DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+
+        _create_indexes(cursor)
+        _create_checkpoint_tables(cursor, 'BYTEA')
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS conversation_stats (
+                name TEXT PRIMARY KEY,
+                value BIGINT DEFAULT 0
+            )
+        ''')
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS pipeline_stage_stats (
+                pipeline_stage TEXT PRIMARY KEY,
+                active_conversations BIGINT DEFAULT 0
+            )
+        ''')
+
+        # One trigger function does what the three SQLite triggers do
+        cursor.execute('''
+            CREATE OR REPLACE FUNCTION conversations_stats() RETURNS trigger AS $$
+            BEGIN
+                -- Under READ COMMITTED two transactions adding (or removing) a customer's conversations at once
+                -- would both miss the other's row in the NOT EXISTS checks, take turns per customer instead
+                IF TG_OP = 'INSERT' AND NEW.ghl_customer_id IS NOT NULL THEN
+                    PERFORM pg_advisory_xact_lock(hashtext(NEW.ghl_customer_id));
+                ELSIF TG_OP = 'DELETE' AND OLD.ghl_customer_id IS NOT NULL THEN
+                    PERFORM pg_advisory_xact_lock(hashtext(OLD.ghl_customer_id));
+                END IF;
+
+                -- OLD is only set for updates and deletes, NEW for inserts and updates
+                IF TG_OP <> 'INSERT' THEN
+                    IF OLD.is_active = 1 THEN
+                        UPDATE conversation_stats SET value = value - 1 WHERE name = 'active_conversations';
+                        UPDATE pipeline_stage_stats SET active_conversations = active_conversations - 1
+                        WHERE pipeline_stage = OLD.pipeline_stage;
+                    END IF;
+                END IF;
+                IF TG_OP <> 'DELETE' THEN
+                    IF NEW.is_active = 1 THEN
+                        UPDATE conversation_stats SET value = value + 1 WHERE name = 'active_conversations';
+                        IF NEW.pipeline_stage IS NOT NULL THEN
+                            INSERT INTO pipeline_stage_stats (pipeline_stage, active_conversations)
+                            VALUES (NEW.pipeline_stage, 1)
+                            ON CONFLICT (pipeline_stage) DO UPDATE
+                            SET active_conversations = pipeline_stage_stats.active_conversations + 1;
+                        END IF;
+                    END IF;
+                END IF;
+
+                IF TG_OP = 'INSERT' THEN
+                    UPDATE conversation_stats SET value = value + 1 WHERE name = 'total_conversations';
+                    UPDATE conversation_stats SET value = value + 1
+                    WHERE name = 'unique_customers' AND NEW.ghl_customer_id IS NOT NULL AND NOT EXISTS (
+                        SELECT 1 FROM conversations WHERE ghl_customer_id = NEW.ghl_customer_id AND id <> NEW.id
+                    );
+                ELSIF TG_OP = 'DELETE' THEN
+                    UPDATE conversation_stats SET value = value - 1 WHERE name = 'total_conversations';
+                    UPDATE conversation_stats SET value = value - 1
+                    WHERE name = 'unique_customers' AND OLD.ghl_customer_id IS NOT NULL AND NOT EXISTS (
+                        SELECT 1 FROM conversations WHERE ghl_customer_id = OLD.ghl_customer_id
+                    );
+                END IF;
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql
+        ''')
+
+        cursor.execute('DROP TRIGGER IF EXISTS conversations_stats ON conversations')
+        cursor.execute('''
+            CREATE TRIGGER conversations_stats
+            AFTER INSERT OR DELETE ON conversations
+            FOR EACH ROW EXECUTE FUNCTION conversations_stats()
+        ''')
+        # Every turn writes pipeline_stage back unchanged, only real changes lock the hot counter rows
+        cursor.execute('DROP TRIGGER IF EXISTS conversations_stats_update ON conversations')
+        cursor.execute('''
+            CREATE TRIGGER conversations_stats_update
+            AFTER UPDATE OF is_active, pipeline_stage ON conversations
+            FOR EACH ROW
+            WHEN (OLD.is_active IS DISTINCT FROM NEW.is_active OR OLD.pipeline_stage IS DISTINCT FROM NEW.pipeline_stage)
+            EXECUTE FUNCTION conversations_stats()
+        ''')
+
+    def vacuum(self, full: bool = False, pages: Optional[int] = None):
+        """
+        Reclaim the space freed by archiving. Autovacuum already reuses it within the tables,
+        full=True rewrites them to give it back to the filesystem (locks them while it runs).
+        pages only applies to SQLite and is ignored.
+        """
+        with self._connection() as conn:
+            # VACUUM can't run inside a transaction
+            conn.autocommit = True
+            try:
+                with conn.cursor() as cursor:
+                    if full:
+                        cursor.execute('VACUUM FULL ANALYZE messages, message_archive')
+                    else:
+                        cursor.execute('VACUUM ANALYZE messages, message_archive')
+            finally:
+                conn.autocommit = False
+
+def _create_indexes(cursor):
+    """Indexes shared by both backends"""
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_conversations_customer
+        ON conversations(ghl_customer_id)
+    ''')
+
+    # Messages are always read per conversation, in id order
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_messages_conversation
+        ON messages(conversation_id, id)
+    ''')
+
+    # Finds idle conversations for archiving
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_conversations_active_updated
+        ON conversations(is_active, last_updated)
+    ''')
+
+    # Finds expired webhook message ids
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_webhook_deliveries_received
+        ON webhook_deliveries(received_at)
+    ''')
+
+def _create_checkpoint_tables(cursor, blob_type: str):
+    """
+    LangGraph checkpoint tables shared by both backends. The messages and conversation state live in their
+    own tables, these hold the rest: each conversation's latest checkpoint, the current value of every other
+    channel and the writes still pending against the checkpoint.
+    """
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS graph_checkpoints (
+            thread_id BIGINT,  -- conversations.id
+            checkpoint_ns TEXT DEFAULT '',
+            checkpoint_id TEXT,
+            parent_checkpoint_id TEXT,
+            checkpoint_type TEXT,
+            checkpoint {blob_type},
+            metadata_type TEXT,
+            metadata {blob_type},
+            message_count INTEGER,  -- messages of the conversation already in the messages table
+            PRIMARY KEY (thread_id, checkpoint_ns)
+        )
+    ''')
+
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS graph_checkpoint_blobs (
+            thread_id BIGINT,
+            checkpoint_ns TEXT DEFAULT '',
+            channel TEXT,
+            version TEXT,
+            type TEXT,
+            value {blob_type},
+            PRIMARY KEY (thread_id, checkpoint_ns, channel, version)
+        )
+    ''')
+
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS graph_checkpoint_writes (
+            thread_id BIGINT,
+            checkpoint_ns TEXT DEFAULT '',
+            checkpoint_id TEXT,
+            task_id TEXT,
+            task_path TEXT DEFAULT '',
+            idx INTEGER,
+            channel TEXT,
+            type TEXT,
+            value {blob_type},
+            PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+        )
+    ''')
+
+def create_store(url: str = None, **kwargs) -> ConversationStore:
+    """
+    Open the conversation store at url (CONVERSATION_STORE_URL by default):
+    a postgresql:// URL, or a SQLite file as sqlite:///path or a plain path.
+    """
+    url = url or CONVERSATION_STORE_URL
+    if url.startswith(('postgres://', 'postgresql://')):
+        return PostgresStore(url, **kwargs)
+    if url.startswith('sqlite:///'):
+        url = url[len('sqlite:///'):]
+    return SQLiteStore(url, **kwargs)
@@ -0,0 +1,200 @@
+"""
+Structured logging for the webhook servers and the quote bot.
+
+Log calls only redact, truncate and queue the event; a background thread formats it as one JSON line
+and writes it to stderr, so a slow terminal or log collector never holds up a request. Full webhook
+payloads are only logged for a sample of requests, and always with contact details and tokens redacted.
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import re
+import sys
+import time
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict
+
+from common.text_patterns import ADDRESS_PATTERN
+
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+# Fraction of webhook payloads logged in full (0-1), the rest only get a summary
+LOG_PAYLOAD_SAMPLE_RATE = float(os.getenv('LOG_PAYLOAD_SAMPLE_RATE', 0.1))
+# Longest string kept in a log event, and the most list items / dict keys
+LOG_MAX_FIELD_CHARS = int(os.getenv('LOG_MAX_FIELD_CHARS', 200))
+LOG_MAX_ITEMS = int(os.getenv('LOG_MAX_ITEMS', 20))
+# Events bigger than this are cut down to their first fields
+LOG_MAX_EVENT_BYTES = int(os.getenv('LOG_MAX_EVENT_BYTES', 4096))
+# Events waiting to be written; once full, new events are dropped rather than blocking the caller
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', 10000))
+
+REDACTED = '[REDACTED]'
+MAX_DEPTH = 6
+
+# Field names whose values are never logged
+SENSITIVE_KEY_PATTERN = re.compile(
+    r'phone|email|address|token|secret|password|authorization|api_?key|cookie', re.I
+)
+# Contact details and tokens inside free text (e.g. an SMS that says "call me on 512-555-0100"); street
+# addresses use the same ADDRESS_PATTERN as the slot extractor
+EMAIL_PATTERN = re.compile(r'[\w.+-]+@[\w-]+\.[\w.-]+')
+PHONE_PATTERN = re.compile(r'(?<!\w)\+?\d[\d\s().-]{7,}\d(?!\w)')
+TOKEN_PATTERN = re.compile(r'(?i)\bbearer\s+[\w.~+/=-]+|\beyJ[\w-]+\.[\w-]+\.[\w-]+|\b(?:sk|pk|pit)-[\w-]{16,}')
+
+def redact_text(text: str) -> str:
+    """Mask emails, street addresses, phone numbers and tokens in free text"""
+    text = TOKEN_PATTERN.sub(REDACTED, text)
+    text = EMAIL_PATTERN.sub(REDACTED, text)
+    # Before phone numbers, so a house number and ZIP aren't read as one
+    text = ADDRESS_PATTERN.sub(REDACTED, text)
+    return PHONE_PATTERN.sub(REDACTED, text)
+
+def redact(value: Any, max_chars: int = None, max_items: int = None, _depth: int = 0) -> Any:
+    """
+    Make a value safe and small enough to log.
+
+    Values under sensitive keys (phone, email, address, tokens...) are replaced, free text is scanned for
+    contact details, strings are truncated to max_chars and lists/dicts to max_items entries.
+    """
+    max_chars = max_chars or LOG_MAX_FIELD_CHARS
+    max_items = max_items or LOG_MAX_ITEMS
+
+    if _depth >= MAX_DEPTH:
+        return '...'
+    if isinstance(value, dict):
+        redacted = {}
+        for index, (key, item) in enumerate(value.items()):
+            if index >= max_items:
+                redacted['...'] = f"{len(value) - max_items} more keys"
+                break
+            if SENSITIVE_KEY_PATTERN.search(str(key)) and item not in (None, ''):
+                redacted[key] = REDACTED
+            else:
+                redacted[key] = redact(item, max_chars, max_items, _depth + 1)
+        return redacted
+    if isinstance(value, (list, tuple)):
+        redacted = [redact(item, max_chars, max_items, _depth + 1) for item in value[:max_items]]
+        if len(value) > max_items:
+            redacted.append(f"... {len(value) - max_items} more items")
+        return redacted
+    if isinstance(value, str):
+        text = redact_text(value)
+        if len(text) > max_chars:
+            text = text[:max_chars] + f"... ({len(text)} chars)"
+        return text
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    return redact(str(value), max_chars, max_items, _depth + 1)
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, event and the event's fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        event = {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(record.created)),
+            'level': record.levelname,
+            'logger': record.name,
+            'event': record.getMessage()
+        }
+        event.update(getattr(record, 'fields', {}))
+        if record.exc_info:
+            event['exception'] = self.formatException(record.exc_info)
+
+        line = json.dumps(event, default=str)
+        if len(line) > LOG_MAX_EVENT_BYTES:
+            # Keep the envelope and as many fields as fit
+            trimmed = {key: event[key] for key in ('time', 'level', 'logger', 'event')}
+            for key, value in event.items():
+                if key in trimmed:
+                    continue
+                trimmed[key] = value
+                if len(json.dumps(trimmed, default=str)) > LOG_MAX_EVENT_BYTES - 64:
+                    del trimmed[key]
+                    break
+            trimmed['truncated'] = True
+            line = json.dumps(trimmed, default=str)
+        return line
+
+class DroppingQueueHandler(QueueHandler):
+    """Queues records for the writer thread, dropping (and counting) them when the queue is full"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Formatting happens on the writer thread, just make sure the message is a plain string
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+_listener = None
+_queue_handler = None
+
+def configure_logging(level: str = LOG_LEVEL):
+    """
+    Send all logging through the background JSON writer (safe to call more than once).
+
+    Called by each entry point when it starts rather than on import, so importing a server (in a test, or
+    in a host process with its own logging) changes nothing. Handlers already on the root logger are kept.
+    """
+    global _listener, _queue_handler
+    if _listener is not None:
+        return
+
+    stream_handler = logging.StreamHandler(sys.stderr)
+    stream_handler.setFormatter(JSONFormatter())
+
+    _queue_handler = DroppingQueueHandler(queue.Queue(maxsize=LOG_QUEUE_SIZE))
+    _listener = QueueListener(_queue_handler.queue, stream_handler, respect_handler_level=False)
+    _listener.start()
+    # Write out whatever is still queued when the process exits
+    atexit.register(shutdown_logging)
+
+    root = logging.getLogger()
+    root.addHandler(_queue_handler)
+    root.setLevel(level)
+
+def shutdown_logging():
+    """Flush queued events and stop the writer thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+        logging.getLogger().removeHandler(_queue_handler)
+
+def dropped_events() -> int:
+    """How many events have been dropped because the queue was full"""
+    return _queue_handler.dropped if _queue_handler else 0
+
+def get_logger(name: str) -> logging.Logger:
+    return logging.getLogger(name)
+
+def log_event(logger: logging.Logger, event: str, level: int = logging.INFO, **fields):
+    """Log a structured event, redacting and truncating its fields"""
+    if logger.isEnabledFor(level):
+        logger.log(level, event, extra={'fields': redact(fields)})
+
+def log_payload(logger: logging.Logger, event: str, payload: Any, sample_rate: float = None, **fields):
+    """
+    Log that a payload was received: always a summary (its top level keys),
+    plus the redacted payload itself for a sample_rate fraction of calls.
+    """
+    sample_rate = LOG_PAYLOAD_SAMPLE_RATE if sample_rate is None else sample_rate
+    if not logger.isEnabledFor(logging.INFO):
+        return
+
+    summary: Dict[str, Any] = dict(fields)
+    if isinstance(payload, dict):
+        summary['payload_keys'] = list(payload)[:LOG_MAX_ITEMS]
+    if random.random() < sample_rate:
+        summary['payload'] = payload
+    logger.info(event, extra={'fields': redact(summary)})
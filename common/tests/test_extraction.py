@@ -0,0 +1,49 @@
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from common.extraction import describe_slots, extract_slots, merge_slots
+
+
+def test_vehicle_slots():
+    """Test make, model, year and size come out of the spellings customers use"""
+    slots = extract_slots("It's a 2018 f150 with lots of dog hair inside")
+    assert slots['vehicle_year'] == 2018
+    assert (slots['vehicle_make'], slots['vehicle_model'], slots['vehicle_size']) == ('Ford', 'F-150', 'truck')
+    assert slots['services'] == ['interior detail']
+    assert slots['car_condition'] == ['pet hair']
+
+    slots = extract_slots("my '09 chevy needs a full detail and ceramic coating")
+    assert (slots['vehicle_year'], slots['vehicle_make']) == (2009, 'Chevrolet')
+    assert 'vehicle_model' not in slots
+    assert slots['services'] == ['full detail', 'ceramic coating']
+
+
+def test_intent_and_interest():
+    """Test yes/no answers and questions about price or booking"""
+    assert extract_slots("yes the seats are really dirty, what's the price?") == {
+        'car_condition': ['dirty'], 'intent': 'affirmative', 'interest': True
+    }
+    assert extract_slots("no thanks, not interested") == {'intent': 'negative', 'interest': False}
+    assert extract_slots("Hi") == {'intent': None, 'interest': False}
+    assert extract_slots("") == {'intent': None, 'interest': False}
+
+
+def test_location_slots():
+    """Test street addresses and ZIP codes, which aren't mistaken for a vehicle year"""
+    slots = extract_slots("I'm at 2010 S Lamar Blvd Apt 5, Austin TX 78704")
+    assert slots['address'] == '2010 S Lamar Blvd Apt 5'
+    assert slots['zip_code'] == '78704'
+    assert 'vehicle_year' not in slots
+
+
+def test_merge_and_describe():
+    """Test list slots build up over messages and the known details read as one line"""
+    known = {'services': ['interior detail'], 'vehicle_make': 'Ford'}
+    updates = merge_slots(known, extract_slots("can you wax the outside of my tacoma too?"))
+    assert updates['services'] == ['interior detail', 'wax', 'exterior detail']
+    assert updates['vehicle_make'] == 'Toyota'
+    assert describe_slots({**known, **updates}) == (
+        "vehicle: Toyota Tacoma (truck); services: interior detail, wax, exterior detail"
+    )
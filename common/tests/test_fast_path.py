@@ -0,0 +1,69 @@
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from common.fast_path import OPT_IN_REPLY, OPT_OUT_REPLY, THANKS_REPLY, classify_message, handle_fast_path
+from common.storage import SQLiteStore
+
+
+def test_classify_message():
+    """Test which messages are answered from templates and which go to the agent"""
+    assert classify_message("STOP").kind == 'opt_out'
+    assert classify_message("Please stop texting me.").reply == OPT_OUT_REPLY
+    assert classify_message("start").reply == OPT_IN_REPLY
+    assert classify_message("Ok thank you 👍").reply == THANKS_REPLY
+    assert classify_message("got it").reply is None
+    assert classify_message("👍👍").kind == 'empty'
+    assert classify_message("   ").kind == 'empty'
+
+    # Anything that might need an answer goes to the agent
+    assert classify_message("?") is None
+    assert classify_message("stop by Tuesday?") is None
+    assert classify_message("cancel my appointment") is None
+    assert classify_message("ok", last_reply="Want me to book you in for Tuesday?") is None
+
+
+def test_opt_out_is_saved(tmp_path):
+    """Test an opted out customer gets no replies until they text START"""
+    store = SQLiteStore(str(tmp_path / 'sales_agent.db'))
+    conversation_id = store.get_or_create_conversation('customer_1')
+
+    assert handle_fast_path(store, 'customer_1', conversation_id, "What do you charge?") is None
+    assert handle_fast_path(store, 'customer_1', conversation_id, "STOP").reply == OPT_OUT_REPLY
+    assert store.is_opted_out('customer_1')
+
+    result = handle_fast_path(store, 'customer_1', conversation_id, "What do you charge?")
+    assert (result.kind, result.reply) == ('opted_out', None)
+    assert handle_fast_path(store, 'customer_1', conversation_id, "stop").reply is None
+
+    assert handle_fast_path(store, 'customer_1', conversation_id, "START").reply == OPT_IN_REPLY
+    assert not store.is_opted_out('customer_1')
+    assert handle_fast_path(store, 'customer_1', conversation_id, "What do you charge?") is None
+
+    # Handled messages and their replies are kept in the conversation
+    assert [(m['role'], m['content']) for m in store.get_conversation_messages(conversation_id)] == [
+        ('user', 'STOP'), ('assistant', OPT_OUT_REPLY), ('user', 'What do you charge?'), ('user', 'stop'),
+        ('user', 'START'), ('assistant', OPT_IN_REPLY)
+    ]
+
+
+def test_auto_responder_loop(tmp_path):
+    """Test replies stop once a customer's phone keeps sending the same auto-reply"""
+    store = SQLiteStore(str(tmp_path / 'sales_agent.db'))
+    conversation_id = store.get_or_create_conversation('customer_1')
+    auto_reply = "I'm driving with Driving Focus turned on. I'll see your message when I get where I'm going."
+
+    for _ in range(2):
+        assert handle_fast_path(store, 'customer_1', conversation_id, auto_reply) is None
+        store.add_message(conversation_id, 'user', auto_reply)
+        store.add_message(conversation_id, 'assistant', "No problem, text us when you're free!")
+
+    assert handle_fast_path(store, 'customer_1', conversation_id, auto_reply).kind == 'loop_detected'
+    suspension = store.get_conversation(conversation_id)['context']['replies_suspended']
+    assert suspension['reason'] == 'repeated_message'
+
+    # Nothing goes to the agent until the suspension ends, but STOP still works
+    result = handle_fast_path(store, 'customer_1', conversation_id, "Actually can you do Tuesday?")
+    assert (result.kind, result.reply) == ('loop_suspended', None)
+    assert handle_fast_path(store, 'customer_1', conversation_id, "STOP").reply == OPT_OUT_REPLY
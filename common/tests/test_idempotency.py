@@ -0,0 +1,52 @@
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from common.idempotency import WebhookDeduplicator, delivery_id
+from common.metrics import DUPLICATE_WEBHOOKS
+from common.storage import SQLiteStore
+
+
+def test_delivery_id():
+    """Test the message id is found in both servers' payloads"""
+    assert delivery_id({'customerId': 'c1', 'messageId': 'm1'}) == 'm1'
+    assert delivery_id({'customerId': 'c1', 'message': {'id': 'm2', 'content': 'Hi'}}) == 'm2'
+    assert delivery_id({'event': 'sms.received', 'data': {'id': 'm3', 'contact_id': 'c1'}}) == 'm3'
+    assert delivery_id({'id': 'webhook_1', 'message': {'content': 'Hi'}}) is None
+
+
+def test_duplicate_deliveries(tmp_path):
+    """Test a message id is handled once across workers, and again after a failure or once it expires"""
+    store = SQLiteStore(str(tmp_path / 'sales_agent.db'))
+    worker_1 = WebhookDeduplicator(store, server='test')
+    worker_2 = WebhookDeduplicator(store, server='test')
+    before = DUPLICATE_WEBHOOKS.labels(server='test').value
+
+    assert worker_1.claim('m1')
+    assert not worker_1.claim('m1')  # from memory
+    assert not worker_2.claim('m1')  # from the store
+    assert DUPLICATE_WEBHOOKS.labels(server='test').value == before + 2
+    assert worker_1.claim(None)
+
+    # A failed delivery is handled again when GHL retries it
+    worker_1.release('m1')
+    assert worker_2.claim('m1')
+
+    with store._cursor() as cursor:
+        cursor.execute("UPDATE webhook_deliveries SET received_at = '2000-01-01 00:00:00'")
+    assert WebhookDeduplicator(store).claim('m1')
+    assert store.prune_webhook_deliveries(60) == 0
+
+    with store._cursor() as cursor:
+        cursor.execute("UPDATE webhook_deliveries SET received_at = '2000-01-01 00:00:00'")
+    assert store.prune_webhook_deliveries(60) == 1
+
+
+def test_memory_is_bounded():
+    """Test only the most recent ids are kept in memory"""
+    deliveries = WebhookDeduplicator(max_memory=2)
+    for message_id in ('m1', 'm2', 'm3'):
+        assert deliveries.claim(message_id)
+    assert deliveries.claim('m1')
+    assert not deliveries.claim('m3')
@@ -0,0 +1,158 @@
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import common.llm_resilience as llm_resilience
+from common.llm_resilience import (PRIORITY_BOOKING, PRIORITY_NORMAL, CircuitBreaker, ConcurrencyLimiter,
+                                   LatencyTracker, LLMUnavailable, call_llm, call_priority, request_deadline)
+from common.metrics import LLM_CALLS
+from common.model_router import ModelChoice
+
+CHOICE = ModelChoice('standard', 'test-resilience')
+
+
+def outcomes(outcome):
+    return LLM_CALLS.labels(model=CHOICE.model, outcome=outcome).value
+
+
+def test_deadline_from_request_budget():
+    """Test a call gets what's left of the request budget and fails fast once it's used up"""
+    release = threading.Event()
+    with request_deadline(1.2):
+        started = time.monotonic()
+        with pytest.raises(LLMUnavailable):
+            call_llm(lambda: release.wait(5), CHOICE, breaker=CircuitBreaker())
+        # 1.2s budget less the 1s reserved for answering
+        assert time.monotonic() - started < 1
+
+        time.sleep(0.3)
+        before = outcomes('no_time')
+        with pytest.raises(LLMUnavailable):
+            call_llm(lambda: 'reply', CHOICE, breaker=CircuitBreaker())
+        assert outcomes('no_time') == before + 1
+    release.set()
+
+    assert call_llm(lambda: 'reply', CHOICE, breaker=CircuitBreaker()) == 'reply'
+
+
+def test_hedged_request(monkeypatch):
+    """Test a call running past the p95 latency gets a second request, and the first answer wins"""
+    latencies = LatencyTracker()
+    for _ in range(20):
+        latencies.observe(CHOICE.model, 0.05)
+    monkeypatch.setattr(llm_resilience, 'LATENCIES', latencies)
+
+    calls = []
+    release = threading.Event()
+
+    def call():
+        calls.append(1)
+        if len(calls) == 1:
+            release.wait(5)
+            return 'slow'
+        return 'fast'
+
+    before = outcomes('hedged')
+    assert call_llm(call, CHOICE, breaker=CircuitBreaker(), hedge=True) == 'fast'
+    assert len(calls) == 2
+    assert outcomes('hedged') == before + 1
+    release.set()
+
+
+def test_circuit_breaker():
+    """Test the breaker opens after repeated failures, fails fast, then lets one trial call through"""
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=0.2)
+
+    def fail():
+        raise RuntimeError("provider down")
+
+    for _ in range(2):
+        with pytest.raises(LLMUnavailable):
+            call_llm(fail, CHOICE, breaker=breaker)
+    assert breaker.state == 'open'
+
+    before = outcomes('circuit_open')
+    with pytest.raises(LLMUnavailable):
+        call_llm(lambda: 'reply', CHOICE, breaker=breaker)
+    assert outcomes('circuit_open') == before + 1
+
+    time.sleep(0.25)
+    assert breaker.state == 'half_open'
+    assert breaker.allow()
+    assert not breaker.allow()  # only one trial at a time
+    breaker.record_success()
+    assert breaker.state == 'closed'
+    assert call_llm(lambda: 'reply', CHOICE, breaker=breaker) == 'reply'
+
+
+class RateLimitError(Exception):
+    status_code = 429
+
+
+def test_limiter_backs_off_on_rate_limits():
+    """Test the limit grows while calls succeed and is cut once per round of calls by a burst of 429s"""
+    limiter = ConcurrencyLimiter(initial=4, min_limit=1, max_limit=6, backoff=0.5)
+    for _ in range(12):
+        call_llm(lambda: 'reply', CHOICE, breaker=CircuitBreaker(), limiter=limiter)
+    assert limiter.limit == 6
+    assert limiter.in_flight == 0
+
+    def rate_limited():
+        raise RateLimitError("Too many requests")
+
+    # Four calls already in flight when the 429s come back count as one signal
+    tickets = [limiter.acquire() for _ in range(4)]
+    for ticket in tickets:
+        limiter.release(ticket, overloaded=True)
+    assert limiter.limit == 3
+
+    with pytest.raises(LLMUnavailable):
+        call_llm(rate_limited, CHOICE, breaker=CircuitBreaker(), limiter=limiter)
+    assert limiter.limit == 1
+    assert limiter.in_flight == 0
+
+
+def test_limiter_serves_booking_first():
+    """Test callers waiting for a slot get it booking conversations first, then in arrival order"""
+    limiter = ConcurrencyLimiter(initial=1, min_limit=1, max_limit=1)
+    held = limiter.acquire()
+    served = []
+
+    def wait_for_slot(name, priority):
+        ticket = limiter.acquire(priority, timeout=5)
+        served.append(name)
+        limiter.release(ticket)
+
+    threads = []
+    for name, priority in (('cold 1', PRIORITY_NORMAL), ('cold 2', PRIORITY_NORMAL), ('booking', PRIORITY_BOOKING)):
+        threads.append(threading.Thread(target=wait_for_slot, args=(name, priority)))
+        threads[-1].start()
+        time.sleep(0.05)
+
+    assert limiter.acquire(PRIORITY_NORMAL, timeout=0.05) is None
+    limiter.release(held)
+    for thread in threads:
+        thread.join(5)
+    assert served == ['booking', 'cold 1', 'cold 2']
+
+    assert call_priority('Booking') == PRIORITY_BOOKING
+    assert call_priority('New Lead', 'booking_node') == PRIORITY_BOOKING
+    assert call_priority('New Lead', 'sales_node') == PRIORITY_NORMAL
+
+
+def test_throttled_call_fails_at_the_deadline():
+    """Test a call that can't get a slot in time gives up instead of holding the webhook"""
+    limiter = ConcurrencyLimiter(initial=1, min_limit=1, max_limit=1)
+    held = limiter.acquire()
+    before = outcomes('throttled')
+    with request_deadline(1.2):
+        with pytest.raises(LLMUnavailable):
+            call_llm(lambda: 'reply', CHOICE, breaker=CircuitBreaker(), limiter=limiter)
+    assert outcomes('throttled') == before + 1
+    limiter.release(held)
+    assert limiter.in_flight == 0
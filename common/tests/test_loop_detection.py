@@ -0,0 +1,42 @@
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from common.loop_detection import LOOP_MAX_INBOUND, detect_loop, replies_suspended, suspension
+
+NOW = datetime(2024, 1, 15, 10, 30, tzinfo=timezone.utc)
+
+
+def messages(*contents, seconds_apart=20):
+    """Inbound messages with our reply after each, the last one seconds_apart before NOW"""
+    history = []
+    for index, content in enumerate(contents):
+        sent = (NOW - timedelta(seconds=seconds_apart * (len(contents) - index))).strftime('%Y-%m-%d %H:%M:%S')
+        history.append({'role': 'user', 'content': content, 'timestamp': sent})
+        history.append({'role': 'assistant', 'content': "Thanks, what's the make and model?", 'timestamp': sent})
+    return history
+
+
+def test_detect_loop():
+    """Test repeated auto-replies and inhuman message rates are caught, ordinary chats aren't"""
+    auto_reply = "Auto-reply: I'm away from my phone right now, I'll get back to you soon."
+    assert detect_loop(auto_reply, messages(auto_reply, auto_reply.upper()), NOW) == 'repeated_message'
+    assert detect_loop(auto_reply, messages(auto_reply), NOW) is None
+    # Too long ago to be part of this exchange
+    assert detect_loop(auto_reply, messages(auto_reply, auto_reply, seconds_apart=3600), NOW) is None
+    # People repeat short answers
+    assert detect_loop("yes", messages("yes", "yes"), NOW) is None
+
+    chat = [f"It's a {year} Honda Civic" for year in range(2000, 2000 + LOOP_MAX_INBOUND)]
+    assert detect_loop("Hello?", messages(*chat[:-2]), NOW) is None
+    assert detect_loop("Hello?", messages(*chat), NOW) == 'message_rate'
+
+
+def test_suspension_expires():
+    """Test a suspension only holds until its end time"""
+    context = {'replies_suspended': suspension('repeated_message', NOW)}
+    assert replies_suspended(context, NOW + timedelta(hours=1))
+    assert not replies_suspended(context, NOW + timedelta(days=1))
+    assert not replies_suspended({}, NOW)
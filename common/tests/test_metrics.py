@@ -0,0 +1,75 @@
+import os
+import sys
+import threading
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from common.metrics import Counter, Histogram, Registry, render_metrics
+import common.metrics as metrics
+
+
+def make_registry(monkeypatch):
+    registry = Registry()
+    monkeypatch.setattr(metrics, 'REGISTRY', registry)
+    return registry
+
+
+def test_counter(monkeypatch):
+    """Test counters add up per label and render in the Prometheus format"""
+    registry = make_registry(monkeypatch)
+    counter = Counter('test_messages_total', 'Messages', ('direction',))
+    counter.inc(direction='inbound')
+    counter.inc(2, direction='inbound')
+    counter.inc(direction='outbound')
+
+    output = registry.render()
+    assert '# TYPE test_messages_total counter' in output
+    assert 'test_messages_total{direction="inbound"} 3.0' in output
+    assert 'test_messages_total{direction="outbound"} 1.0' in output
+
+
+def test_histogram_buckets(monkeypatch):
+    """Test observations land in cumulative buckets with a sum and count"""
+    registry = make_registry(monkeypatch)
+    histogram = Histogram('test_latency_seconds', 'Latency', ('server',), buckets=(0.1, 1))
+    for value in (0.05, 0.5, 5):
+        histogram.observe(value, server='a')
+
+    output = registry.render()
+    assert 'test_latency_seconds_bucket{server="a",le="0.1"} 1' in output
+    assert 'test_latency_seconds_bucket{server="a",le="1.0"} 2' in output
+    assert 'test_latency_seconds_bucket{server="a",le="+Inf"} 3' in output
+    assert 'test_latency_seconds_count{server="a"} 3' in output
+
+
+def test_timer_decorator_is_reentrant(monkeypatch):
+    """Test a decorated function gets its own timer on every call, including concurrent ones"""
+    make_registry(monkeypatch)
+    histogram = Histogram('test_db_seconds', 'DB', ('operation',))
+
+    @histogram.time(operation='query')
+    def query():
+        return 42
+
+    threads = [threading.Thread(target=query) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert query() == 42
+    assert histogram.labels(operation='query').count == 11
+
+
+def test_label_values_are_escaped(monkeypatch):
+    registry = make_registry(monkeypatch)
+    Counter('test_errors_total', 'Errors', ('component',)).inc(component='a"b')
+    assert 'test_errors_total{component="a\\"b"} 1.0' in registry.render()
+
+
+def test_shared_metrics_render():
+    """Test the shared server metrics are all exposed"""
+    output = render_metrics()
+    for name in ('webhook_latency_seconds', 'llm_latency_seconds', 'db_latency_seconds',
+                 'sms_send_latency_seconds', 'messages_total', 'errors_total', 'cache_requests_total'):
+        assert f'# TYPE {name}' in output
@@ -0,0 +1,43 @@
+import os
+import sys
+
+from langchain_core.messages import AIMessage
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from common.metrics import LLM_TOKENS
+from common.model_router import MODEL_TIERS, ModelChoice, choose_model, record_usage
+
+
+def test_choose_model():
+    """Test short messages get the small model and pricing, booking and long messages the large one"""
+    assert choose_model("Hi there!").tier == 'small'
+    assert choose_model("My car has some dust on it").tier == 'standard'
+    assert choose_model("How much for an SUV?").tier == 'large'
+    assert choose_model("Which packages do you have? Do you come to me?").tier == 'large'
+    assert choose_model("Hi", node='booking_node').tier == 'large'
+    assert choose_model("Hi", stage='Qualified').tier == 'large'
+    assert choose_model("Hi").model == MODEL_TIERS['small']
+
+
+def test_model_options_override():
+    """Test a workflow node's modelOptions pin its tier or model"""
+    assert choose_model("How much for an SUV?", model_options={'tier': 'small'}) == ModelChoice(
+        'small', MODEL_TIERS['small']
+    )
+    assert choose_model("Hi", model_options={'model': 'gpt-4.1', 'newTemperature': 0.5}) == ModelChoice(
+        'custom', 'gpt-4.1'
+    )
+    assert choose_model("Hi", model_options={'tier': 'unknown'}).tier == 'small'
+
+
+def test_record_usage():
+    """Test tokens are counted by model and tier"""
+    choice = ModelChoice('small', 'test-model')
+    record_usage(choice, AIMessage(content="Hi", usage_metadata={
+        'input_tokens': 120, 'output_tokens': 30, 'total_tokens': 150
+    }))
+    record_usage(choice, AIMessage(content="Hi"))
+
+    assert LLM_TOKENS.labels(model='test-model', tier='small', kind='prompt').value == 120
+    assert LLM_TOKENS.labels(model='test-model', tier='small', kind='completion').value == 30
@@ -0,0 +1,95 @@
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from common.storage import ConversationState, PostgresStore, SQLiteStore, create_store
+
+# Set to a scratch database (e.g. postgresql://localhost/quote_agent_test) to run these against PostgreSQL too
+TEST_POSTGRES_URL = os.getenv('TEST_POSTGRES_URL')
+
+
+@pytest.fixture(params=['sqlite', 'postgres'])
+def store(request, tmp_path):
+    if request.param == 'sqlite':
+        yield SQLiteStore(str(tmp_path / 'sales_agent.db'), stats_cache_ttl=0)
+        return
+
+    if not TEST_POSTGRES_URL:
+        pytest.skip("TEST_POSTGRES_URL is not set")
+    store = PostgresStore(TEST_POSTGRES_URL, stats_cache_ttl=0)
+    with store._cursor() as cursor:
+        cursor.execute('''
+            TRUNCATE message_archive, messages, conversations, conversation_stats, pipeline_stage_stats, opt_outs,
+                     webhook_deliveries, graph_checkpoints, graph_checkpoint_blobs, graph_checkpoint_writes
+        ''')
+        store._rebuild_stats(cursor)
+    yield store
+    store.close()
+
+
+def test_conversation_round_trip(store):
+    """Test a conversation and its state are saved and loaded the same way on every backend"""
+    conversation_id = store.get_or_create_conversation('customer_1', 'New Lead')
+    assert store.get_or_create_conversation('customer_1') == conversation_id
+
+    state = ConversationState(
+        messages=[{"role": "user", "content": "Hi"}, {"role": "assistant", "content": "Hello!"}],
+        current_node='sales_node',
+        pipeline_stage='Qualified',
+        context={'car_size': 'SUV'},
+        last_updated=None,
+        customer_id='customer_1'
+    )
+    store.save_conversation_state(conversation_id, state)
+
+    loaded = store.load_conversation_state(conversation_id)
+    assert loaded.current_node == 'sales_node'
+    assert loaded.pipeline_stage == 'Qualified'
+    assert loaded.context == {'car_size': 'SUV'}
+    assert [m['content'] for m in loaded.messages] == ['Hi', 'Hello!']
+    assert isinstance(loaded.messages[0]['timestamp'], str)
+
+    assert [m['content'] for m in store.get_recent_messages('customer_1', limit=1)] == ['Hello!']
+    assert store.get_conversation_stats() == {
+        "unique_customers": 1,
+        "active_conversations": 1,
+        "total_conversations": 1,
+        "pipeline_breakdown": {'Qualified': 1}
+    }
+
+
+def test_archive(store):
+    """Test closing, archiving and vacuuming work on every backend"""
+    conversation_id = store.get_or_create_conversation('customer_1', 'New Lead')
+    store.add_message(conversation_id, 'user', 'Hi')
+    with store._cursor() as cursor:
+        cursor.execute("UPDATE conversations SET last_updated = '2000-01-01 00:00:00' WHERE id = ?", (conversation_id,))
+
+    assert store.close_idle_conversations(30) == 1
+    assert store.archive_old_messages(90) == 1
+    assert [m['content'] for m in store.get_archived_messages(conversation_id)] == ['Hi']
+    assert store.get_conversation_stats()['active_conversations'] == 0
+    store.vacuum()
+
+
+def test_sqlite_connection_per_thread(tmp_path):
+    """Test each thread reuses its own tuned SQLite connection"""
+    store = SQLiteStore(str(tmp_path / 'sales_agent.db'))
+    assert store._connection() is store._connection()
+    assert store._connection().execute('PRAGMA synchronous').fetchone()[0] == 1  # NORMAL
+
+    other = []
+    thread = threading.Thread(target=lambda: other.append(store._connection()))
+    thread.start()
+    thread.join()
+    assert other[0] is not store._connection()
+
+
+def test_create_store(tmp_path):
+    """Test create_store opens SQLite for paths and sqlite:/// URLs"""
+    assert create_store(str(tmp_path / 'a.db')).db_path == str(tmp_path / 'a.db')
+    assert create_store(f'sqlite:///{tmp_path}/b.db').db_path == f'{tmp_path}/b.db'
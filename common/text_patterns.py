@@ -0,0 +1,19 @@
+"""
+Regexes for contact details in free text, shared by the slot extractor (common/extraction.py) and log
+redaction (common/structured_logging.py) so an address the agent can read is also one the logs mask.
+Kept free of other imports, so loading the logger doesn't load the extractor's vocabularies.
+"""
+import re
+
+STREET_SUFFIXES = (
+    'st', 'street', 'ave', 'avenue', 'rd', 'road', 'blvd', 'boulevard', 'dr', 'drive', 'ln', 'lane', 'ct',
+    'court', 'way', 'pkwy', 'parkway', 'cir', 'circle', 'trl', 'trail', 'hwy', 'highway', 'pl', 'place', 'loop',
+    'cv', 'cove', 'pass', 'run', 'ter', 'terrace'
+)
+
+# A house number, up to four street name words and a suffix, with any apartment or unit after it
+ADDRESS_PATTERN = re.compile(
+    r"\b\d{1,6}\s+(?:[nsew]\.?\s+)?(?:[a-z0-9.'-]+\s+){0,3}?[a-z0-9.'-]+\s+(?:" + '|'.join(STREET_SUFFIXES) +
+    r")\b\.?(?:,?\s*(?:apt|unit|suite|ste|#)\.?\s*#?\w+)?",
+    re.I
+)
@@ -0,0 +1,10 @@
+"""
+Gunicorn settings, read automatically when gunicorn is started from the repository root.
+
+The servers don't configure logging on import, so each worker sends its logging through the JSON writer
+in common/structured_logging.py once it has been forked (the writer's thread wouldn't survive the fork).
+"""
+
+def post_fork(server, worker):
+    from common.structured_logging import configure_logging
+    configure_logging()
@@ -0,0 +1,84 @@
+import json
+import os
+import re
+import sys
+from datetime import datetime
+from typing import Optional
+
+ADDRESS_CACHE_FILE = os.getenv(
+    'ADDRESS_CACHE_FILE',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'address_cache.json')
+)
+
+# Common spellings that should map to the same cache entry
+ADDRESS_ABBREVIATIONS = {
+    'street': 'st',
+    'avenue': 'ave',
+    'road': 'rd',
+    'drive': 'dr',
+    'boulevard': 'blvd',
+    'lane': 'ln',
+    'court': 'ct',
+    'circle': 'cir',
+    'parkway': 'pkwy',
+    'highway': 'hwy',
+    'place': 'pl',
+    'trail': 'trl',
+    'north': 'n',
+    'south': 's',
+    'east': 'e',
+    'west': 'w',
+    'apartment': 'apt',
+    'suite': 'ste',
+}
+
+def normalize_address(address: str) -> str:
+    """Normalize a free-text address so small differences in typing hit the same cache entry"""
+    words = re.sub(r'[^a-z0-9#]+', ' ', address.lower()).split()
+    return ' '.join(ADDRESS_ABBREVIATIONS.get(word, word) for word in words)
+
+class AddressCache:
+    """Remembers which Fieldd address dropdown choice each Quote_Address resolved to"""
+
+    def __init__(self, cache_file: str = ADDRESS_CACHE_FILE):
+        self.cache_file = cache_file
+        self.entries = self._load()
+
+    def _load(self) -> dict:
+        """Load cached choices from the JSON file"""
+        try:
+            if os.path.exists(self.cache_file):
+                with open(self.cache_file, 'r') as f:
+                    return json.load(f)
+        except Exception as e:
+            print(f"Warning: Could not load address cache: {str(e)}", file=sys.stderr)
+        return {}
+
+    def _save(self):
+        """Save cached choices to the JSON file"""
+        try:
+            with open(self.cache_file, 'w') as f:
+                json.dump(self.entries, f, indent=2)
+        except Exception as e:
+            print(f"Warning: Could not save address cache: {str(e)}", file=sys.stderr)
+
+    def get(self, address: str) -> Optional[str]:
+        """Get the dropdown choice this address resolved to last time, if any"""
+        entry = self.entries.get(normalize_address(address))
+        return entry['choice'] if entry else None
+
+    def set(self, address: str, choice: str):
+        """Remember the dropdown choice picked for this address"""
+        key = normalize_address(address)
+        if not key or not choice:
+            return
+        self.entries[key] = {
+            'choice': choice,
+            'resolved_at': datetime.now().isoformat()
+        }
+        self._save()
+
+    def forget(self, address: str):
+        """Drop a cached choice that no longer shows up in the dropdown"""
+        if self.entries.pop(normalize_address(address), None):
+            self._save()
@@ -0,0 +1,148 @@
+import asyncio
+import json
+import os
+import sys
+from browser_use import Browser, BrowserConfig
+from browser_use.browser.context import BrowserContextConfig
+from scripted_quote import FIELDD_PLANNER_URL
+
+# Cookies are shared by every browser in the pool so one login covers all of them
+FIELDD_COOKIES_FILE = os.getenv(
+    'FIELDD_COOKIES_FILE',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fieldd_cookies.json')
+)
+
+HEALTH_CHECK_TIMEOUT = 10
+
+class PooledBrowser:
+    """A pre-launched browser and context that can be handed to a quote job"""
+    def __init__(self, browser, context):
+        self.browser = browser
+        self.context = context
+        self.jobs_run = 0
+
+class BrowserPool:
+    """Pool of warm browsers that stay logged into Fieldd between quote jobs"""
+
+    def __init__(self, size=1, max_jobs_per_browser=20, headless=True, cookies_file=FIELDD_COOKIES_FILE):
+        self.size = size
+        self.max_jobs_per_browser = max_jobs_per_browser
+        self.headless = headless
+        self.cookies_file = cookies_file
+        # Holds a PooledBrowser, or None for a slot that needs a browser launched
+        self._available = asyncio.Queue()
+        # Every browser shares cookies_file, so saves take turns and only write a session that changed
+        self._save_lock = asyncio.Lock()
+        self._saved_cookies = self._read_cookies()
+
+    def _read_cookies(self):
+        try:
+            with open(self.cookies_file, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    async def save_session(self, pooled):
+        """Save a browser's Fieldd cookies if they differ from the saved ones (e.g. after a login)"""
+        async with self._save_lock:
+            cookies = await pooled.context.session.context.cookies()
+            if cookies == self._saved_cookies:
+                return
+            # Write then rename, so a browser launching meanwhile never reads half a file
+            temp_file = f"{self.cookies_file}.tmp"
+            with open(temp_file, 'w') as f:
+                json.dump(cookies, f)
+            os.replace(temp_file, self.cookies_file)
+            self._saved_cookies = cookies
+
+    async def start(self):
+        """Launch all browsers up front so the first jobs don't pay for it"""
+        print(f"Launching {self.size} browsers...", file=sys.stderr)
+        for _ in range(self.size):
+            try:
+                self._available.put_nowait(await self._launch())
+            except Exception as e:
+                print(f"Warning: Could not launch browser, will retry on first use: {str(e)}", file=sys.stderr)
+                self._available.put_nowait(None)
+
+    async def _launch(self):
+        """Start a browser, restore the saved Fieldd session and open the planner page"""
+        browser = Browser(
+            config=BrowserConfig(
+                headless=self.headless,
+                disable_images=True,  # Disable image loading
+                disable_javascript=False,  # Keep JavaScript enabled for form interactions
+                disable_css=False  # Keep CSS enabled for proper UI rendering
+            )
+        )
+        try:
+            context = await browser.new_context(BrowserContextConfig(cookies_file=self.cookies_file))
+            page = await context.get_current_page()
+            # The cookies are loaded now. Without the file browser_use would also write it on every agent step
+            # and on close, outside _save_lock, so only save_session writes it.
+            context.config.cookies_file = None
+            await page.goto(FIELDD_PLANNER_URL)
+        except Exception:
+            await browser.close()
+            raise
+        return PooledBrowser(browser, context)
+
+    async def _close(self, pooled):
+        """Close a pooled browser, ignoring errors from browsers that already died"""
+        try:
+            await pooled.context.close()
+            await pooled.browser.close()
+        except Exception as e:
+            print(f"Warning: Error closing browser: {str(e)}", file=sys.stderr)
+
+    async def is_healthy(self, pooled):
+        """Check the browser still responds"""
+        try:
+            page = await asyncio.wait_for(pooled.context.get_current_page(), timeout=HEALTH_CHECK_TIMEOUT)
+            await asyncio.wait_for(page.evaluate('1'), timeout=HEALTH_CHECK_TIMEOUT)
+            return True
+        except Exception:
+            return False
+
+    async def acquire(self):
+        """Wait for a free browser, replacing it first if it's worn out or unhealthy"""
+        pooled = await self._available.get()
+        try:
+            if pooled and pooled.jobs_run >= self.max_jobs_per_browser:
+                print(f"Recycling browser after {pooled.jobs_run} jobs", file=sys.stderr)
+                await self._close(pooled)
+                pooled = None
+            elif pooled and not await self.is_healthy(pooled):
+                print("Browser failed health check, replacing it", file=sys.stderr)
+                await self._close(pooled)
+                pooled = None
+
+            if pooled is None:
+                pooled = await self._launch()
+            return pooled
+        except BaseException:
+            # Give the slot back so the pool doesn't shrink
+            self._available.put_nowait(None)
+            raise
+
+    async def release(self, pooled, recycle=False):
+        """Return a browser to the pool, saving the session so new browsers start logged in"""
+        pooled.jobs_run += 1
+        try:
+            await self.save_session(pooled)
+        except Exception as e:
+            print(f"Warning: Could not save Fieldd session: {str(e)}", file=sys.stderr)
+
+        if recycle:
+            # The job failed part way, so the page could be in any state
+            await self._close(pooled)
+            self._available.put_nowait(None)
+        else:
+            self._available.put_nowait(pooled)
+
+    async def close(self):
+        """Close every idle browser in the pool"""
+        while not self._available.empty():
+            pooled = self._available.get_nowait()
+            if pooled:
+                await self._close(pooled)
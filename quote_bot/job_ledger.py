@@ -0,0 +1,218 @@
+import argparse
+import json
+import os
+import sqlite3
+from typing import Any, Dict, List, Optional, Tuple
+
+QUOTE_JOBS_DB = os.getenv(
+    'QUOTE_JOBS_DB',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'quote_jobs.db')
+)
+
+class QuoteJobError(Exception):
+    """Raised when a quote job fails, saying whether it's worth trying again"""
+    def __init__(self, message: str, retryable: bool = True):
+        super().__init__(message)
+        self.retryable = retryable
+
+class JobLedger:
+    """SQLite record of every quote job: its input, step timings, outcome and error"""
+
+    def __init__(self, db_path: str = QUOTE_JOBS_DB):
+        self.db_path = db_path
+        self.init_database()
+
+    def init_database(self):
+        """Initialize the database with required tables"""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS quote_jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    source_job_id TEXT,  -- id from the webhook server
+                    data TEXT,  -- JSON webhook data
+                    status TEXT DEFAULT 'pending',  -- pending, running, succeeded or failed
+                    backend TEXT,
+                    attempts INTEGER DEFAULT 0,
+                    error TEXT,
+                    retryable BOOLEAN,
+                    only_backend TEXT,  -- the one backend retries may use, after it may have created the quote
+                    step_timings TEXT,  -- JSON {step name: seconds} from the last attempt
+                    created_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    started_at TIMESTAMP,
+                    finished_at TIMESTAMP
+                )
+            ''')
+
+            # Ledgers from before only_backend was recorded
+            try:
+                cursor.execute('ALTER TABLE quote_jobs ADD COLUMN only_backend TEXT')
+            except sqlite3.OperationalError:
+                pass
+
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_quote_jobs_status
+                ON quote_jobs(status)
+            ''')
+
+            # Where the listener got to in the webhook server's job queue, so a restart carries on from there
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS job_cursor (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    server_id TEXT,
+                    last_id INTEGER
+                )
+            ''')
+
+            conn.commit()
+
+    def record_job(self, data: Dict[str, Any], source_job_id: Any = None) -> int:
+        """Record a new job, returns its ledger ID"""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+
+            cursor.execute('''
+                INSERT INTO quote_jobs (source_job_id, data)
+                VALUES (?, ?)
+            ''', (str(source_job_id) if source_job_id is not None else None, json.dumps(data)))
+
+            return cursor.lastrowid
+
+    def mark_running(self, ledger_id: int):
+        """Mark the start of an attempt"""
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute('''
+                UPDATE quote_jobs
+                SET status = 'running', attempts = attempts + 1, started_at = CURRENT_TIMESTAMP,
+                    finished_at = NULL
+                WHERE id = ?
+            ''', (ledger_id,))
+
+    def mark_succeeded(self, ledger_id: int, backend: str, step_timings: Dict[str, float]):
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute('''
+                UPDATE quote_jobs
+                SET status = 'succeeded', backend = ?, error = NULL, retryable = NULL,
+                    step_timings = ?, finished_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            ''', (backend, json.dumps(step_timings), ledger_id))
+
+    def mark_failed(self, ledger_id: int, error: str, retryable: bool, step_timings: Dict[str, float],
+                    only_backend: Optional[str] = None):
+        """Mark an attempt failed, only_backend is kept for replays once set"""
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute('''
+                UPDATE quote_jobs
+                SET status = 'failed', error = ?, retryable = ?, step_timings = ?,
+                    only_backend = COALESCE(?, only_backend), finished_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            ''', (error, retryable, json.dumps(step_timings), only_backend, ledger_id))
+
+    def fail_interrupted_jobs(self) -> int:
+        """
+        Mark jobs left running by an agent that stopped part way as failed, so they can be replayed.
+        Only call this when no other agent is running jobs. Returns how many there were.
+        """
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.execute('''
+                UPDATE quote_jobs
+                SET status = 'failed', retryable = 0, finished_at = CURRENT_TIMESTAMP,
+                    error = 'Interrupted by an agent restart, the quote may have been sent - check Fieldd before replaying'
+                WHERE status = 'running'
+            ''')
+            return cursor.rowcount
+
+    def get_failed_jobs(self, ledger_ids: Optional[List[int]] = None) -> List[Dict]:
+        """Get failed jobs (optionally only the given IDs) with their webhook data, oldest first"""
+        return self._get_jobs('failed', ledger_ids)
+
+    def get_pending_jobs(self) -> List[Dict]:
+        """Get jobs that were received but never started (e.g. before a restart), oldest first"""
+        return self._get_jobs('pending')
+
+    def _get_jobs(self, status: str, ledger_ids: Optional[List[int]] = None) -> List[Dict]:
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+
+            query = "SELECT id, source_job_id, data, attempts, error, only_backend FROM quote_jobs WHERE status = ?"
+            params = [status]
+            if ledger_ids:
+                query += f" AND id IN ({', '.join('?' for _ in ledger_ids)})"
+                params += list(ledger_ids)
+            cursor.execute(query + " ORDER BY id", params)
+
+            return [
+                {
+                    "id": row[0],
+                    "source_job_id": row[1],
+                    "data": json.loads(row[2]),
+                    "attempts": row[3],
+                    "error": row[4],
+                    "only_backend": row[5]
+                }
+                for row in cursor.fetchall()
+            ]
+
+    def get_cursor(self) -> Tuple[Optional[str], int]:
+        """The (server ID, last job ID) the listener had received up to, (None, 0) before the first job"""
+        with sqlite3.connect(self.db_path) as conn:
+            row = conn.execute('SELECT server_id, last_id FROM job_cursor WHERE id = 1').fetchone()
+            return (row[0], row[1]) if row else (None, 0)
+
+    def save_cursor(self, server_id: Optional[str], last_id: int):
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute('''
+                INSERT INTO job_cursor (id, server_id, last_id) VALUES (1, ?, ?)
+                ON CONFLICT (id) DO UPDATE SET server_id = excluded.server_id, last_id = excluded.last_id
+            ''', (server_id, last_id))
+
+    def list_jobs(self, status: Optional[str] = None, limit: int = 20) -> List[Dict]:
+        """Get the most recent jobs, optionally only those with the given status"""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+
+            query = '''
+                SELECT id, source_job_id, status, backend, attempts, error, step_timings,
+                       created_date, finished_at
+                FROM quote_jobs
+            '''
+            params = []
+            if status:
+                query += " WHERE status = ?"
+                params.append(status)
+            cursor.execute(query + " ORDER BY id DESC LIMIT ?", params + [limit])
+
+            return [
+                {
+                    "id": row[0],
+                    "source_job_id": row[1],
+                    "status": row[2],
+                    "backend": row[3],
+                    "attempts": row[4],
+                    "error": row[5],
+                    "step_timings": json.loads(row[6]) if row[6] else {},
+                    "created_date": row[7],
+                    "finished_at": row[8]
+                }
+                for row in cursor.fetchall()
+            ]
+
+def main():
+    """Show recent quote jobs. Use `python local_agent.py replay` to re-run failed ones."""
+    parser = argparse.ArgumentParser(description="Show recent quote jobs")
+    parser.add_argument('--status', choices=['pending', 'running', 'succeeded', 'failed'])
+    parser.add_argument('--limit', type=int, default=20)
+    args = parser.parse_args()
+
+    ledger = JobLedger()
+    for job in ledger.list_jobs(args.status, args.limit):
+        print(f"#{job['id']} [{job['status']}] attempts={job['attempts']} backend={job['backend'] or '-'} "
+              f"created={job['created_date']}")
+        if job['step_timings']:
+            print("    steps: " + ", ".join(f"{step}={seconds}s" for step, seconds in job['step_timings'].items()))
+        if job['error']:
+            print(f"    error: {job['error']}")
+
+if __name__ == "__main__":
+    main()
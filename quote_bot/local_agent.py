@@ -1,13 +1,26 @@
 import requests
-import json
-import time
 import asyncio
+import argparse
 import sys
 import os
 from browser_use import Agent, Browser, BrowserConfig
+from browser_pool import BrowserPool
+from scripted_quote import ScriptedQuoteRunner, ScriptedOutcomeUnknown, ScriptedStepError
+from quote_backends import FielddAPIQuoteBackend, BrowserQuoteBackend, QuoteOutcomeUnknown, create_quote
+from address_cache import AddressCache
+from package_catalog import PACKAGE_CATALOG_RETRY_SECONDS, PackageCatalog
+from job_ledger import JobLedger, QuoteJobError
+from step_timings import AgentStepTimer, start_job_timings, time_step
 from langchain_openai import ChatOpenAI
 from dotenv import load_dotenv
 
+# Shared code lives in common/ at the repo root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.model_router import model_for_tier
+from common.structured_logging import configure_logging, get_logger, log_event, log_payload
+
+logger = get_logger(__name__)
+
 # Load environment variables
 load_dotenv()
 
@@ -15,6 +28,44 @@ load_dotenv()
 FIELDD_USERNAME = os.getenv('FIELDD_USERNAME')
 FIELDD_PASSWORD = os.getenv('FIELDD_PASSWORD')
 COMPANY_CITY = os.getenv('COMPANY_CITY')
+WEBHOOK_SERVER_URL = os.getenv('WEBHOOK_SERVER_URL', 'https://ghlwebhook-production.up.railway.app')
+
+# Long-poll settings for receiving jobs from the webhook server
+LONG_POLL_TIMEOUT = 25
+MAX_RECONNECT_DELAY = 60
+
+# Worker pool settings - how many quotes run at once and how long each may take
+MAX_CONCURRENT_QUOTES = int(os.getenv('MAX_CONCURRENT_QUOTES', 1))
+QUOTE_TIMEOUT_SECONDS = int(os.getenv('QUOTE_TIMEOUT_SECONDS', 600))
+
+# Transient failures are retried this many times in total, waiting longer each time
+MAX_JOB_ATTEMPTS = int(os.getenv('MAX_JOB_ATTEMPTS', 3))
+RETRY_DELAY_SECONDS = int(os.getenv('RETRY_DELAY_SECONDS', 30))
+
+# Warm browser pool settings - browsers are replaced after this many quotes
+BROWSER_MAX_JOBS = int(os.getenv('BROWSER_MAX_JOBS', 20))
+BROWSER_HEADLESS = os.getenv('BROWSER_HEADLESS', 'True').lower() == 'true'
+
+# Try the scripted (no LLM) quote flow before falling back to the browser agent
+USE_SCRIPTED_QUOTES = os.getenv('USE_SCRIPTED_QUOTES', 'True').lower() == 'true'
+
+# Driving the Fieldd web app needs the large model tier (LLM_MODEL_LARGE)
+BROWSER_AGENT_MODEL = model_for_tier('large')
+
+# One HTTP session reused for every call to the webhook server
+session = requests.Session()
+
+# Dropdown choices that past quotes' addresses resolved to
+address_cache = AddressCache()
+
+# Fieldd service packages, used to resolve Quote_Package/Quote_Car_Size before starting a quote
+package_catalog = PackageCatalog()
+
+# Record of every quote job and how it went
+job_ledger = JobLedger()
+
+# Keys of jobs cancelled by the timeout after the scripted flow clicked Send Quote
+unconfirmed_sends = set()
 
 # Verify environment variables are loaded
 if not all([FIELDD_USERNAME, FIELDD_PASSWORD, COMPANY_CITY]):
@@ -28,7 +79,7 @@ if not all([FIELDD_USERNAME, FIELDD_PASSWORD, COMPANY_CITY]):
 extend_system_message = """
 When creating a quote in Fieldd CRM:
 1. Navigate to https://admin.fieldd.co/#!/company/schedule/planner
-2. Log into fieldd: 
+2. If the login page is shown (skip this step if the planner is already open), log into fieldd: 
    - Enter email using the "email" login field:
    - Username: {FIELDD_USERNAME}
    - Hit the "next" arrow button to open the password field
@@ -82,29 +133,17 @@ extend_system_message = extend_system_message.replace("{FIELDD_USERNAME}", FIELD
 extend_system_message = extend_system_message.replace("{FIELDD_PASSWORD}", FIELDD_PASSWORD)
 extend_system_message = extend_system_message.replace("{COMPANY_CITY}", COMPANY_CITY)
 
-def clear_webhook_data():
-    """Clear any existing webhook data when starting up"""
-    try:
-        print("\nClearing any existing webhook data...", file=sys.stderr)
-        # Send empty data to clear the webhook
-        response = requests.post(
-            'https://ghlwebhook-production.up.railway.app/webhook',
-            json={"clear": True}
-        )
-        if response.status_code == 200:
-            print("Webhook data cleared successfully", file=sys.stderr)
-        else:
-            print(f"Warning: Could not clear webhook data. Status code: {response.status_code}", file=sys.stderr)
-    except Exception as e:
-        print(f"Warning: Error clearing webhook data: {str(e)}", file=sys.stderr)
-
-async def run_automation(data):
+async def run_automation(data, quote_backends=None, job_key=None, only_backend=None, attempted=None):
+    """
+    Create a quote from webhook data, returns (backend name, result) or raises on failure.
+    job_key is sent as the API's idempotency key, only_backend limits the job to one backend,
+    and each backend tried is added to attempted as it starts.
+    """
     try:
         print("\n=== Starting Automation ===", file=sys.stderr)
         
-        # Print raw data for debugging
-        print("\n=== Raw Webhook Data ===", file=sys.stderr)
-        print(json.dumps(data, indent=2), file=sys.stderr)
+        # Log the raw data for debugging (redacted, and only in full for a sample of jobs)
+        log_payload(logger, "job_data_received", data)
         
         # Extract customer info from custom Quote_ fields
         custom_data = data.get('customData', {})
@@ -115,101 +154,375 @@ async def run_automation(data):
             'phone': custom_data.get('Quote_Phone', ''),
             'address': custom_data.get('Quote_Address', ''),
             'service_request': custom_data.get('Quote_Package', ''),
-            'car_size': custom_data.get('Quote_Car_Size', '')
+            'car_size': custom_data.get('Quote_Car_Size', ''),
+            'job_key': job_key
         }
         
-        # Print extracted data
-        print("\n=== Extracted Webhook Data ===", file=sys.stderr)
-        print("First Name:", customer_data.get('first_name', 'Not found'), file=sys.stderr)
-        print("Last Name:", customer_data.get('last_name', 'Not found'), file=sys.stderr)
-        print("Customer Email:", customer_data.get('email', 'Not found'), file=sys.stderr)
-        print("Customer Phone:", customer_data.get('phone', 'Not found'), file=sys.stderr)
-        print("Customer Address:", customer_data.get('address', 'Not found'), file=sys.stderr)
-        print("Service Request:", customer_data.get('service_request', 'Not found'), file=sys.stderr)
-        print("Car Size:", customer_data.get('car_size', 'Not found'), file=sys.stderr)
+        # Log which fields came through, contact details are redacted
+        log_event(logger, "customer_data_extracted", **{
+            field: value or 'Not found' for field, value in customer_data.items() if field != 'job_key'
+        })
         
         # Ask for confirmation
         # input("\nPress Enter to proceed with quote creation using this data...")
         
+        # Resolve the exact Fieldd package up front so a bad package fails fast instead of in the browser
+        if package_catalog.is_loaded():
+            with time_step('package_match'):
+                package = package_catalog.match(customer_data['service_request'], customer_data['car_size'])
+            if not package:
+                # Retrying won't help until the job data or the catalog changes
+                raise QuoteJobError(
+                    f"No Fieldd package matches '{customer_data['service_request']}' "
+                    f"for car size '{customer_data['car_size']}'",
+                    retryable=False
+                )
+            print(f"Matched Fieldd package: {package['name']} {package['car_size']} (id {package['id']})", file=sys.stderr)
+            customer_data['package_id'] = package['id']
+            customer_data['package_name'] = package['name']
+            customer_data['package_car_size'] = package['car_size']
+        
+        # Without a configured set of backends, fall back to a fresh browser per quote
+        if quote_backends is None:
+            quote_backends = [BrowserQuoteBackend(run_browser_quote)]
+        
+        # A job can ask for a specific backend with the Quote_Backend field ("api" or "browser")
+        backend_name, result = await create_quote(
+            customer_data,
+            quote_backends,
+            preferred=custom_data.get('Quote_Backend'),
+            only=only_backend,
+            attempted=attempted
+        )
+        print(f"=== Automation Complete (using {backend_name}) ===\n", file=sys.stderr)
+        return backend_name, result
+        
+    except Exception as e:
+        print(f"Error in automation: {str(e)}", file=sys.stderr)
+        raise
+
+async def run_browser_quote(customer_data, browser_pool=None):
+    """Create the quote in the Fieldd web app, returning None if it fails"""
+    browser = None
+    pooled = None
+    result = None
+    try:
+        # If we've seen this address before, type the exact choice so the dropdown only has one match
+        customer_address = address_cache.get(customer_data['address']) or customer_data['address']
+        
+        # Times each of the agent's steps, by the actions it took
+        step_timer = AgentStepTimer()
+        
         # Format the system message with customer data
         formatted_message = extend_system_message.format(
             first_name=customer_data['first_name'],
             last_name=customer_data['last_name'],
             customer_email=customer_data['email'],
             customer_phone=customer_data['phone'],
-            customer_address=customer_data['address'],
-            service_request=customer_data['service_request'],
-            car_size=customer_data['car_size']
+            customer_address=customer_address,
+            service_request=customer_data.get('package_name') or customer_data['service_request'],
+            car_size=customer_data.get('package_car_size') or customer_data['car_size']
         )
         
-        # Create a new browser instance
-        browser = Browser(
-            config=BrowserConfig(
-                headless=False,  # Fresh instance for Fieldd
-                disable_images=True,  # Disable image loading
-                disable_javascript=False,  # Keep JavaScript enabled for form interactions
-                disable_css=False  # Keep CSS enabled for proper UI rendering
+        if browser_pool:
+            # Borrow a warm browser that is already logged into Fieldd
+            with time_step('browser_acquire'):
+                pooled = await browser_pool.acquire()
+            
+            if USE_SCRIPTED_QUOTES:
+                # Raises QuoteOutcomeUnknown rather than letting the agent redo a quote that may have been sent
+                result = await run_scripted_quote(pooled, customer_data)
+                if result:
+                    return result
+            
+            agent = Agent(
+                task="Create a new quote in Fieldd CRM using the extracted GHL data",
+                llm=ChatOpenAI(model=BROWSER_AGENT_MODEL.model),
+                browser=pooled.browser,
+                browser_context=pooled.context,
+                extend_system_message=formatted_message,
+                register_new_step_callback=step_timer
+            )
+        else:
+            # Create a new browser instance (each job gets its own so concurrent jobs stay isolated)
+            browser = Browser(
+                config=BrowserConfig(
+                    headless=False,  # Fresh instance for Fieldd
+                    disable_images=True,  # Disable image loading
+                    disable_javascript=False,  # Keep JavaScript enabled for form interactions
+                    disable_css=False  # Keep CSS enabled for proper UI rendering
+                )
+            )
+            
+            # Create a new agent with the formatted message
+            agent = Agent(
+                task="Create a new quote in Fieldd CRM using the extracted GHL data",
+                llm=ChatOpenAI(model=BROWSER_AGENT_MODEL.model),
+                browser=browser,
+                extend_system_message=formatted_message,
+                register_new_step_callback=step_timer
             )
-        )
-        
-        # Create a new agent with the formatted message
-        agent = Agent(
-            task="Create a new quote in Fieldd CRM using the extracted GHL data",
-            llm=ChatOpenAI(model='gpt-4o'),
-            browser=browser,
-            extend_system_message=formatted_message
-        )
         
         # Run the agent
         print("\n=== Starting Fieldd Quote Creation ===", file=sys.stderr)
-        result = await agent.run()
-        print("=== Automation Complete ===\n", file=sys.stderr)
-        
-        # Close the browser
-        await browser.close()
+        with time_step('browser_agent'):
+            try:
+                result = await agent.run()
+            finally:
+                step_timer.finish()
         return result
         
+    except QuoteOutcomeUnknown:
+        raise
     except Exception as e:
-        print(f"Error in automation: {str(e)}", file=sys.stderr)
+        print(f"Error in browser automation: {str(e)}", file=sys.stderr)
         return None
+    
+    finally:
+        # Close or return the browser, also when the job is cancelled by a timeout
+        if browser:
+            await browser.close()
+        if pooled:
+            await browser_pool.release(pooled, recycle=result is None)
 
-def check_webhook_data():
-    """Check for new webhook data from Railway"""
+async def run_scripted_quote(pooled, customer_data):
+    """
+    Create the quote without the LLM, returning None if any step fails before the quote is sent
+    and raising QuoteOutcomeUnknown if one fails after
+    """
+    print("\n=== Starting Scripted Fieldd Quote Creation ===", file=sys.stderr)
+    page = await pooled.context.get_current_page()
+    runner = ScriptedQuoteRunner(
+        page, customer_data, FIELDD_USERNAME, FIELDD_PASSWORD, COMPANY_CITY,
+        address_cache=address_cache
+    )
     try:
-        print("\nChecking for new webhook data...", file=sys.stderr)
-        # Get the latest webhook data from Railway
-        response = requests.get('https://ghlwebhook-production.up.railway.app/latest_webhook')
-        print(f"Response status code: {response.status_code}", file=sys.stderr)
-        
-        if response.status_code == 200:
-            response_data = response.json()
-            print(f"Response data: {json.dumps(response_data, indent=2)}", file=sys.stderr)
-            
-            if response_data.get('data_received'):
-                print("New data received! Starting automation...", file=sys.stderr)
-                # Pass the nested data to run_automation
-                asyncio.run(run_automation(response_data['data']))
-            else:
-                print("No new data received", file=sys.stderr)
+        await runner.run()
+        print("=== Scripted Quote Complete ===\n", file=sys.stderr)
+        return "Quote sent by scripted flow"
+    except ScriptedOutcomeUnknown as e:
+        # Send Quote was clicked, Fieldd may have sent the quote, so nothing may run it again
+        raise QuoteOutcomeUnknown(f"Scripted quote failed after sending: {str(e)}", retryable=False) from e
+    except asyncio.CancelledError:
+        # Timed out, run_job has to know whether the quote may already be on its way
+        if runner.send_clicked:
+            unconfirmed_sends.add(customer_data['job_key'])
+        raise
+    except ScriptedStepError as e:
+        print(f"Scripted quote failed, falling back to browser agent: {str(e)}", file=sys.stderr)
+        return None
+
+async def refresh_package_catalog():
+    """Keep the package catalog up to date in the background, retrying failed refreshes with backoff"""
+    if not package_catalog.api_key:
+        # Nothing to refresh from, the saved catalog (if any) is used as it is
+        return
+    
+    retry_delay = PACKAGE_CATALOG_RETRY_SECONDS
+    while True:
+        if await package_catalog.refresh_if_stale():
+            retry_delay = PACKAGE_CATALOG_RETRY_SECONDS
+            await asyncio.sleep(max(package_catalog.seconds_until_stale(), PACKAGE_CATALOG_RETRY_SECONDS))
         else:
-            print(f"Error: Received status code {response.status_code}", file=sys.stderr)
-            
+            print(f"Retrying the package catalog refresh in {retry_delay} seconds", file=sys.stderr)
+            await asyncio.sleep(retry_delay)
+            retry_delay = min(retry_delay * 2, package_catalog.max_age.total_seconds())
+
+async def run_job(job, quote_backends=None):
+    """
+    Run one attempt of a job, giving up after QUOTE_TIMEOUT_SECONDS, and record it in the job ledger.
+    
+    Returns:
+        bool: True if the attempt failed in a way that's worth retrying
+    """
+    if 'ledger_id' not in job:
+        job['ledger_id'] = job_ledger.record_job(job['data'], job['id'])
+    job['attempt'] = job.get('attempt', 0) + 1
+    
+    job_ledger.mark_running(job['ledger_id'])
+    step_timings = start_job_timings(job['ledger_id'])
+    # Keyed on the ledger entry, so re-queued and replayed attempts reuse the same idempotency key
+    job_key = f"quote-job-{job['ledger_id']}"
+    attempted = []
+    try:
+        backend_name, result = await asyncio.wait_for(
+            run_automation(job['data'], quote_backends, job_key, job.get('only_backend'), attempted),
+            timeout=QUOTE_TIMEOUT_SECONDS
+        )
+        job_ledger.mark_succeeded(job['ledger_id'], backend_name, step_timings)
+        return False
+    except QuoteOutcomeUnknown as e:
+        # Only the same backend (and idempotency key) can safely try again
+        job['only_backend'] = e.backend
+        error, retryable = str(e), e.retryable
+    except asyncio.TimeoutError:
+        error, retryable = f"Timed out after {QUOTE_TIMEOUT_SECONDS} seconds", True
+        if attempted:
+            # The backend that was cut off may still create the quote, only it can safely try again
+            job['only_backend'] = attempted[-1]
+        if job_key in unconfirmed_sends:
+            unconfirmed_sends.discard(job_key)
+            error, retryable = f"{error}, after the quote was sent", False
+    except QuoteJobError as e:
+        error, retryable = str(e), e.retryable
     except Exception as e:
-        print(f"Error checking webhook: {str(e)}", file=sys.stderr)
+        error, retryable = str(e), True
+    
+    print(f"Job {job['id']} attempt {job['attempt']} failed: {error}", file=sys.stderr)
+    job_ledger.mark_failed(job['ledger_id'], error, retryable, step_timings, job.get('only_backend'))
+    return retryable and job['attempt'] < job.get('max_attempts', MAX_JOB_ATTEMPTS)
+
+async def quote_worker(worker_id, job_queue, quote_backends=None):
+    """Take jobs off the queue and run them one at a time"""
+    while True:
+        job = await job_queue.get()
+        try:
+            print(f"Worker {worker_id} starting job {job['id']}", file=sys.stderr)
+            if await run_job(job, quote_backends):
+                # Put it back on the queue later rather than holding up this worker
+                delay = RETRY_DELAY_SECONDS * 2 ** (job['attempt'] - 1)
+                print(f"Retrying job {job['id']} in {delay} seconds", file=sys.stderr)
+                asyncio.get_running_loop().call_later(delay, job_queue.put_nowait, job)
+        finally:
+            job_queue.task_done()
+
+def wait_for_jobs(after_id, server_id=None):
+    """Block until the webhook server has jobs newer than after_id (or the long-poll times out)"""
+    response = session.get(
+        f'{WEBHOOK_SERVER_URL}/jobs/wait',
+        params={'after': after_id, 'server_id': server_id, 'timeout': LONG_POLL_TIMEOUT},
+        timeout=LONG_POLL_TIMEOUT + 10
+    )
+    response.raise_for_status()
+    return response.json()
+
+async def start_workers(job_queue):
+    """Start the browser pool and the workers that take jobs off job_queue"""
+    # One warm browser per worker
+    browser_pool = BrowserPool(
+        size=MAX_CONCURRENT_QUOTES,
+        max_jobs_per_browser=BROWSER_MAX_JOBS,
+        headless=BROWSER_HEADLESS
+    )
+    await browser_pool.start()
+    
+    # Send quotes straight to the Fieldd API when we can, using the browser as a fallback
+    # when the API definitely didn't create the quote
+    quote_backends = [
+        FielddAPIQuoteBackend(max_connections=MAX_CONCURRENT_QUOTES),
+        BrowserQuoteBackend(lambda customer_data: run_browser_quote(customer_data, browser_pool))
+    ]
+    
+    # Keep a reference to the worker tasks so they aren't garbage collected
+    workers = [
+        asyncio.create_task(quote_worker(worker_id, job_queue, quote_backends))
+        for worker_id in range(1, MAX_CONCURRENT_QUOTES + 1)
+    ]
+    workers.append(asyncio.create_task(refresh_package_catalog()))
+    return browser_pool, quote_backends, workers
+
+async def stop_workers(browser_pool, quote_backends, workers):
+    """Cancel the workers and close the browsers and the API backend's connections"""
+    for worker in workers:
+        worker.cancel()
+    for backend in quote_backends:
+        await backend.close()
+    await browser_pool.close()
+
+async def listen_for_jobs():
+    """Receive jobs from the webhook server as soon as they arrive and hand them to the worker pool"""
+    job_queue = asyncio.Queue()
+    browser_pool, quote_backends, workers = await start_workers(job_queue)
+    
+    # Jobs a stopped agent was part way through go to the failed jobs for replay, they can't safely be rerun here
+    interrupted = job_ledger.fail_interrupted_jobs()
+    if interrupted:
+        print(f"{interrupted} jobs were interrupted by the last shutdown, replay them once checked", file=sys.stderr)
+    
+    # Jobs received before a restart that never started, and where the job stream got to
+    for pending_job in job_ledger.get_pending_jobs():
+        job_queue.put_nowait({
+            'id': pending_job['source_job_id'],
+            'data': pending_job['data'],
+            'ledger_id': pending_job['id']
+        })
+    server_id, after_id = job_ledger.get_cursor()
+    reconnect_delay = 1
+    
+    try:
+        while True:
+            try:
+                # The long-poll blocks, so run it off the event loop to keep the workers going
+                response_data = await asyncio.to_thread(wait_for_jobs, after_id, server_id)
+                reconnect_delay = 1
+                
+                if response_data.get('server_id') != server_id:
+                    if server_id:
+                        print("Webhook server restarted, resetting job cursor", file=sys.stderr)
+                    server_id = response_data.get('server_id')
+                after_id = response_data.get('last_id', after_id)
+                
+                for job in response_data.get('jobs', []):
+                    print(f"New job {job['id']} received! {job_queue.qsize()} jobs already waiting", file=sys.stderr)
+                    # In the ledger before the cursor moves past it, so a restart can't lose it
+                    job['ledger_id'] = job_ledger.record_job(job['data'], job['id'])
+                    job_queue.put_nowait(job)
+                job_ledger.save_cursor(server_id, after_id)
+                    
+            except (requests.RequestException, ValueError) as e:
+                print(f"Lost connection to webhook server: {str(e)}", file=sys.stderr)
+                print(f"Reconnecting in {reconnect_delay} seconds...", file=sys.stderr)
+                await asyncio.sleep(reconnect_delay)
+                reconnect_delay = min(reconnect_delay * 2, MAX_RECONNECT_DELAY)
+    finally:
+        # Ctrl+C cancels this task, shut down cleanly
+        await stop_workers(browser_pool, quote_backends, workers)
+
+async def replay_failed_jobs(ledger_ids=None):
+    """Run failed jobs from the job ledger again, once each"""
+    failed_jobs = job_ledger.get_failed_jobs(ledger_ids)
+    if not failed_jobs:
+        print("No failed jobs to replay", file=sys.stderr)
+        return
+    
+    print(f"Replaying {len(failed_jobs)} failed jobs...", file=sys.stderr)
+    job_queue = asyncio.Queue()
+    for failed_job in failed_jobs:
+        job_queue.put_nowait({
+            'id': f"replay-{failed_job['id']}",
+            'data': failed_job['data'],
+            'ledger_id': failed_job['id'],
+            'only_backend': failed_job['only_backend'],
+            'max_attempts': 1
+        })
+    
+    browser_pool, quote_backends, workers = await start_workers(job_queue)
+    await job_queue.join()
+    await stop_workers(browser_pool, quote_backends, workers)
+    
+    still_failed = job_ledger.get_failed_jobs([failed_job['id'] for failed_job in failed_jobs])
+    print(f"Replay complete: {len(failed_jobs) - len(still_failed)} succeeded, {len(still_failed)} still failing", file=sys.stderr)
 
 def main():
-    print("\n=== Starting Local Automation Listener ===", file=sys.stderr)
+    parser = argparse.ArgumentParser(description="Create Fieldd quotes from GHL webhooks")
+    subparsers = parser.add_subparsers(dest='command')
+    replay_parser = subparsers.add_parser('replay', help="Re-run failed jobs from the job ledger")
+    replay_parser.add_argument('ids', nargs='*', type=int, help="Ledger IDs to replay (default: all failed jobs)")
+    args = parser.parse_args()
+    configure_logging()
+    
+    if args.command == 'replay':
+        asyncio.run(replay_failed_jobs(args.ids))
+        return
     
-    # Clear any existing webhook data when starting up
-    clear_webhook_data()
+    print("\n=== Starting Local Automation Listener ===", file=sys.stderr)
     
-    print("Checking for webhook data every 5 seconds...", file=sys.stderr)
+    print(f"Listening for jobs from {WEBHOOK_SERVER_URL}...", file=sys.stderr)
+    print(f"Running up to {MAX_CONCURRENT_QUOTES} quotes at once ({QUOTE_TIMEOUT_SECONDS}s timeout each)", file=sys.stderr)
     print("Press Ctrl+C to stop", file=sys.stderr)
     print("=======================================\n", file=sys.stderr)
     
-    while True:
-        check_webhook_data()
-        time.sleep(5)  # Check every 5 seconds
+    asyncio.run(listen_for_jobs())
 
 if __name__ == '__main__':
     main() 
\ No newline at end of file
@@ -0,0 +1,204 @@
+import difflib
+import json
+import os
+import re
+import sys
+from datetime import datetime, timedelta
+from typing import Optional
+import aiohttp
+
+FIELDD_API_URL = os.getenv('FIELDD_API_URL', 'https://api.fieldd.co/v1')
+FIELDD_API_KEY = os.getenv('FIELDD_API_KEY', '')
+
+PACKAGE_CATALOG_FILE = os.getenv(
+    'PACKAGE_CATALOG_FILE',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fieldd_packages.json')
+)
+PACKAGE_CATALOG_MAX_AGE = timedelta(hours=int(os.getenv('PACKAGE_CATALOG_MAX_AGE_HOURS', 6)))
+# First wait before trying a failed refresh again, doubled after each failure
+PACKAGE_CATALOG_RETRY_SECONDS = int(os.getenv('PACKAGE_CATALOG_RETRY_SECONDS', 30))
+
+# How close a word of Quote_Package has to be to a word of the package name (0-1), high enough that
+# "exterior" doesn't pass for "interior"
+MIN_WORD_SCORE = 0.8
+# How much of the request and the package name have to be covered by matching words (0-1)
+MIN_MATCH_SCORE = 0.6
+# How far ahead of the next package the best match has to be, closer than this is ambiguous
+MIN_MATCH_MARGIN = 0.1
+# How close Quote_Car_Size has to be to the package's car size (0-1)
+MIN_SIZE_SCORE = 0.8
+
+def normalize_text(text: str) -> str:
+    """Lowercase and strip punctuation so free text can be compared"""
+    return ' '.join(re.sub(r'[^a-z0-9]+', ' ', (text or '').lower()).split())
+
+def word_score(word: str, words: list) -> float:
+    """How close word is to the closest of words (0-1)"""
+    return max((difflib.SequenceMatcher(None, word, other).ratio() for other in words), default=0)
+
+class PackageCatalog:
+    """Local copy of the Fieldd service packages, with a fuzzy lookup for Quote_Package/Quote_Car_Size"""
+
+    def __init__(self, cache_file: str = PACKAGE_CATALOG_FILE, api_url: str = FIELDD_API_URL,
+                 api_key: str = FIELDD_API_KEY, max_age: timedelta = PACKAGE_CATALOG_MAX_AGE):
+        self.cache_file = cache_file
+        self.api_url = api_url
+        self.api_key = api_key
+        self.max_age = max_age
+        self.packages = []
+        self.fetched_at = None
+        self._index = []
+        self._shared_words = set()
+        self._matches = {}
+        self._load()
+
+    def _load(self):
+        """Load the catalog saved by the last refresh"""
+        try:
+            if os.path.exists(self.cache_file):
+                with open(self.cache_file, 'r') as f:
+                    data = json.load(f)
+                fetched_at = data.get('fetched_at')
+                self._set_packages(data.get('packages', []), datetime.fromisoformat(fetched_at) if fetched_at else None)
+        except Exception as e:
+            print(f"Warning: Could not load package catalog: {str(e)}", file=sys.stderr)
+
+    def _save(self):
+        try:
+            with open(self.cache_file, 'w') as f:
+                json.dump({
+                    'fetched_at': self.fetched_at.isoformat() if self.fetched_at else None,
+                    'packages': self.packages
+                }, f, indent=2)
+        except Exception as e:
+            print(f"Warning: Could not save package catalog: {str(e)}", file=sys.stderr)
+
+    def _set_packages(self, packages: list, fetched_at: datetime = None):
+        """Replace the catalog and rebuild the lookup index"""
+        self.packages = [
+            {
+                'id': package.get('id'),
+                'name': package.get('name', ''),
+                'car_size': package.get('car_size') or package.get('vehicle_size') or ''
+            }
+            for package in packages
+        ]
+        self.fetched_at = fetched_at
+        self._index = [
+            (normalize_text(package['name']), normalize_text(package['car_size']), package)
+            for package in self.packages
+        ]
+        # Words in more than one package name ("detail", "wash") can't tell packages apart on their own
+        names_with_word = {}
+        for name in {name for name, _, _ in self._index}:
+            for word in set(name.split()):
+                names_with_word[word] = names_with_word.get(word, 0) + 1
+        self._shared_words = {word for word, count in names_with_word.items() if count > 1}
+        self._matches = {}
+
+    def is_loaded(self) -> bool:
+        return bool(self.packages)
+
+    def is_stale(self) -> bool:
+        return self.fetched_at is None or datetime.now() - self.fetched_at > self.max_age
+
+    def seconds_until_stale(self) -> float:
+        if self.fetched_at is None:
+            return 0
+        return max(0, (self.fetched_at + self.max_age - datetime.now()).total_seconds())
+
+    async def refresh(self) -> bool:
+        """
+        Download the current package list from the Fieldd API.
+
+        Returns:
+            bool: True if the catalog was refreshed, False if it couldn't be (or there's no API key)
+        """
+        if not self.api_key:
+            return False
+        try:
+            async with aiohttp.ClientSession() as session:
+                async with session.get(
+                    f"{self.api_url}/packages",
+                    headers={"Authorization": f"Bearer {self.api_key}"},
+                    timeout=aiohttp.ClientTimeout(total=30)
+                ) as response:
+                    if response.status != 200:
+                        raise Exception(f"Fieldd API error: {await response.text()}")
+                    data = await response.json()
+            packages = data.get('packages', []) if isinstance(data, dict) else data
+            self._set_packages(packages, datetime.now())
+            self._save()
+            print(f"Package catalog refreshed ({len(self.packages)} packages)", file=sys.stderr)
+            return True
+        except Exception as e:
+            print(f"Warning: Could not refresh package catalog: {str(e)}", file=sys.stderr)
+            return False
+
+    async def refresh_if_stale(self) -> bool:
+        """Refresh the catalog if it's stale, returns False if that failed"""
+        if self.is_stale():
+            return await self.refresh()
+        return True
+
+    def match(self, service_request: str, car_size: str) -> Optional[dict]:
+        """
+        Find the package for a free-text service and car size.
+
+        Returns:
+            dict: The matching package (id, name, car_size), or None if the size is missing or unknown,
+                nothing is close enough, or two packages are about as close as each other
+        """
+        key = (normalize_text(service_request), normalize_text(car_size))
+        if key not in self._matches:
+            self._matches[key] = self._find_match(*key)
+        return self._matches[key]
+
+    def _service_score(self, service_words: list, name_words: list) -> float:
+        """
+        How well the requested service matches a package name (without its size words), 0 if it doesn't.
+
+        Every requested word has to match a word of the name, and at least one of the name's distinctive
+        words has to be among them, so "Exterior Detail" doesn't match "Interior Detail" on "detail" alone.
+        """
+        request_scores = [word_score(word, name_words) for word in service_words]
+        if not request_scores or min(request_scores) < MIN_WORD_SCORE:
+            return 0
+        name_scores = {word: word_score(word, service_words) for word in name_words}
+        distinctive = [word for word in name_words if word not in self._shared_words] or name_words
+        if all(name_scores[word] < MIN_WORD_SCORE for word in distinctive):
+            return 0
+        name_coverage = sum(score for score in name_scores.values() if score >= MIN_WORD_SCORE) / len(name_words)
+        return (sum(request_scores) / len(request_scores) + name_coverage) / 2
+
+    def _find_match(self, service: str, size: str) -> Optional[dict]:
+        if not size:
+            return None
+        service_words = service.split()
+        size_words = size.split()
+        scored = []
+
+        for name, package_size, package in self._index:
+            name_words = name.split()
+            if package_size:
+                # Ignore spacing so "midsize" matches "Mid-size"
+                size_score = difflib.SequenceMatcher(None, size.replace(' ', ''), package_size.replace(' ', '')).ratio()
+                if size_score < MIN_SIZE_SCORE:
+                    continue
+            elif not all(word_score(word, name_words) >= MIN_SIZE_SCORE for word in size_words):
+                # The size is part of the name ("Interior Detail - SUV")
+                continue
+
+            # Compare the service against the name without the size words in it
+            service_name_words = [word for word in name_words if word_score(word, size_words) < MIN_SIZE_SCORE] \
+                or name_words
+            score = self._service_score(service_words, service_name_words)
+            if score >= MIN_MATCH_SCORE:
+                scored.append((score, package))
+
+        if not scored:
+            return None
+        scored.sort(key=lambda entry: entry[0], reverse=True)
+        if len(scored) > 1 and scored[0][0] - scored[1][0] < MIN_MATCH_MARGIN:
+            return None
+        return scored[0][1]
@@ -0,0 +1,181 @@
+import asyncio
+import os
+import sys
+import uuid
+from abc import ABC, abstractmethod
+import aiohttp
+from step_timings import time_step
+
+FIELDD_API_URL = os.getenv('FIELDD_API_URL', 'https://api.fieldd.co/v1')
+FIELDD_API_KEY = os.getenv('FIELDD_API_KEY', '')
+
+# Responses worth retrying, anything else from the API is treated as a hard failure
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Retryable responses after which Fieldd may still have created (and sent) the quote
+UNCERTAIN_STATUSES = {500, 502, 503, 504}
+
+class QuoteBackendError(Exception):
+    """Raised when a backend could not create the quote"""
+    pass
+
+class QuoteOutcomeUnknown(QuoteBackendError):
+    """
+    Raised when the quote may have been created anyway (a timeout or a server error after the request was sent).
+    No other backend is tried, it could send the customer a second quote. retryable is False when the same
+    backend can't safely try again either (the browser has no idempotency key).
+    """
+    def __init__(self, message: str, retryable: bool = True):
+        super().__init__(message)
+        self.retryable = retryable
+
+class QuoteBackend(ABC):
+    """A way of creating a Fieldd quote from the extracted customer data"""
+    name = 'base'
+
+    def is_available(self, customer_data: dict) -> bool:
+        """Whether this backend can handle the job at all"""
+        return True
+
+    @abstractmethod
+    async def create_quote(self, customer_data: dict):
+        """Create and send the quote, raising QuoteBackendError if it couldn't be"""
+
+    async def close(self):
+        pass
+
+class FielddAPIQuoteBackend(QuoteBackend):
+    """Creates quotes with a single call to the Fieldd REST API"""
+    name = 'api'
+
+    def __init__(self, api_url: str = FIELDD_API_URL, api_key: str = FIELDD_API_KEY,
+                 max_retries: int = 3, retry_delay: float = 0.5, timeout: float = 30, max_connections: int = 10):
+        self.api_url = api_url
+        self.api_key = api_key
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self._session = None
+
+    def is_available(self, customer_data: dict) -> bool:
+        return bool(self.api_key)
+
+    def _get_session(self):
+        """One session (and connection pool) for every quote this backend sends"""
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_connections),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                headers={"Authorization": f"Bearer {self.api_key}"}
+            )
+        return self._session
+
+    def build_payload(self, customer_data: dict) -> dict:
+        """Build the quote request from the same fields the browser flow fills in"""
+        return {
+            "customer": {
+                "first_name": customer_data['first_name'],
+                "last_name": customer_data['last_name'],
+                "email": customer_data['email'],
+                "phone": customer_data['phone'],
+                "address": customer_data['address']
+            },
+            "job_address": customer_data['address'],
+            "acceptance": "self_schedule",
+            "service": {
+                "package_id": customer_data.get('package_id'),
+                "name": customer_data.get('package_name') or customer_data['service_request'],
+                "car_size": customer_data.get('package_car_size') or customer_data['car_size']
+            },
+            "send": True
+        }
+
+    async def create_quote(self, customer_data: dict):
+        session = self._get_session()
+        payload = self.build_payload(customer_data)
+        # The job's key, so neither a retried request nor a retried or replayed job can create a second quote
+        headers = {"Idempotency-Key": customer_data.get('job_key') or uuid.uuid4().hex}
+        # Whether any attempt may have reached Fieldd and created the quote
+        uncertain = False
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with session.post(f"{self.api_url}/quotes", json=payload, headers=headers) as response:
+                    if response.status in (200, 201):
+                        return await response.json()
+                    error = f"Fieldd API error {response.status}: {await response.text()}"
+                    uncertain = uncertain or response.status in UNCERTAIN_STATUSES
+                    if response.status not in RETRY_STATUSES:
+                        raise (QuoteOutcomeUnknown if uncertain else QuoteBackendError)(error)
+            except aiohttp.ClientConnectorError as e:
+                # Never got as far as sending the request
+                error = f"Fieldd API unreachable: {str(e)}"
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error = f"Fieldd API request failed: {str(e) or type(e).__name__}"
+                uncertain = True
+
+            if attempt < self.max_retries:
+                delay = self.retry_delay * (2 ** attempt)
+                print(f"{error} - retrying in {delay} seconds", file=sys.stderr)
+                await asyncio.sleep(delay)
+
+        raise (QuoteOutcomeUnknown if uncertain else QuoteBackendError)(error)
+
+    async def close(self):
+        if self._session and not self._session.closed:
+            await self._session.close()
+
+class BrowserQuoteBackend(QuoteBackend):
+    """Creates quotes by driving the Fieldd web app, used when the API can't"""
+    name = 'browser'
+
+    def __init__(self, run_quote):
+        # Coroutine function taking customer_data and returning a result, or None on failure
+        self.run_quote = run_quote
+
+    async def create_quote(self, customer_data: dict):
+        result = await self.run_quote(customer_data)
+        if result is None:
+            raise QuoteBackendError("Browser automation failed")
+        return result
+
+async def create_quote(customer_data: dict, backends: list, preferred: str = None, only: str = None,
+                       attempted: list = None):
+    """
+    Create a quote with the first backend that succeeds. A backend that may have created the quote
+    (QuoteOutcomeUnknown) stops the search.
+
+    Args:
+        customer_data: The extracted Quote_ fields, plus the job's idempotency key as job_key
+        backends: Backends to try, in order
+        preferred: Name of a backend to try first (e.g. from the job's Quote_Backend field)
+        only: Name of the one backend to try, for a job whose earlier attempt with it may have created the quote
+        attempted: List the name of each backend is added to as it starts, so a caller that times the whole
+                   call out knows which one was running
+
+    Returns:
+        tuple: (name of the backend used, backend result)
+    """
+    if preferred:
+        backends = sorted(backends, key=lambda backend: backend.name != preferred)
+    if only:
+        backends = [backend for backend in backends if backend.name == only]
+
+    errors = []
+    for backend in backends:
+        if not backend.is_available(customer_data):
+            continue
+        if attempted is not None:
+            attempted.append(backend.name)
+        try:
+            with time_step(f'backend_{backend.name}'):
+                return backend.name, await backend.create_quote(customer_data)
+        except QuoteOutcomeUnknown as e:
+            print(f"Quote backend '{backend.name}' may have created the quote: {str(e)}", file=sys.stderr)
+            e.backend = backend.name
+            raise
+        except QuoteBackendError as e:
+            print(f"Quote backend '{backend.name}' failed: {str(e)}", file=sys.stderr)
+            errors.append(f"{backend.name}: {str(e)}")
+
+    raise QuoteBackendError("All quote backends failed - " + "; ".join(errors) if errors else "No quote backend available")
@@ -0,0 +1,180 @@
+import re
+import sys
+from step_timings import time_step
+
+FIELDD_PLANNER_URL = 'https://admin.fieldd.co/#!/company/schedule/planner'
+
+# How long to wait for any one element before treating the step as failed
+STEP_TIMEOUT_MS = 15000
+# Delay between keystrokes so the address/service autocomplete keeps up
+TYPING_DELAY_MS = 50
+# A cached address choice should show up straight away, don't wait long before resolving it again
+CACHED_CHOICE_TIMEOUT_MS = 5000
+
+class ScriptedStepError(Exception):
+    """Raised when a step of the scripted quote flow fails"""
+    def __init__(self, step: str, error: Exception):
+        self.step = step
+        self.error = error
+        super().__init__(f"Step '{step}' failed: {error}")
+
+class ScriptedOutcomeUnknown(ScriptedStepError):
+    """
+    Raised when a step fails after Send Quote was clicked, so Fieldd may have sent the quote anyway.
+    Neither the browser agent nor a retry should run the quote again, it could send the customer a second one.
+    """
+    pass
+
+class ScriptedQuoteRunner:
+    """
+    Creates a Fieldd quote by driving the known form directly with Playwright,
+    following the same steps as the browser agent prompt but without any LLM calls.
+    """
+
+    def __init__(self, page, customer_data: dict, username: str, password: str,
+                 company_city: str, planner_url: str = FIELDD_PLANNER_URL, address_cache=None):
+        self.page = page
+        self.customer_data = customer_data
+        self.username = username
+        self.password = password
+        self.company_city = company_city
+        self.planner_url = planner_url
+        self.address_cache = address_cache
+        # Set once the Send Quote button has been clicked
+        self.send_clicked = False
+
+    @property
+    def steps(self):
+        """The quote flow as (step name, step function) pairs, in order"""
+        return [
+            ('open_planner', self.open_planner),
+            ('login', self.login),
+            ('open_quote_form', self.open_quote_form),
+            ('customer_details', self.fill_customer_details),
+            ('customer_address', self.select_customer_address),
+            ('job_address', self.select_job_address),
+            ('acceptance', self.select_acceptance),
+            ('service_selection', self.select_service),
+            ('send_quote', self.send_quote),
+        ]
+
+    async def run(self):
+        """
+        Run every step, raising ScriptedStepError for the first one that fails
+        (ScriptedOutcomeUnknown if Send Quote had already been clicked)
+        """
+        for name, step in self.steps:
+            try:
+                with time_step(f'scripted_{name}'):
+                    await step()
+            except Exception as e:
+                raise (ScriptedOutcomeUnknown if self.send_clicked else ScriptedStepError)(name, e) from e
+        return True
+
+    async def open_planner(self):
+        """Go to the planner unless we are already on it"""
+        if self.page.url != self.planner_url:
+            await self.page.goto(self.planner_url)
+
+    async def login(self):
+        """Log in if the login page is showing, otherwise do nothing"""
+        await self.page.locator('#add-button:visible, input[type="email"]:visible').first.wait_for(
+            state='visible', timeout=STEP_TIMEOUT_MS
+        )
+        if await self.page.locator('#add-button').is_visible():
+            return
+
+        print("Logging into Fieldd...", file=sys.stderr)
+        await self.page.locator('input[type="email"]').fill(self.username, timeout=STEP_TIMEOUT_MS)
+        await self.page.get_by_role('button', name=re.compile('next', re.I)).click(timeout=STEP_TIMEOUT_MS)
+        await self.page.locator('input[type="password"]').fill(self.password, timeout=STEP_TIMEOUT_MS)
+        await self.page.get_by_role('button', name=re.compile('log ?in|sign ?in', re.I)).click(timeout=STEP_TIMEOUT_MS)
+        await self.page.locator('#add-button').wait_for(state='visible', timeout=STEP_TIMEOUT_MS)
+
+    async def open_quote_form(self):
+        """Open the New > Quote form"""
+        await self.page.locator('#add-button').click(timeout=STEP_TIMEOUT_MS)
+        await self.page.get_by_text(re.compile(r'^\s*quote\s*$', re.I)).first.click(timeout=STEP_TIMEOUT_MS)
+        await self.page.locator('[ng-model="formData.customerFirstName"]').wait_for(state='visible', timeout=STEP_TIMEOUT_MS)
+
+    async def fill_customer_details(self):
+        """Fill in the plain text customer fields"""
+        fields = {
+            'formData.customerFirstName': self.customer_data['first_name'],
+            'formData.customerLastName': self.customer_data['last_name'],
+            'formData.customerEmail': self.customer_data['email'],
+            'viewData.customerPhone': self.customer_data['phone'],
+        }
+        for ng_model, value in fields.items():
+            await self.page.locator(f'[ng-model="{ng_model}"]').fill(value, timeout=STEP_TIMEOUT_MS)
+
+    async def select_customer_address(self):
+        await self._select_address('[ng-model="formData.customerAddress"]')
+
+    async def select_job_address(self):
+        await self._select_address('[ng-model="formData.jobAddress"]')
+
+    async def select_acceptance(self):
+        """Choose the "self schedule" acceptance option"""
+        await self.page.get_by_text(re.compile('self schedule', re.I)).first.click(timeout=STEP_TIMEOUT_MS)
+
+    async def select_service(self):
+        """Pick the package matching both the requested service and car size"""
+        package_name = self.customer_data.get('package_name')
+        if package_name:
+            # Already resolved against the package catalog, look for its exact name
+            must_contain = [package_name, self.customer_data.get('package_car_size', '')]
+        else:
+            package_name = self.customer_data['service_request']
+            must_contain = [package_name, self.customer_data['car_size']]
+        await self._select_choice('.service-selection-left [ng-model="item.name"]', package_name, must_contain)
+
+    async def send_quote(self):
+        """Send the quote and wait for the form to close"""
+        send_button = self.page.get_by_role('button', name=re.compile('send quote', re.I))
+        await send_button.click(timeout=STEP_TIMEOUT_MS)
+        self.send_clicked = True
+        await send_button.wait_for(state='hidden', timeout=STEP_TIMEOUT_MS)
+
+    async def _select_address(self, selector: str):
+        """Pick the address, going straight to the choice it resolved to last time if we know it"""
+        address = self.customer_data['address']
+        cached_choice = self.address_cache.get(address) if self.address_cache else None
+        if cached_choice:
+            try:
+                await self._select_choice(selector, cached_choice, [cached_choice],
+                                          typing_delay=0, timeout=CACHED_CHOICE_TIMEOUT_MS)
+                return
+            except Exception:
+                print(f"Cached address choice '{cached_choice}' not found, resolving again", file=sys.stderr)
+                self.address_cache.forget(address)
+
+        choice = await self._select_choice(selector, address, [self.company_city])
+        if self.address_cache:
+            self.address_cache.set(address, choice)
+
+    async def _select_choice(self, selector: str, text: str, must_contain: list,
+                             typing_delay: int = None, timeout: int = None):
+        """
+        Type into a ui-select field and click the first dropdown row containing all of must_contain.
+        Returns the text of the row that was picked.
+        """
+        typing_delay = TYPING_DELAY_MS if typing_delay is None else typing_delay
+        timeout = timeout or STEP_TIMEOUT_MS
+        field = self.page.locator(selector).first
+        await field.click(timeout=STEP_TIMEOUT_MS)
+
+        # ui-select puts the ng-model on a wrapper, the text goes into the search input inside it
+        tag_name = await field.evaluate('el => el.tagName')
+        if tag_name not in ('INPUT', 'TEXTAREA'):
+            field = field.locator('input').first
+
+        await field.fill('', timeout=STEP_TIMEOUT_MS)
+        await field.press_sequentially(text, delay=typing_delay, timeout=STEP_TIMEOUT_MS)
+
+        choice = self.page.locator('.ui-select-choices-row:visible')
+        for value in must_contain:
+            choice = choice.filter(has_text=value)
+        choice_text = (await choice.first.inner_text(timeout=timeout)).strip()
+        await choice.first.click(timeout=timeout)
+        return choice_text
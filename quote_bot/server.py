@@ -1,15 +1,56 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 import os
 from datetime import datetime
-import json
+import logging
 import sys
+import threading
+import uuid
+from collections import deque
+
+# Shared code lives in common/ at the repo root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.metrics import CONTENT_TYPE, ERRORS, WEBHOOK_LATENCY, render_metrics
+from common.structured_logging import configure_logging, get_logger, log_event, log_payload
 
 app = Flask(__name__)
+logger = get_logger(__name__)
 
 # Store the latest webhook data
 latest_webhook_data = None
 
+# Queue of jobs waiting to be picked up by local_agent via long-polling
+MAX_PENDING_JOBS = int(os.getenv('MAX_PENDING_JOBS', 100))
+MAX_WAIT_SECONDS = 30
+pending_jobs = deque(maxlen=MAX_PENDING_JOBS)
+job_condition = threading.Condition()
+last_job_id = 0
+
+# Changes on every restart so clients know to reset their job cursor
+server_id = uuid.uuid4().hex
+
+def queue_job(data):
+    """Add webhook data to the job queue and wake up any waiting clients"""
+    global last_job_id
+    with job_condition:
+        last_job_id += 1
+        pending_jobs.append({
+            'id': last_job_id,
+            'data': data,
+            'received_at': datetime.now().isoformat()
+        })
+        job_condition.notify_all()
+
+def clear_jobs():
+    """Drop all queued jobs"""
+    with job_condition:
+        pending_jobs.clear()
+
+def get_jobs_after(after_id):
+    """Get queued jobs newer than after_id (caller must hold job_condition)"""
+    return [job for job in pending_jobs if job['id'] > after_id]
+
 @app.route('/webhook', methods=['POST'])
+@WEBHOOK_LATENCY.time(server='quote_bot')
 def webhook():
     global latest_webhook_data
     try:
@@ -19,19 +60,19 @@ def webhook():
         # Check if this is a clear request
         if data.get('clear'):
             latest_webhook_data = None
+            clear_jobs()
             return jsonify({
                 'status': 'success',
                 'message': 'Webhook data cleared',
                 'data_received': False
             })
         
-        # Log the received data
-        print("\n=== Received Webhook Data ===", file=sys.stderr)
-        print("Timestamp:", datetime.now().strftime('%Y-%m-%d %H:%M:%S'), file=sys.stderr)
-        print("Raw Data:", json.dumps(data, indent=2), file=sys.stderr)
+        # Log the received data (redacted, and only in full for a sample of webhooks)
+        log_payload(logger, "webhook_received", data)
         
         # Store the latest webhook data
         latest_webhook_data = data
+        queue_job(data)
         
         return jsonify({
             'status': 'success',
@@ -40,12 +81,9 @@ def webhook():
         })
         
     except Exception as e:
-        # Log the error
-        print(f"\n=== Error Processing Webhook ===", file=sys.stderr)
-        print(f"Timestamp: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", file=sys.stderr)
-        print(f"Error: {str(e)}", file=sys.stderr)
-        print(f"Request Data: {request.get_data()}", file=sys.stderr)
-        print("===========================\n", file=sys.stderr)
+        # Log the error, without the request body since it's full of customer details
+        log_event(logger, "webhook_error", logging.ERROR, error=str(e), content_length=request.content_length)
+        ERRORS.inc(component='webhook')
         
         return jsonify({
             'status': 'error',
@@ -69,10 +107,39 @@ def get_latest_webhook():
             'data_received': False
         })
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus metrics for this server"""
+    return Response(render_metrics(), content_type=CONTENT_TYPE)
+
+@app.route('/jobs/wait', methods=['GET'])
+def wait_for_jobs():
+    """Long-poll endpoint that returns as soon as there are jobs newer than `after`"""
+    after_id = request.args.get('after', 0, type=int)
+    timeout = min(request.args.get('timeout', 25, type=float), MAX_WAIT_SECONDS)
+    
+    # A client from before a restart has a stale cursor, start it from the beginning
+    if request.args.get('server_id') != server_id:
+        after_id = 0
+    
+    with job_condition:
+        job_condition.wait_for(lambda: get_jobs_after(after_id), timeout=timeout)
+        jobs = get_jobs_after(after_id)
+    
+    return jsonify({
+        'status': 'success',
+        'server_id': server_id,
+        'jobs': jobs,
+        'last_id': jobs[-1]['id'] if jobs else after_id
+    })
+
 if __name__ == '__main__':
+    configure_logging()
     port = int(os.getenv('PORT', 5000))
     print(f"\n=== Starting Webhook Server ===", file=sys.stderr)
     print(f"Webhook endpoint: http://localhost:{port}/webhook", file=sys.stderr)
+    print(f"Job stream endpoint: http://localhost:{port}/jobs/wait", file=sys.stderr)
+    print(f"Metrics endpoint: http://localhost:{port}/metrics", file=sys.stderr)
     print("Press Ctrl+C to stop the server", file=sys.stderr)
     print("===============================\n", file=sys.stderr)
-    app.run(host='0.0.0.0', port=port) 
\ No newline at end of file
+    app.run(host='0.0.0.0', port=port, threaded=True) 
\ No newline at end of file
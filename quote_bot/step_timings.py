@@ -0,0 +1,164 @@
+import argparse
+import contextvars
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+from typing import Dict, List
+
+# Every timed step is appended here as one JSON event per line
+STEP_EVENTS_FILE = os.getenv(
+    'STEP_EVENTS_FILE',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'step_events.jsonl')
+)
+
+# Step timings for the quote job running in the current asyncio task.
+# Tasks copy the context when they're created, so everything a job awaits writes to the same dict.
+current_step_timings = contextvars.ContextVar('current_step_timings', default=None)
+current_job_id = contextvars.ContextVar('current_job_id', default=None)
+
+def start_job_timings(job_id=None) -> dict:
+    """Start collecting step timings for the current job and return the dict they go into"""
+    timings = {}
+    current_step_timings.set(timings)
+    current_job_id.set(job_id)
+    return timings
+
+def record_step(name: str, seconds: float, ok: bool = True, **details):
+    """Add a step to the current job's timings and write it out as a step event"""
+    timings = current_step_timings.get()
+    if timings is None:
+        return
+    # Steps that happen more than once in a job (agent actions) add up
+    timings[name] = round(timings.get(name, 0) + seconds, 3)
+
+    event = {
+        'time': time.time(),
+        'job_id': current_job_id.get(),
+        'step': name,
+        'seconds': round(seconds, 3),
+        'ok': ok,
+        **details
+    }
+    try:
+        with open(STEP_EVENTS_FILE, 'a') as f:
+            f.write(json.dumps(event, default=str) + '\n')
+    except Exception as e:
+        print(f"Warning: Could not write step event: {str(e)}", file=sys.stderr)
+
+@contextmanager
+def time_step(name: str, **details):
+    """Record how long the wrapped block took, in seconds, under the given step name"""
+    started = time.monotonic()
+    ok = False
+    try:
+        yield
+        ok = True
+    finally:
+        record_step(name, time.monotonic() - started, ok, **details)
+
+class AgentStepTimer:
+    """
+    new-step callback for the browser agent that times each of its steps.
+
+    The agent calls it once it has decided on a step's actions, so each step is timed from there to the
+    next callback (or finish()): the browser actions plus the LLM call that picks the next step.
+    Steps are recorded as agent_<action>, e.g. agent_input_text or agent_click_element.
+    """
+
+    def __init__(self):
+        self._step = None
+        self._started = None
+
+    def __call__(self, state, model_output, step_number: int):
+        self.finish()
+        actions = [
+            name
+            for action in (getattr(model_output, 'action', None) or [])
+            for name in action.model_dump(exclude_unset=True)
+        ]
+        current_state = getattr(model_output, 'current_state', None)
+        self._step = {
+            'name': 'agent_' + ('_'.join(actions) or 'none'),
+            'details': {
+                'agent_step': step_number,
+                'goal': getattr(current_state, 'next_goal', None),
+                'url': getattr(state, 'url', None)
+            }
+        }
+        self._started = time.monotonic()
+
+    def finish(self):
+        """Record the step in progress, call once the agent has stopped"""
+        if self._step:
+            record_step(self._step['name'], time.monotonic() - self._started, **self._step['details'])
+            self._step = None
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of values (pct 0-100)"""
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+def load_step_events(path: str = STEP_EVENTS_FILE, since: float = None) -> List[Dict]:
+    """Read step events back, optionally only those after the since timestamp"""
+    if not os.path.exists(path):
+        return []
+    events = []
+    with open(path, 'r') as f:
+        for line in f:
+            try:
+                event = json.loads(line)
+            except ValueError:
+                continue
+            if since is None or event.get('time', 0) >= since:
+                events.append(event)
+    return events
+
+def summarize_step_events(events: List[Dict]) -> Dict[str, Dict]:
+    """
+    Aggregate step events per step.
+
+    Returns:
+        dict: {step: {count, failures, p50, p95, total}}, slowest p95 first
+    """
+    durations = {}
+    failures = {}
+    for event in events:
+        durations.setdefault(event['step'], []).append(event['seconds'])
+        if not event.get('ok', True):
+            failures[event['step']] = failures.get(event['step'], 0) + 1
+
+    summary = {
+        step: {
+            'count': len(seconds),
+            'failures': failures.get(step, 0),
+            'p50': percentile(seconds, 50),
+            'p95': percentile(seconds, 95),
+            'total': round(sum(seconds), 3)
+        }
+        for step, seconds in durations.items()
+    }
+    return dict(sorted(summary.items(), key=lambda item: item[1]['p95'], reverse=True))
+
+def main():
+    """Show p50/p95 per step, slowest first"""
+    parser = argparse.ArgumentParser(description="Show how long each quote step takes")
+    parser.add_argument('--hours', type=float, help="Only include steps from the last N hours")
+    parser.add_argument('--file', default=STEP_EVENTS_FILE)
+    args = parser.parse_args()
+
+    since = time.time() - args.hours * 3600 if args.hours else None
+    summary = summarize_step_events(load_step_events(args.file, since))
+    if not summary:
+        print("No step events recorded")
+        return
+
+    print(f"{'step':<40} {'count':>6} {'fail':>5} {'p50 (s)':>9} {'p95 (s)':>9} {'total (s)':>10}")
+    for step, stats in summary.items():
+        print(f"{step:<40} {stats['count']:>6} {stats['failures']:>5} {stats['p50']:>9.3f} "
+              f"{stats['p95']:>9.3f} {stats['total']:>10.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from address_cache import AddressCache, normalize_address
+
+
+def test_normalize_address():
+    """Test different spellings of the same address normalize the same way"""
+    assert normalize_address('123 Main Street, Austin TX') == normalize_address('123  main st. austin, tx')
+    assert normalize_address('500 North Lamar Boulevard') == '500 n lamar blvd'
+
+
+def test_cache_round_trip(tmp_path):
+    """Test a resolved choice is saved and loaded back under the normalized address"""
+    cache_file = str(tmp_path / 'address_cache.json')
+    cache = AddressCache(cache_file)
+    cache.set('123 Main Street', '123 Main St, Austin, TX, USA')
+    
+    reloaded = AddressCache(cache_file)
+    assert reloaded.get('123 main st') == '123 Main St, Austin, TX, USA'
+    assert reloaded.get('456 Oak Ave') is None
+
+
+def test_forget(tmp_path):
+    """Test a stale choice can be dropped"""
+    cache = AddressCache(str(tmp_path / 'address_cache.json'))
+    cache.set('123 Main Street', '123 Main St, Austin, TX, USA')
+    cache.forget('123 Main Street')
+    
+    assert cache.get('123 Main Street') is None
@@ -0,0 +1,140 @@
+import json
+import os
+import sys
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip("browser_use")
+
+import browser_pool
+from browser_pool import BrowserPool, PooledBrowser
+
+
+class FakePage:
+    def __init__(self, healthy=True):
+        self.healthy = healthy
+    
+    async def goto(self, url):
+        pass
+    
+    async def evaluate(self, script):
+        if not self.healthy:
+            raise RuntimeError("Target closed")
+        return 1
+
+
+class FakeContext:
+    """Stand-in for a browser_use context: loads cookies_file when opened and writes it again on close"""
+    
+    def __init__(self, config=None, cookies=None):
+        self.config = config
+        self.page = FakePage()
+        self.cookie_jar = cookies or [{'name': 'session', 'value': 'abc'}]
+        self.session = self
+        self.context = self
+        self.closed = False
+    
+    async def get_current_page(self):
+        return self.page
+    
+    async def cookies(self):
+        return self.cookie_jar
+    
+    async def close(self):
+        if self.config and self.config.cookies_file:
+            with open(self.config.cookies_file, 'w') as f:
+                json.dump([{'name': 'stale'}], f)
+        self.closed = True
+
+
+class FakeBrowser:
+    def __init__(self, config=None):
+        self.closed = False
+    
+    async def new_context(self, config):
+        return FakeContext(config)
+    
+    async def close(self):
+        self.closed = True
+
+
+def make_pool(tmp_path, monkeypatch, **pool_args):
+    """A pool whose launches are counted fakes"""
+    pool = BrowserPool(cookies_file=str(tmp_path / 'fieldd_cookies.json'), **pool_args)
+    launched = []
+    
+    async def launch():
+        launched.append(PooledBrowser(FakeBrowser(), FakeContext()))
+        return launched[-1]
+    
+    monkeypatch.setattr(pool, '_launch', launch)
+    return pool, launched
+
+
+@pytest.mark.asyncio
+async def test_unhealthy_browser_replaced(tmp_path, monkeypatch):
+    """Test a browser that stopped responding is closed and a new one handed out instead"""
+    pool, launched = make_pool(tmp_path, monkeypatch)
+    await pool.start()
+    launched[0].context.page.healthy = False
+    
+    pooled = await pool.acquire()
+    
+    assert pooled is launched[1]
+    assert launched[0].browser.closed
+
+
+@pytest.mark.asyncio
+async def test_browser_recycled_after_max_jobs(tmp_path, monkeypatch):
+    """Test a browser is replaced once it has run max_jobs_per_browser jobs, and after a failed job"""
+    pool, launched = make_pool(tmp_path, monkeypatch, max_jobs_per_browser=2)
+    await pool.start()
+    
+    for _ in range(2):
+        pooled = await pool.acquire()
+        assert pooled is launched[0]
+        await pool.release(pooled)
+    pooled = await pool.acquire()
+    assert pooled is launched[1]
+    assert launched[0].browser.closed
+    
+    await pool.release(pooled, recycle=True)
+    assert launched[1].browser.closed
+    assert await pool.acquire() is launched[2]
+
+
+@pytest.mark.asyncio
+async def test_unchanged_session_not_saved(tmp_path, monkeypatch):
+    """Test the cookies file is only written when a browser's cookies changed"""
+    pool, launched = make_pool(tmp_path, monkeypatch)
+    await pool.start()
+    
+    pooled = await pool.acquire()
+    await pool.release(pooled)
+    assert json.loads((tmp_path / 'fieldd_cookies.json').read_text()) == pooled.context.cookie_jar
+    
+    os.remove(tmp_path / 'fieldd_cookies.json')
+    pooled = await pool.acquire()
+    await pool.release(pooled)
+    assert not (tmp_path / 'fieldd_cookies.json').exists()
+    
+    pooled = await pool.acquire()
+    pooled.context.cookie_jar = [{'name': 'session', 'value': 'new'}]
+    await pool.release(pooled)
+    assert json.loads((tmp_path / 'fieldd_cookies.json').read_text()) == [{'name': 'session', 'value': 'new'}]
+
+
+@pytest.mark.asyncio
+async def test_closing_context_leaves_cookies_file_alone(tmp_path, monkeypatch):
+    """Test browser_use doesn't write the cookies file itself when a pooled context is closed"""
+    monkeypatch.setattr(browser_pool, 'Browser', FakeBrowser)
+    cookies_file = tmp_path / 'fieldd_cookies.json'
+    cookies_file.write_text(json.dumps([{'name': 'session', 'value': 'abc'}]))
+    pool = BrowserPool(cookies_file=str(cookies_file))
+    
+    pooled = await pool._launch()
+    await pool._close(pooled)
+    
+    assert pooled.context.closed
+    assert json.loads(cookies_file.read_text()) == [{'name': 'session', 'value': 'abc'}]
@@ -0,0 +1,75 @@
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from job_ledger import JobLedger
+
+
+def test_job_outcomes(tmp_path):
+    """Test jobs move through the ledger and only failed ones come back for replay"""
+    ledger = JobLedger(str(tmp_path / 'quote_jobs.db'))
+    ok_id = ledger.record_job({'customData': {'Quote_First_Name': 'Jane'}}, source_job_id=1)
+    failed_id = ledger.record_job({'customData': {'Quote_First_Name': 'John'}}, source_job_id=2)
+
+    ledger.mark_running(ok_id)
+    ledger.mark_succeeded(ok_id, 'api', {'backend_api': 1.2})
+    ledger.mark_running(failed_id)
+    ledger.mark_failed(failed_id, 'Timed out', True, {'browser_acquire': 0.1})
+    ledger.mark_running(failed_id)
+    ledger.mark_failed(failed_id, 'Timed out again', True, {})
+
+    failed_jobs = ledger.get_failed_jobs()
+    assert [job['id'] for job in failed_jobs] == [failed_id]
+    assert failed_jobs[0]['data'] == {'customData': {'Quote_First_Name': 'John'}}
+    assert failed_jobs[0]['attempts'] == 2
+    assert failed_jobs[0]['error'] == 'Timed out again'
+    assert ledger.get_failed_jobs([ok_id]) == []
+
+    succeeded = ledger.list_jobs(status='succeeded')
+    assert succeeded[0]['backend'] == 'api'
+    assert succeeded[0]['step_timings'] == {'backend_api': 1.2}
+
+
+
+def test_cursor_and_pending_jobs_survive_restart(tmp_path):
+    """Test the job stream cursor and jobs that never started are there for the next listener"""
+    ledger = JobLedger(str(tmp_path / 'quote_jobs.db'))
+    assert ledger.get_cursor() == (None, 0)
+    started_id = ledger.record_job({'customData': {}}, source_job_id=1)
+    waiting_id = ledger.record_job({'customData': {'Quote_First_Name': 'Jane'}}, source_job_id=2)
+    ledger.mark_running(started_id)
+    ledger.save_cursor('server-a', 2)
+
+    ledger = JobLedger(ledger.db_path)
+    assert ledger.get_cursor() == ('server-a', 2)
+    assert [job['id'] for job in ledger.get_pending_jobs()] == [waiting_id]
+    ledger.save_cursor('server-b', 1)
+    assert ledger.get_cursor() == ('server-b', 1)
+
+
+def test_interrupted_jobs_become_replayable(tmp_path):
+    """Test jobs left running by a crash are failed on startup so replay picks them up"""
+    ledger = JobLedger(str(tmp_path / 'quote_jobs.db'))
+    running_id = ledger.record_job({'customData': {}}, source_job_id=1)
+    pending_id = ledger.record_job({'customData': {}}, source_job_id=2)
+    ledger.mark_running(running_id)
+
+    ledger = JobLedger(ledger.db_path)
+    assert ledger.fail_interrupted_jobs() == 1
+    assert [job['id'] for job in ledger.get_failed_jobs()] == [running_id]
+    assert [job['id'] for job in ledger.get_pending_jobs()] == [pending_id]
+    assert ledger.fail_interrupted_jobs() == 0
+
+
+def test_backend_pin_kept_for_replay(tmp_path):
+    """Test the backend a failed job is pinned to comes back with it for replay"""
+    ledger = JobLedger(str(tmp_path / 'quote_jobs.db'))
+    job_id = ledger.record_job({'customData': {}}, source_job_id=1)
+    ledger.mark_running(job_id)
+    ledger.mark_failed(job_id, 'Timed out', True, {}, only_backend='api')
+    ledger.mark_running(job_id)
+    ledger.mark_failed(job_id, 'Timed out again', True, {})
+
+    ledger = JobLedger(ledger.db_path)
+    assert ledger.get_failed_jobs()[0]['only_backend'] == 'api'
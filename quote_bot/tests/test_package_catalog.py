@@ -0,0 +1,98 @@
+import json
+import os
+import sys
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from package_catalog import PackageCatalog
+
+PACKAGES = [
+    {'id': 'p1', 'name': 'Full Detail', 'car_size': 'Sedan'},
+    {'id': 'p2', 'name': 'Full Detail', 'car_size': 'SUV'},
+    {'id': 'p3', 'name': 'Interior Detail - SUV'},
+    {'id': 'p4', 'name': 'Exterior Wash', 'car_size': 'Mid-size SUV'},
+]
+
+
+def make_catalog(tmp_path):
+    cache_file = tmp_path / 'fieldd_packages.json'
+    cache_file.write_text(json.dumps({'fetched_at': None, 'packages': PACKAGES}))
+    return PackageCatalog(cache_file=str(cache_file), api_key='')
+
+
+def test_match_exact(tmp_path):
+    """Test an exact service and size picks the right package"""
+    catalog = make_catalog(tmp_path)
+    
+    assert catalog.match('Full Detail', 'SUV')['id'] == 'p2'
+    assert catalog.match('full detail', 'sedan')['id'] == 'p1'
+
+
+def test_match_fuzzy(tmp_path):
+    """Test typos and sizes written into the package name still match"""
+    catalog = make_catalog(tmp_path)
+    
+    assert catalog.match('Ful detial', 'Suv')['id'] == 'p2'
+    assert catalog.match('Interior', 'SUV')['id'] == 'p3'
+    assert catalog.match('exterior wash', 'midsize suv')['id'] == 'p4'
+
+
+def test_no_match(tmp_path):
+    """Test unknown services and sizes are rejected"""
+    catalog = make_catalog(tmp_path)
+    
+    assert catalog.match('Ceramic Coating', 'SUV') is None
+    assert catalog.match('Full Detail', 'Truck') is None
+
+
+def test_no_match_on_shared_words(tmp_path):
+    """Test a service that only shares generic words with a package isn't quoted as that package"""
+    catalog = make_catalog(tmp_path)
+    
+    assert catalog.match('Exterior Detail', 'SUV') is None
+    assert catalog.match('Mini Detail', 'SUV') is None
+    assert catalog.match('Detail', 'SUV') is None
+
+
+def test_no_match_without_size(tmp_path):
+    """Test an empty car size is rejected instead of picking whichever size comes first"""
+    catalog = make_catalog(tmp_path)
+    
+    assert catalog.match('Full Detail', '') is None
+    assert catalog.match('Interior', '') is None
+
+
+def test_ambiguous_match(tmp_path):
+    """Test a request that fits two packages about equally is rejected"""
+    cache_file = tmp_path / 'fieldd_packages.json'
+    cache_file.write_text(json.dumps({'fetched_at': None, 'packages': [
+        {'id': 'p1', 'name': 'Interior Detail', 'car_size': 'SUV'},
+        {'id': 'p2', 'name': 'Interior Detail Plus', 'car_size': 'SUV'},
+        {'id': 'p3', 'name': 'Interior Detail', 'car_size': 'SUVs'},
+    ]}))
+    catalog = PackageCatalog(cache_file=str(cache_file), api_key='')
+    
+    assert catalog.match('Interior Detail', 'SUV') is None
+    assert catalog.match('Interior Detail Plus', 'SUV')['id'] == 'p2'
+
+
+def test_missing_catalog_is_not_loaded(tmp_path):
+    """Test a missing catalog file leaves the catalog empty so jobs aren't rejected"""
+    catalog = PackageCatalog(cache_file=str(tmp_path / 'missing.json'), api_key='')
+    
+    assert not catalog.is_loaded()
+    assert catalog.is_stale()
+
+
+@pytest.mark.asyncio
+async def test_refresh_reports_failure(tmp_path):
+    """Test a failed refresh keeps the saved catalog and says so, so it can be retried"""
+    catalog = make_catalog(tmp_path)
+    
+    assert not await catalog.refresh()  # no API key
+    catalog.api_key = 'test-key'
+    catalog.api_url = 'http://127.0.0.1:1'
+    assert not await catalog.refresh_if_stale()
+    assert catalog.is_loaded() and catalog.is_stale()
+    assert catalog.seconds_until_stale() == 0
@@ -0,0 +1,214 @@
+import asyncio
+import os
+import sys
+import pytest
+from aiohttp import web
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from quote_backends import (FielddAPIQuoteBackend, BrowserQuoteBackend, QuoteBackend, QuoteBackendError,
+                            QuoteOutcomeUnknown, create_quote)
+
+CUSTOMER_DATA = {
+    'first_name': 'John',
+    'last_name': 'Doe',
+    'email': 'john.doe@example.com',
+    'phone': '5125550100',
+    'address': '123 Main St, Austin, TX',
+    'service_request': 'Full Detail',
+    'car_size': 'SUV',
+    'job_key': 'quote-job-42'
+}
+
+
+class FielddStub:
+    """Local stand-in for the Fieldd quotes API that replies with a scripted list of statuses"""
+    
+    def __init__(self, statuses):
+        self.statuses = list(statuses)
+        self.requests = []
+    
+    async def handle_quote(self, request):
+        self.requests.append({'json': await request.json(), 'headers': dict(request.headers)})
+        status = self.statuses.pop(0) if self.statuses else 200
+        if status == 'hang':
+            # Longer than the backend waits, Fieldd may still create the quote
+            await asyncio.sleep(1)
+            return web.json_response({'quote_id': 'q_123'})
+        if status == 200:
+            return web.json_response({'quote_id': 'q_123'})
+        return web.Response(status=status, text='stub error')
+    
+    async def start(self):
+        app = web.Application()
+        app.router.add_post('/v1/quotes', self.handle_quote)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, '127.0.0.1', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        return f'http://127.0.0.1:{port}/v1'
+    
+    async def stop(self):
+        await self.runner.cleanup()
+
+
+async def run_with_stub(statuses, backends_for, **backend_args):
+    stub = FielddStub(statuses)
+    api_url = await stub.start()
+    api_backend = FielddAPIQuoteBackend(api_url=api_url, api_key='test-key', retry_delay=0, **backend_args)
+    try:
+        result = await create_quote(CUSTOMER_DATA, backends_for(api_backend))
+        return result, stub.requests
+    finally:
+        await api_backend.close()
+        await stub.stop()
+
+
+@pytest.mark.asyncio
+async def test_api_backend_creates_quote():
+    """Test a quote goes through the API in one request"""
+    (backend_name, result), requests = await run_with_stub([200], lambda api: [api])
+    
+    assert backend_name == 'api'
+    assert result == {'quote_id': 'q_123'}
+    assert len(requests) == 1
+    assert requests[0]['json']['customer']['first_name'] == 'John'
+    assert requests[0]['json']['service'] == {'package_id': None, 'name': 'Full Detail', 'car_size': 'SUV'}
+    assert requests[0]['headers']['Authorization'] == 'Bearer test-key'
+
+
+@pytest.mark.asyncio
+async def test_api_backend_retries_transient_errors():
+    """Test 5xx responses are retried with the same idempotency key"""
+    (backend_name, result), requests = await run_with_stub([503, 502, 200], lambda api: [api])
+    
+    assert backend_name == 'api'
+    assert len(requests) == 3
+    assert {request['headers']['Idempotency-Key'] for request in requests} == {'quote-job-42'}
+
+
+@pytest.mark.asyncio
+async def test_falls_back_to_browser_on_api_error():
+    """Test a rejected API request falls back to the browser backend"""
+    async def fake_browser_quote(customer_data):
+        return 'browser result'
+    
+    (backend_name, result), requests = await run_with_stub(
+        [400],
+        lambda api: [api, BrowserQuoteBackend(fake_browser_quote)]
+    )
+    
+    assert backend_name == 'browser'
+    assert result == 'browser result'
+    assert len(requests) == 1
+
+
+@pytest.mark.asyncio
+async def test_preferred_backend_goes_first():
+    """Test a job can ask for the browser backend"""
+    async def fake_browser_quote(customer_data):
+        return 'browser result'
+    
+    api_backend = FielddAPIQuoteBackend(api_url='http://127.0.0.1:1', api_key='test-key')
+    backend_name, result = await create_quote(
+        CUSTOMER_DATA,
+        [api_backend, BrowserQuoteBackend(fake_browser_quote)],
+        preferred='browser'
+    )
+    
+    assert backend_name == 'browser'
+
+
+@pytest.mark.asyncio
+async def test_all_backends_failing_raises():
+    """Test an error is raised when nothing can create the quote"""
+    async def failed_browser_quote(customer_data):
+        return None
+    
+    with pytest.raises(QuoteBackendError):
+        await create_quote(CUSTOMER_DATA, [FielddAPIQuoteBackend(api_key=''), BrowserQuoteBackend(failed_browser_quote)])
+
+
+@pytest.mark.asyncio
+async def test_no_browser_fallback_after_timeout():
+    """Test a timed out API request, which may still have created the quote, isn't followed by a browser quote"""
+    browser_quotes = []
+    
+    async def fake_browser_quote(customer_data):
+        browser_quotes.append(customer_data)
+        return 'browser result'
+    
+    with pytest.raises(QuoteOutcomeUnknown) as error:
+        await run_with_stub(
+            ['hang', 503],
+            lambda api: [api, BrowserQuoteBackend(fake_browser_quote)],
+            timeout=0.2, max_retries=1
+        )
+    
+    assert error.value.backend == 'api'
+    assert browser_quotes == []
+
+
+@pytest.mark.asyncio
+async def test_browser_outcome_unknown_is_not_retried():
+    """Test a browser quote that may have been sent stops the search and isn't marked retryable"""
+    async def sent_browser_quote(customer_data):
+        raise QuoteOutcomeUnknown("Scripted quote failed after sending", retryable=False)
+    
+    async def other_browser_quote(customer_data):
+        raise AssertionError("a second backend ran")
+    
+    class OtherBrowserBackend(BrowserQuoteBackend):
+        name = 'other'
+    
+    with pytest.raises(QuoteOutcomeUnknown) as error:
+        await create_quote(CUSTOMER_DATA, [BrowserQuoteBackend(sent_browser_quote), OtherBrowserBackend(other_browser_quote)])
+    
+    assert error.value.backend == 'browser'
+    assert error.value.retryable is False
+
+
+@pytest.mark.asyncio
+async def test_attempted_backends_recorded():
+    """Test each backend is recorded as it starts, so a caller's timeout knows which one was cut off"""
+    async def slow_browser_quote(customer_data):
+        await asyncio.sleep(1)
+    
+    attempted = []
+    with pytest.raises(asyncio.TimeoutError):
+        await asyncio.wait_for(
+            create_quote(CUSTOMER_DATA, [FielddAPIQuoteBackend(api_key=''), BrowserQuoteBackend(slow_browser_quote)],
+                         attempted=attempted),
+            timeout=0.1
+        )
+    
+    assert attempted == ['browser']
+
+
+@pytest.mark.asyncio
+async def test_falls_back_to_browser_when_api_unreachable():
+    """Test the browser is used when the API request was never sent"""
+    async def fake_browser_quote(customer_data):
+        return 'browser result'
+    
+    api_backend = FielddAPIQuoteBackend(api_url='http://127.0.0.1:1', api_key='test-key', max_retries=1, retry_delay=0)
+    try:
+        backend_name, result = await create_quote(CUSTOMER_DATA, [api_backend, BrowserQuoteBackend(fake_browser_quote)])
+    finally:
+        await api_backend.close()
+    
+    assert backend_name == 'browser'
+    
+    # A job whose earlier API attempt may have created the quote only tries the API again
+    with pytest.raises(QuoteBackendError, match="No quote backend available"):
+        await create_quote(CUSTOMER_DATA, [BrowserQuoteBackend(fake_browser_quote)], only='api')
+
+
+def test_backends_implement_create_quote():
+    """Test a backend without create_quote can't be made"""
+    class IncompleteBackend(QuoteBackend):
+        name = 'incomplete'
+    
+    with pytest.raises(TypeError):
+        IncompleteBackend()
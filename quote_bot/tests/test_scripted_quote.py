@@ -0,0 +1,88 @@
+import os
+import sys
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripted_quote import ScriptedQuoteRunner, ScriptedOutcomeUnknown, ScriptedStepError
+from address_cache import AddressCache
+
+playwright_api = pytest.importorskip("playwright.async_api")
+
+FORM_URL = 'file://' + os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fieldd_quote_form.html')
+
+CUSTOMER_DATA = {
+    'first_name': 'John',
+    'last_name': 'Doe',
+    'email': 'john.doe@example.com',
+    'phone': '5125550100',
+    'address': '123 Main St',
+    'service_request': 'Full Detail',
+    'car_size': 'SUV'
+}
+
+
+async def run_against_replica(customer_data, address_cache=None, form_url=FORM_URL):
+    """Run the scripted flow against the local form replica and return what it submitted"""
+    async with playwright_api.async_playwright() as playwright:
+        # CHROME_PATH lets the tests use an already installed Chrome
+        browser = await playwright.chromium.launch(executable_path=os.getenv('CHROME_PATH'))
+        try:
+            page = await browser.new_page()
+            runner = ScriptedQuoteRunner(
+                page, customer_data, 'bot@example.com', 'secret', 'Austin',
+                planner_url=form_url, address_cache=address_cache
+            )
+            await runner.run()
+            return await page.evaluate('window.submittedQuote')
+        finally:
+            await browser.close()
+
+
+@pytest.mark.asyncio
+async def test_scripted_quote_fills_form():
+    """Test the scripted flow logs in and submits the quote with the right choices"""
+    quote = await run_against_replica(CUSTOMER_DATA)
+    
+    assert quote['firstName'] == 'John'
+    assert quote['lastName'] == 'Doe'
+    assert quote['email'] == 'john.doe@example.com'
+    assert quote['phone'] == '5125550100'
+    assert quote['customerAddress'] == '123 Main St, Austin, TX, USA'
+    assert quote['jobAddress'] == '123 Main St, Austin, TX, USA'
+    assert quote['acceptance'] == 'self'
+    assert quote['service'] == 'Full Detail - SUV'
+
+
+@pytest.mark.asyncio
+async def test_scripted_quote_uses_address_cache(tmp_path):
+    """Test the resolved address is cached and picked straight from the cache next time"""
+    address_cache = AddressCache(str(tmp_path / 'address_cache.json'))
+    await run_against_replica(CUSTOMER_DATA, address_cache)
+    
+    assert address_cache.get('123 Main Street') == '123 Main St, Austin, TX, USA'
+    
+    quote = await run_against_replica(CUSTOMER_DATA, address_cache)
+    assert quote['customerAddress'] == '123 Main St, Austin, TX, USA'
+
+
+@pytest.mark.asyncio
+async def test_scripted_quote_reports_failed_step(monkeypatch):
+    """Test an unknown package fails at the service step so the agent can take over"""
+    monkeypatch.setattr('scripted_quote.STEP_TIMEOUT_MS', 1000)
+    
+    with pytest.raises(ScriptedStepError) as error:
+        await run_against_replica(dict(CUSTOMER_DATA, service_request='Ceramic Coating'))
+    
+    assert error.value.step == 'service_selection'
+
+
+@pytest.mark.asyncio
+async def test_scripted_quote_outcome_unknown_after_send(monkeypatch):
+    """Test a failure after Send Quote was clicked isn't reported as an ordinary step failure"""
+    monkeypatch.setattr('scripted_quote.STEP_TIMEOUT_MS', 1000)
+    
+    with pytest.raises(ScriptedOutcomeUnknown) as error:
+        await run_against_replica(CUSTOMER_DATA, form_url=FORM_URL + '?stuck-after-send')
+    
+    assert error.value.step == 'send_quote'
@@ -0,0 +1,66 @@
+import os
+import sys
+import threading
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import server
+
+
+def setup_function():
+    server.clear_jobs()
+
+
+def test_wait_returns_queued_job():
+    """Test that a waiting client gets a job posted to the webhook"""
+    client = server.app.test_client()
+    client.post('/webhook', json={'customData': {'Quote_First_Name': 'John'}})
+    
+    response = client.get('/jobs/wait', query_string={'after': 0, 'server_id': server.server_id, 'timeout': 1})
+    result = response.get_json()
+    
+    assert len(result['jobs']) == 1
+    assert result['jobs'][0]['data']['customData']['Quote_First_Name'] == 'John'
+    assert result['last_id'] == result['jobs'][0]['id']
+
+
+def test_wait_wakes_up_when_job_arrives():
+    """Test that the long-poll returns as soon as a job is posted"""
+    client = server.app.test_client()
+    after_id = server.last_job_id
+    
+    def post_later():
+        time.sleep(0.2)
+        server.app.test_client().post('/webhook', json={'customData': {}})
+    
+    threading.Thread(target=post_later).start()
+    started = time.monotonic()
+    response = client.get('/jobs/wait', query_string={'after': after_id, 'server_id': server.server_id, 'timeout': 5})
+    
+    assert len(response.get_json()['jobs']) == 1
+    assert time.monotonic() - started < 2
+
+
+def test_wait_times_out_without_jobs():
+    """Test that the long-poll returns an empty list after the timeout"""
+    client = server.app.test_client()
+    after_id = server.last_job_id
+    
+    response = client.get('/jobs/wait', query_string={'after': after_id, 'server_id': server.server_id, 'timeout': 0.1})
+    result = response.get_json()
+    
+    assert result['jobs'] == []
+    assert result['last_id'] == after_id
+
+
+def test_stale_server_id_resets_cursor():
+    """Test that a client from before a restart gets all queued jobs"""
+    client = server.app.test_client()
+    client.post('/webhook', json={'customData': {}})
+    
+    response = client.get('/jobs/wait', query_string={'after': 10000, 'server_id': 'old', 'timeout': 0.1})
+    result = response.get_json()
+    
+    assert len(result['jobs']) == 1
+    assert result['server_id'] == server.server_id
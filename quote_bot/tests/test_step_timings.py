@@ -0,0 +1,86 @@
+import asyncio
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import step_timings
+from step_timings import (AgentStepTimer, load_step_events, percentile, start_job_timings,
+                          summarize_step_events, time_step)
+
+
+@pytest.fixture
+def events_file(tmp_path, monkeypatch):
+    path = str(tmp_path / 'step_events.jsonl')
+    monkeypatch.setattr(step_timings, 'STEP_EVENTS_FILE', path)
+    return path
+
+
+def test_step_timings_follow_the_job(events_file):
+    """Test steps timed inside tasks the job awaits land in the job's timings and the event file"""
+    async def step():
+        with time_step('inner'):
+            await asyncio.sleep(0)
+
+    async def job():
+        timings = start_job_timings(job_id=7)
+        with time_step('outer'):
+            await asyncio.wait_for(step(), timeout=1)
+        return timings
+
+    timings = asyncio.run(job())
+    assert set(timings) == {'inner', 'outer'}
+
+    events = load_step_events(events_file)
+    assert [event['step'] for event in events] == ['inner', 'outer']
+    assert all(event['job_id'] == 7 and event['ok'] for event in events)
+
+
+def test_failed_step_is_marked(events_file):
+    """Test a step that raises is still recorded, as a failure"""
+    async def job():
+        start_job_timings()
+        with pytest.raises(ValueError):
+            with time_step('broken'):
+                raise ValueError('boom')
+
+    asyncio.run(job())
+    assert load_step_events(events_file)[0]['ok'] is False
+
+
+def test_agent_step_timer(events_file):
+    """Test each agent step is recorded under the actions it took"""
+    def output(*actions):
+        return SimpleNamespace(
+            action=[SimpleNamespace(model_dump=lambda exclude_unset, a=a: {a: {}}) for a in actions],
+            current_state=SimpleNamespace(next_goal='next')
+        )
+
+    async def job():
+        timings = start_job_timings()
+        timer = AgentStepTimer()
+        timer(SimpleNamespace(url='https://admin.fieldd.co'), output('input_text'), 1)
+        timer(SimpleNamespace(url='https://admin.fieldd.co'), output('input_text'), 2)
+        timer(SimpleNamespace(url='https://admin.fieldd.co'), output('click_element'), 3)
+        timer.finish()
+        return timings
+
+    timings = asyncio.run(job())
+    assert set(timings) == {'agent_input_text', 'agent_click_element'}
+    assert [event['agent_step'] for event in load_step_events(events_file)] == [1, 2, 3]
+
+
+def test_summarize_step_events():
+    """Test p50/p95 per step, slowest first"""
+    events = [{'step': 'login', 'seconds': float(s), 'ok': True} for s in range(1, 21)]
+    events += [{'step': 'send_quote', 'seconds': 30.0, 'ok': False}]
+
+    summary = summarize_step_events(events)
+    assert list(summary) == ['send_quote', 'login']
+    assert summary['login']['p50'] == 10.0
+    assert summary['login']['p95'] == 19.0
+    assert summary['send_quote']['failures'] == 1
+    assert percentile([5.0], 95) == 5.0
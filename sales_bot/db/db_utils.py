@@ -1,16 +1,23 @@
-import sqlite3
 import os
-from datetime import datetime
+import sys
 from typing import List, Dict, Optional
 
+# Shared code lives in common/ at the repo root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from common.fast_path import FastPathResult, handle_fast_path
+from common.metrics import DB_LATENCY
+from common.storage import ConversationStore, create_store
+
+# The sales bot's senders and the roles the shared store uses for them
+SENDER_ROLES = {'customer': 'user', 'agent': 'assistant'}
+ROLE_SENDERS = {role: sender for sender, role in SENDER_ROLES.items()}
+
 class DatabaseManager:
-    def __init__(self):
-        self.db_path = os.path.join(os.path.dirname(__file__), 'conversations.db')
-    
-    def get_connection(self):
-        """Get a database connection."""
-        return sqlite3.connect(self.db_path)
+    def __init__(self, store: ConversationStore = None):
+        # The conversation store shared with the src/ agents (CONVERSATION_STORE_URL)
+        self.store = store or create_store()
     
+    @DB_LATENCY.time(operation='store_message')
     def store_message(self, contact_id: str, message: str, sender: str = 'customer') -> bool:
         """
         Store a new message in the database.
@@ -24,21 +31,14 @@ class DatabaseManager:
             bool: True if successful, False otherwise
         """
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-            INSERT INTO conversations (contact_id, sender, message)
-            VALUES (?, ?, ?)
-            ''', (contact_id, sender, message))
-            
-            conn.commit()
-            conn.close()
+            conversation_id = self.store.get_or_create_conversation(contact_id)
+            self.store.add_message(conversation_id, SENDER_ROLES[sender], message)
             return True
         except Exception as e:
             print(f"Error storing message: {e}")
             return False
     
+    @DB_LATENCY.time(operation='get_conversation_history')
     def get_conversation_history(self, contact_id: str, limit: int = 10) -> List[Dict]:
         """
         Retrieve conversation history for a specific contact.
@@ -48,36 +48,34 @@ class DatabaseManager:
             limit: Maximum number of messages to retrieve
             
         Returns:
-            List of dictionaries containing message data
+            List of dictionaries containing message data, newest first
         """
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-            SELECT id, contact_id, sender, message, timestamp
-            FROM conversations
-            WHERE contact_id = ?
-            ORDER BY timestamp DESC
-            LIMIT ?
-            ''', (contact_id, limit))
-            
-            messages = []
-            for row in cursor.fetchall():
-                messages.append({
-                    'id': row[0],
-                    'contact_id': row[1],
-                    'sender': row[2],
-                    'message': row[3],
-                    'timestamp': row[4]
-                })
-            
-            conn.close()
-            return messages
+            return [
+                {
+                    'id': message['id'],
+                    'contact_id': contact_id,
+                    'sender': ROLE_SENDERS.get(message['role'], message['role']),
+                    'message': message['content'],
+                    'timestamp': message['timestamp']
+                }
+                for message in self.store.get_recent_messages(contact_id, limit)
+            ]
         except Exception as e:
             print(f"Error retrieving conversation history: {e}")
             return []
     
+    def handle_fast_path(self, contact_id: str, message: str) -> Optional[FastPathResult]:
+        """
+        Answer STOP, START, thanks/ok and emoji-only messages without the agent, storing the message and reply.
+        
+        Returns:
+            The templated reply (its reply is None when nothing should be sent), or None if the agent should answer
+        """
+        conversation_id = self.store.get_or_create_conversation(contact_id)
+        return handle_fast_path(self.store, contact_id, conversation_id, message)
+    
+    @DB_LATENCY.time(operation='get_last_message')
     def get_last_message(self, contact_id: str) -> Optional[Dict]:
         """
         Get the most recent message for a contact.
@@ -88,33 +86,8 @@ class DatabaseManager:
         Returns:
             Dictionary containing the last message data or None if no messages exist
         """
-        try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-            SELECT id, contact_id, sender, message, timestamp
-            FROM conversations
-            WHERE contact_id = ?
-            ORDER BY timestamp DESC
-            LIMIT 1
-            ''', (contact_id,))
-            
-            row = cursor.fetchone()
-            conn.close()
-            
-            if row:
-                return {
-                    'id': row[0],
-                    'contact_id': row[1],
-                    'sender': row[2],
-                    'message': row[3],
-                    'timestamp': row[4]
-                }
-            return None
-        except Exception as e:
-            print(f"Error retrieving last message: {e}")
-            return None
+        history = self.get_conversation_history(contact_id, limit=1)
+        return history[0] if history else None
 
 # Example usage:
 if __name__ == "__main__":
@@ -129,4 +102,4 @@ if __name__ == "__main__":
     
     # Get last message
     last_msg = db.get_last_message("test_contact_123")
-    print("Last message:", last_msg) 
\ No newline at end of file
+    print("Last message:", last_msg)
@@ -1,44 +1,55 @@
 import sqlite3
 import os
-from datetime import datetime
+import sys
+from db_utils import SENDER_ROLES, DatabaseManager
 
-def init_db():
-    """Initialize the SQLite database and create the conversations table."""
-    # Ensure the db directory exists
-    os.makedirs(os.path.dirname(__file__), exist_ok=True)
-    
-    # Connect to SQLite database (creates it if it doesn't exist)
-    conn = sqlite3.connect(os.path.join(os.path.dirname(__file__), 'conversations.db'))
-    cursor = conn.cursor()
-    
-    # Create conversations table
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS conversations (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        contact_id TEXT NOT NULL,
-        sender TEXT CHECK(sender IN ('customer', 'agent')) NOT NULL,
-        message TEXT NOT NULL,
-        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-    )
-    ''')
+# Where the sales bot kept its messages before it moved to the shared conversation store
+LEGACY_DB_PATH = os.path.join(os.path.dirname(__file__), 'conversations.db')
+
+def init_db() -> DatabaseManager:
+    """Create the conversation store's tables (sales_agent.db at the repo root unless CONVERSATION_STORE_URL is set)."""
+    return DatabaseManager()
+
+def import_legacy_messages(db: DatabaseManager, legacy_path: str = LEGACY_DB_PATH) -> int:
+    """
+    Copy messages from the old single-table conversations.db into the shared store, oldest first, keeping
+    their timestamps. Messages copied by an earlier run are skipped, so it's safe to run again.
     
-    # Create index on contact_id for faster lookups
-    cursor.execute('''
-    CREATE INDEX IF NOT EXISTS idx_conversations_contact_id 
-    ON conversations(contact_id)
-    ''')
+    Returns:
+        int: Number of messages copied
+    """
+    if not os.path.exists(legacy_path):
+        return 0
     
-    # Commit the changes and close the connection
-    conn.commit()
-    conn.close()
+    conn = sqlite3.connect(legacy_path)
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'conversations'")
+        if not cursor.fetchone():
+            return 0
+        
+        cursor.execute('SELECT contact_id, sender, message, timestamp FROM conversations ORDER BY id')
+        copied = 0
+        for contact_id, sender, message, timestamp in cursor.fetchall():
+            role = SENDER_ROLES[sender]
+            if timestamp and db.store.has_message(contact_id, role, message, timestamp):
+                continue
+            conversation_id = db.store.get_or_create_conversation(contact_id)
+            db.store.add_message(conversation_id, role, message, timestamp)
+            copied += 1
+        return copied
+    finally:
+        conn.close()
 
 def main():
     """Main function to initialize the database."""
     try:
-        init_db()
+        db = init_db()
         print("Database created successfully!")
+        if '--import-legacy' in sys.argv:
+            print(f"Imported {import_legacy_messages(db)} messages from {LEGACY_DB_PATH}")
     except Exception as e:
         print(f"Error creating database: {e}")
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
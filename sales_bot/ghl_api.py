@@ -1,4 +1,6 @@
 import os
+import sys
+import time
 import httpx
 from dotenv import load_dotenv
 from typing import Optional
@@ -6,6 +8,10 @@ import aiohttp
 import logging
 from config import settings
 
+# Shared code lives in common/ at the repo root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.metrics import ERRORS, MESSAGES, SMS_LATENCY
+
 # Load environment variables
 load_dotenv()
 
@@ -35,6 +41,7 @@ class GHLAPI:
         Returns:
             bool: True if successful, False otherwise
         """
+        started = time.perf_counter()
         try:
             url = f"{self.base_url}/contacts/{contact_id}/sms"
             payload = {
@@ -45,14 +52,20 @@ class GHLAPI:
                 async with session.post(url, json=payload, headers=self.headers) as response:
                     if response.status == 200:
                         logger.info(f"Successfully sent SMS to contact {contact_id}")
+                        SMS_LATENCY.observe(time.perf_counter() - started, status='sent')
+                        MESSAGES.inc(direction='outbound')
                         return True
                     else:
                         error_text = await response.text()
                         logger.error(f"Failed to send SMS to contact {contact_id}. Status: {response.status}, Error: {error_text}")
+                        SMS_LATENCY.observe(time.perf_counter() - started, status='failed')
+                        ERRORS.inc(component='sms')
                         return False
                         
         except Exception as e:
             logger.error(f"Error sending SMS to contact {contact_id}: {str(e)}")
+            SMS_LATENCY.observe(time.perf_counter() - started, status='failed')
+            ERRORS.inc(component='sms')
             return False
     
     async def get_contact(self, contact_id: str) -> dict:
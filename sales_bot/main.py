@@ -1,24 +1,29 @@
-from fastapi import FastAPI, Request, HTTPException
+from fastapi import FastAPI, Request, Response, HTTPException
 from pydantic import BaseModel
-import json
-import logging
+import os
+import sys
 from config import get_settings
 from sales_agent import SalesAgent
 from db.db_utils import DatabaseManager
 from ghl_api import GHLAPI
 
-# Set up logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
-logger = logging.getLogger(__name__)
+# Shared code lives in common/ at the repo root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.idempotency import WebhookDeduplicator, delivery_id
+from common.llm_resilience import request_deadline
+from common.metrics import CONTENT_TYPE, ERRORS, MESSAGES, WEBHOOK_LATENCY, render_metrics
+from common.structured_logging import configure_logging, get_logger, log_event, log_payload
+
+# Set up logging (JSON lines written to stderr from a background thread)
+logger = get_logger(__name__)
 
 app = FastAPI()
 settings = get_settings()
 db = DatabaseManager()
 agent = SalesAgent()
 ghl = GHLAPI()
+# GHL retries slow webhooks, each message id is only answered once
+deliveries = WebhookDeduplicator(db.store, server='sales_bot')
 
 class SMSMessage(BaseModel):
     id: str
@@ -53,13 +58,32 @@ def should_process_message(contact_id: str, pipeline_name: str) -> bool:
     
     return True
 
+@app.on_event("startup")
+async def start_logging():
+    """Send logs through the JSON writer once uvicorn has started the app"""
+    configure_logging()
+
 @app.post("/webhook")
 async def webhook(request: Request):
     """Handle incoming webhooks from GHL"""
+    # LLM calls get what's left of the webhook's time budget
+    with WEBHOOK_LATENCY.time(server='sales_bot'), request_deadline():
+        return await handle_webhook(request)
+
+async def handle_webhook(request: Request):
+    message_id = None
     try:
         # Get the raw webhook data
         data = await request.json()
-        logger.info(f"Received webhook data: {json.dumps(data, indent=2)}")
+        
+        # A retry of a message we've already got, answered (or being answered) by the first delivery.
+        # Other events' data ids aren't message ids.
+        message_id = delivery_id(data) if data.get("event") == "sms.received" else None
+        if not deliveries.claim(message_id):
+            log_event(logger, "webhook_duplicate", message_id=message_id)
+            return {"status": "success", "message": "Duplicate delivery ignored"}
+        
+        log_payload(logger, "webhook_received", data, event_type=data.get("event"))
         
         # If it's an SMS event, process it
         if data.get("event") == "sms.received":
@@ -70,7 +94,17 @@ async def webhook(request: Request):
             
             # Check if we should process this message
             if should_process_message(sms_data.contact_id, pipeline_name):
-                logger.info(f"Processing SMS from {sms_data.contact_id} in pipeline '{pipeline_name}': {sms_data.message}")
+                log_event(logger, "processing_sms", contact_id=sms_data.contact_id, pipeline=pipeline_name,
+                          message=sms_data.message)
+                MESSAGES.inc(direction='inbound')
+                
+                # Opt-outs, acknowledgements and emoji-only messages don't need the agent
+                fast_path = db.handle_fast_path(sms_data.contact_id, sms_data.message)
+                if fast_path:
+                    if fast_path.reply and not await ghl.send_sms(sms_data.contact_id, fast_path.reply):
+                        raise HTTPException(status_code=500, detail="Failed to send SMS response")
+                    log_event(logger, "sms_fast_path", contact_id=sms_data.contact_id, kind=fast_path.kind)
+                    return {"status": "success", "message": f"SMS handled without the agent ({fast_path.kind})"}
                 
                 # Store the incoming message
                 db.store_message(
@@ -106,8 +140,15 @@ async def webhook(request: Request):
         
     except Exception as e:
         logger.error(f"Error processing webhook: {str(e)}")
+        ERRORS.inc(component='webhook')
+        deliveries.release(message_id)
         return {"status": "error", "message": str(e)}
 
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics for this server"""
+    return Response(content=render_metrics(), media_type=CONTENT_TYPE)
+
 @app.get("/ping")
 async def ping():
     """Health check endpoint"""
@@ -115,6 +156,7 @@ async def ping():
 
 if __name__ == "__main__":
     import uvicorn
+    configure_logging()
     logger.info("Starting webhook server...")
     logger.info(f"Allowed pipelines: {settings.ALLOWED_PIPELINE_STAGES}")
     logger.info(f"Restricted to specific contacts: {settings.RESTRICT_TO_SPECIFIC_CONTACTS}")
@@ -1,9 +1,17 @@
 from typing import List, Dict
 import os
+import sys
 from dotenv import load_dotenv
 import openai
 from config import get_settings
 
+# Shared code lives in common/ at the repo root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.extraction import describe_slots, extract_slots, merge_slots
+from common.llm_resilience import FALLBACK_REPLY, LLM_TIMEOUT_SECONDS, LLMUnavailable, call_llm
+from common.metrics import ERRORS
+from common.model_router import choose_model, record_usage
+
 # Load environment variables
 load_dotenv()
 
@@ -16,7 +24,7 @@ class SalesAgent:
         self.system_prompt = """You are a friendly, professional sales agent for a car detailing business. 
         Your goal is to help customers understand our services and generate quotes when they're ready.
         Always maintain a helpful, conversational tone while gathering necessary information.
-        If a customer seems ready for a quote, ask for their car's make, model, and year."""
+        If a customer seems ready for a quote, ask for whichever of their car's make, model and year they haven't given."""
     
     def format_conversation_history(self, history: List[Dict]) -> str:
         """Format conversation history into a string for the LLM prompt."""
@@ -26,6 +34,14 @@ class SalesAgent:
             formatted_history.append(f"{role}: {msg['message']}")
         return "\n".join(formatted_history)
     
+    def extract_details(self, current_message: str, history: List[Dict]) -> Dict:
+        """Vehicle, services, condition and location the customer has given so far, extracted locally"""
+        details = {}
+        customer_messages = [msg['message'] for msg in reversed(history) if msg['sender'] == 'customer']
+        for message in customer_messages + [current_message]:
+            details.update(merge_slots(details, extract_slots(message)))
+        return details
+    
     def generate_response(self, current_message: str, history: List[Dict]) -> str:
         """
         Generate a response using the conversation history as context.
@@ -39,6 +55,7 @@ class SalesAgent:
         """
         # Format conversation history
         conversation_context = self.format_conversation_history(history)
+        known_details = describe_slots(self.extract_details(current_message, history)) or "None yet"
         
         # Create the full prompt
         messages = [
@@ -48,26 +65,38 @@ class SalesAgent:
 
 Latest message from customer: {current_message}
 
+Details the customer has already given: {known_details}
+
 Please provide a helpful response that:
 1. Addresses the customer's message
 2. Maintains context from previous messages
 3. Moves the conversation forward naturally
-4. Asks for necessary information if they seem ready for a quote"""}
+4. Asks only for the make, model and year details that are still missing if they seem ready for a quote"""}
         ]
         
         try:
-            # Call OpenAI API
-            response = openai.ChatCompletion.create(
-                model="gpt-3.5-turbo",
+            # Call OpenAI API, with a small model for greetings and a larger one for pricing and booking,
+            # within the webhook's time budget
+            choice = choose_model(current_message)
+            response = call_llm(lambda: openai.ChatCompletion.create(
+                model=choice.model,
                 messages=messages,
                 temperature=0.7,
-                max_tokens=150
-            )
+                max_tokens=150,
+                request_timeout=LLM_TIMEOUT_SECONDS
+            ), choice)
+            record_usage(choice, response)
             
             return response.choices[0].message.content.strip()
             
+        except LLMUnavailable as e:
+            # Out of time, or the provider is down
+            print(f"LLM unavailable, sending the fallback reply: {e}")
+            ERRORS.inc(component='llm')
+            return FALLBACK_REPLY
         except Exception as e:
             print(f"Error generating response: {e}")
+            ERRORS.inc(component='llm')
             return "I apologize, but I'm having trouble processing your message right now. Please try again in a moment."
 
 # Example usage
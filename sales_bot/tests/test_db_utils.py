@@ -0,0 +1,66 @@
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from common.storage import SQLiteStore
+from db.db_utils import DatabaseManager
+
+
+def test_messages_go_to_shared_store(tmp_path):
+    """Test the sales bot's messages land in the conversation store the src/ agents use"""
+    store = SQLiteStore(str(tmp_path / 'sales_agent.db'))
+    db = DatabaseManager(store)
+
+    assert db.store_message('contact_1', 'Hi, how much for a detail?', 'customer')
+    assert db.store_message('contact_1', 'Our full detail starts at $150.', 'agent')
+
+    history = db.get_conversation_history('contact_1')
+    assert [(m['sender'], m['message']) for m in history] == [
+        ('agent', 'Our full detail starts at $150.'),
+        ('customer', 'Hi, how much for a detail?')
+    ]
+    assert db.get_last_message('contact_1')['sender'] == 'agent'
+    assert db.get_last_message('contact_2') is None
+
+    conversation = store.get_conversation_by_ghl_id('contact_1')
+    assert [m['role'] for m in store.get_conversation_messages(conversation['id'])] == ['user', 'assistant']
+
+
+def test_default_store_is_shared(tmp_path, monkeypatch):
+    """Test the sales bot opens the same default store as the src/ agents"""
+    import common.storage as storage
+    monkeypatch.setattr(storage, 'CONVERSATION_STORE_URL', str(tmp_path / 'shared.db'))
+
+    assert DatabaseManager().store.db_path == storage.create_store().db_path == str(tmp_path / 'shared.db')
+    assert os.path.dirname(storage.DEFAULT_STORE_PATH) == os.path.dirname(os.path.dirname(storage.__file__))
+
+
+def test_legacy_import_runs_once(tmp_path, monkeypatch):
+    """Test legacy messages keep their timestamps and a second import doesn't copy them again"""
+    import sqlite3
+    monkeypatch.syspath_prepend(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'db'))
+    from init_db import import_legacy_messages
+
+    legacy_path = str(tmp_path / 'conversations.db')
+    with sqlite3.connect(legacy_path) as conn:
+        conn.execute('''
+            CREATE TABLE conversations (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, contact_id TEXT, sender TEXT, message TEXT, timestamp DATETIME
+            )
+        ''')
+        conn.executemany('INSERT INTO conversations (contact_id, sender, message, timestamp) VALUES (?, ?, ?, ?)', [
+            ('contact_1', 'customer', 'Is 50% off still on?', '2024-03-01 09:00:00'),
+            ('contact_1', 'agent', 'It is!', '2024-03-01 09:01:00')
+        ])
+    db = DatabaseManager(SQLiteStore(str(tmp_path / 'sales_agent.db')))
+
+    assert import_legacy_messages(db, legacy_path) == 2
+    assert import_legacy_messages(db, legacy_path) == 0
+
+    history = db.get_conversation_history('contact_1')
+    assert [(m['message'], m['timestamp']) for m in history] == [
+        ('It is!', '2024-03-01 09:01:00'),
+        ('Is 50% off still on?', '2024-03-01 09:00:00')
+    ]
@@ -3,28 +3,44 @@ import langchain
 from langchain_openai import ChatOpenAI
 from langchain_core.messages import HumanMessage, SystemMessage
 import getpass
+import operator
 import os
+import sys
 from datetime import datetime
-from typing import Dict, List, Any
-from dataclasses import dataclass
+from typing import Annotated, Dict, List, Any, Tuple
+from dataclasses import dataclass, field
 from dotenv import load_dotenv
 from langchain_core.prompts import ChatPromptTemplate
 from langgraph.graph import StateGraph, END, START
-from database import SalesDatabase
+from database import create_store
+from checkpointer import ConversationCheckpointer, conversation_config
+from structured_output import STRUCTURED_OUTPUT, STRUCTURED_OUTPUT_INSTRUCTIONS, AgentTurn, fallback_turn
+
+# Shared code lives in common/ at the repo root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.extraction import describe_slots, extract_slots, merge_slots
+from common.llm_resilience import FALLBACK_REPLY, LLM_TIMEOUT_SECONDS, LLMUnavailable, call_llm, call_priority
+from common.metrics import ERRORS
+from common.model_router import choose_model, record_usage
 
 # Load environment variables and set API key
 load_dotenv()
 openai.api_key = os.getenv("OPENAI_API_KEY")
 
+def merge_context(current: Dict[str, Any], update: Dict[str, Any]) -> Dict[str, Any]:
+    """Nodes (and each new message) only pass the context keys they change"""
+    return {**(current or {}), **(update or {})}
+
+# Nodes return only what they change: new messages are appended, context keys merged, other fields replaced
 @dataclass
 class ConversationState:
-    messages: List[Dict[str, str]]  # List of message dictionaries
-    current_node: str               # Current node in the workflow
-    pipeline_stage: str            # Current pipeline stage
-    context: Dict[str, Any]        # Additional context
-    last_updated: datetime         # Timestamp of last update
-    customer_id: str = None        # GHL Customer ID
-
+    messages: Annotated[List[Dict[str, str]], operator.add] = field(default_factory=list)  # List of message dictionaries
+    current_node: str = "sms_handler_node"  # Current node in the workflow
+    pipeline_stage: str = "New Lead"        # Current pipeline stage
+    context: Annotated[Dict[str, Any], merge_context] = field(default_factory=dict)  # Additional context
+    last_updated: datetime = None           # Timestamp of last update
+    customer_id: str = None                 # GHL Customer ID
+    
     @classmethod
     def create_new(cls, pipeline_stage: str = "New Lead", customer_id: str = None):
         return cls(
@@ -36,6 +52,9 @@ class ConversationState:
             customer_id=customer_id
         )
 
+# Messages included in the prompt as conversation history, and loaded from the store for each turn
+HISTORY_MESSAGES = 5
+
 # Define how the AI should behave
 system_template = """You are a sales agent for WAXD Car Detailing Austin. 
 Your goal is to help customers book detailing services while maintaining a friendly and professional conversation.
@@ -47,35 +66,94 @@ Current node: {current_node}
 def format_conversation_history(state: ConversationState) -> str:
     """Format conversation history for the prompt"""
     history = []
-    for msg in state.messages[-5:]:  # Keep last 5 messages for context
+    for msg in state.messages[-HISTORY_MESSAGES:]:
         if msg["role"] == "user":
             history.append(f"Customer: {msg['content']}")
         else:
             history.append(f"Agent: {msg['content']}")
     return "\n".join(history)
 
-def generate_response(state: ConversationState, custom_system_prompt: str = None) -> str:
-    """Generate AI response based on conversation history and context"""
+def build_prompt(state: ConversationState, system_prompt: str) -> List:
+    """The system prompt and the conversation so far, as chat messages"""
     # Format conversation history
     history = format_conversation_history(state)
     
-    # Use custom system prompt if provided, otherwise use default
-    system_prompt = custom_system_prompt or system_template
+    # Details already extracted from the conversation, so the reply doesn't ask for them again
+    known_details = describe_slots(state.context)
+    details = f"Known details: {known_details}\n\n" if known_details else ""
     
     # Create prompt with context
-    messages = [
+    return [
         SystemMessage(content=system_prompt.format(
             pipeline_stage=state.pipeline_stage,
             current_node=state.current_node
         )),
-        HumanMessage(content=f"Conversation history:\n{history}\n\nCurrent message: {state.context.get('current_message', '')}")
+        HumanMessage(content=f"{details}Conversation history:\n{history}\n\nCurrent message: {state.context.get('current_message', '')}")
     ]
+
+def choose_turn_model(state: ConversationState, node: str = None):
+    """The model tier for this turn, from the message, the node answering it and the pipeline stage"""
+    return choose_model(state.context.get("current_message", ""), node or state.current_node, state.pipeline_stage)
+
+def turn_priority(state: ConversationState, node: str = None) -> int:
+    """Booking conversations get an LLM slot before cold leads when calls are being throttled"""
+    return call_priority(state.pipeline_stage, node or state.current_node)
+
+def generate_response(state: ConversationState, custom_system_prompt: str = None, node: str = None) -> str:
+    """Generate AI response based on conversation history and context"""
+    # Use custom system prompt if provided, otherwise use default
+    messages = build_prompt(state, custom_system_prompt or system_template)
     
-    # Generate response
-    chat = ChatOpenAI(model="gpt-3.5-turbo")
-    response = chat.invoke(messages)
+    # Generate response, within the webhook's time budget
+    choice = choose_turn_model(state, node)
+    chat = ChatOpenAI(model=choice.model, timeout=LLM_TIMEOUT_SECONDS)
+    try:
+        response = call_llm(lambda: chat.invoke(messages), choice, priority=turn_priority(state, node))
+    except LLMUnavailable as e:
+        print(f"LLM unavailable, sending the fallback reply: {e}")
+        ERRORS.inc(component='llm')
+        return FALLBACK_REPLY
+    record_usage(choice, response)
     return response.content
 
+def generate_structured_response(state: ConversationState, custom_system_prompt: str = None,
+                                 node: str = None) -> AgentTurn:
+    """Generate the reply and extract the customer's details from the conversation in the same LLM call"""
+    messages = build_prompt(state, (custom_system_prompt or system_template) + STRUCTURED_OUTPUT_INSTRUCTIONS)
+    
+    # gpt-3.5-turbo has no JSON schema mode, the fields come back as a function call.
+    # The raw message is kept for its token usage.
+    choice = choose_turn_model(state, node)
+    chat = ChatOpenAI(model=choice.model, timeout=LLM_TIMEOUT_SECONDS).with_structured_output(
+        AgentTurn, method="function_calling", include_raw=True
+    )
+    try:
+        result = call_llm(lambda: chat.invoke(messages), choice, priority=turn_priority(state, node))
+    except LLMUnavailable as e:
+        print(f"LLM unavailable, sending the fallback reply: {e}")
+        ERRORS.inc(component='llm')
+        return AgentTurn(reply=FALLBACK_REPLY)
+    record_usage(choice, result["raw"])
+    if result["parsing_error"] or result["parsed"] is None:
+        # A malformed function call shouldn't fail the webhook (and have GHL retry the whole LLM call)
+        print(f"Couldn't parse the structured reply, sending it without extracted fields: {result['parsing_error']}")
+        ERRORS.inc(component='structured_output')
+        return fallback_turn(result["raw"], FALLBACK_REPLY)
+    return result["parsed"]
+
+def respond(state: ConversationState, custom_system_prompt: str = None, node: str = None) -> Tuple[str, Dict[str, Any]]:
+    """
+    The reply to the current message and the context updates extracted along with it,
+    which are only filled in with STRUCTURED_OUTPUT (one LLM call either way)
+    """
+    if STRUCTURED_OUTPUT:
+        turn = generate_structured_response(state, custom_system_prompt, node)
+        return turn.reply, turn.context_updates()
+    return generate_response(state, custom_system_prompt, node), {}
+
+# Nodes that answer the customer, a conversation resumes at whichever one it was left in
+RESPONSE_NODES = ("sales_node", "booking_node")
+
 # add routing logic - based on pipeline stage and conversation history
 def sms_handler_node(state: ConversationState) -> Dict:
     """Handle incoming SMS messages"""
@@ -85,18 +163,27 @@ def sms_handler_node(state: ConversationState) -> Dict:
     current_message = state.context.get("current_message", "")
     
     # Add user message to history
-    state.messages.append({
+    user_message = {
         "role": "user",
         "content": current_message,
         "timestamp": datetime.now().isoformat()
-    })
+    }
+    
+    # Pull the vehicle, services, condition, location and intent out of the message locally
+    context = merge_slots(state.context, extract_slots(current_message))
     
     # Initialize sales conditions if not present
     if "has_car_condition" not in state.context:
-        state.context["has_car_condition"] = False
+        context["has_car_condition"] = False
     
-    # Pass to sales node
-    return {"next": "sales_node", "state": state}
+    # Leave current_node alone so route_to_current_node resumes where the last message left off
+    return {"messages": [user_message], "context": context, "last_updated": datetime.now()}
+
+def route_to_current_node(state: ConversationState) -> str:
+    """Send the message to the node the conversation is in, new conversations start in sales"""
+    if state.current_node in RESPONSE_NODES:
+        return state.current_node
+    return "sales_node"
 
 def sales_node(state: ConversationState) -> Dict:
     """Handle sales conversation"""
@@ -118,33 +205,36 @@ def sales_node(state: ConversationState) -> Dict:
     Keep responses focused on understanding the car's current state.
     """
     
-    # Generate sales-focused response
-    response = generate_response(state, sales_system_prompt)
+    # Generate sales-focused response, with any details the LLM extracted along with it
+    response, context = respond(state, sales_system_prompt, node="sales_node")
     
     # Add AI response to history
-    state.messages.append({
+    reply = {
         "role": "assistant",
         "content": response,
         "timestamp": datetime.now().isoformat()
-    })
+    }
     
-    # Check if we have car condition information
-    if not state.context.get("has_car_condition", False) and len(current_message) > 10:  # Basic check for meaningful response
-        state.context["has_car_condition"] = True
-        state.context["car_condition_details"] = current_message
+    # Check if we have car condition information (extracted from the message by sms_handler_node or the LLM)
+    has_car_condition = state.context.get("has_car_condition", False) or context.get("has_car_condition", False)
+    if not has_car_condition and state.context.get("car_condition"):
+        has_car_condition = True
+        context["has_car_condition"] = True
+        context["car_condition_details"] = current_message
         print("Car condition received:", current_message)
     
     # Only move to booking if we have car condition AND customer shows interest
-    has_car_condition = state.context.get("has_car_condition", False)
-    shows_interest = any(word in current_message for word in ["yes", "interested", "book", "schedule", "price", "quote"])
+    shows_interest = (state.context.get("interest") or state.context.get("intent") == "affirmative"
+                      or context.get("interested"))
     
     if has_car_condition and shows_interest:
+        # The customer's next message goes to booking, this one has had its reply
         print("Customer qualified - moving to booking")
-        return {"next": "booking_node", "state": state}
+        return {"messages": [reply], "context": context, "current_node": "booking_node"}
     
     # Stay in sales node until we get car condition and interest
     print("Staying in sales node - need more info or interest")
-    return {"next": "sales_node", "state": state}
+    return {"messages": [reply], "context": context, "current_node": "sales_node"}
 
 
 def booking_node(state: ConversationState) -> Dict:
@@ -152,18 +242,20 @@ def booking_node(state: ConversationState) -> Dict:
     print("Entering booking node")
     
     # Generate booking-focused response
-    response = generate_response(state)
+    response, context = respond(state, node="booking_node")
     
     # Add AI response to history
-    state.messages.append({
+    reply = {
         "role": "assistant",
         "content": response,
         "timestamp": datetime.now().isoformat()
-    })
+    }
     
-    return {"next": END, "state": state}
+    # Stay in booking for the rest of the conversation
+    return {"messages": [reply], "context": context, "current_node": "booking_node"}
 
-# Build the graph
+# Build the graph. Each message runs the SMS handler and then exactly one response node (one LLM call);
+# the response node records where the conversation goes next in current_node and the next message resumes there.
 builder = StateGraph(ConversationState)
 builder.add_node("sms_handler_node", sms_handler_node)
 builder.add_node("sales_node", sales_node)
@@ -171,19 +263,28 @@ builder.add_node("booking_node", booking_node)
 
 # Add the START edge
 builder.add_edge(START, "sms_handler_node")
-builder.add_edge("sms_handler_node", "sales_node")
-builder.add_edge("sales_node", "booking_node")
+builder.add_conditional_edges("sms_handler_node", route_to_current_node, list(RESPONSE_NODES))
+builder.add_edge("sales_node", END)
 builder.add_edge("booking_node", END)
 
 graph = builder.compile()
 
+def compile_checkpointed_graph(db) -> Any:
+    """
+    The graph, saving each conversation into db as it runs. Invoke it with conversation_config(conversation_id)
+    and just the new message, e.g. {"context": {"current_message": text}}: the rest of the state is loaded
+    from the conversation and only what each step changes is written back.
+    """
+    return builder.compile(checkpointer=ConversationCheckpointer(db, history_messages=HISTORY_MESSAGES))
+
 def main():
     """Main conversation loop with database integration"""
     print("Starting conversation with WAXD agent...")
     print("Type 'exit' to end the conversation")
     
     # Initialize database
-    db = SalesDatabase()
+    db = create_store()
+    checkpointed_graph = compile_checkpointed_graph(db)
     
     # Get GHL customer ID for this session
     ghl_customer_id = "8mrENnBig20f0h6gNDvR"
@@ -192,16 +293,9 @@ def main():
     existing_conversation = db.get_conversation_by_ghl_id(ghl_customer_id)
     if existing_conversation:
         print(f"Found existing conversation from: {existing_conversation['pipeline_stage']}")
-        conversation_id = existing_conversation['id']
-        current_state = db.load_conversation_state(conversation_id)
-        if not current_state:
-            print("Error loading conversation, starting new one...")
-            conversation_id = db.get_or_create_conversation(ghl_customer_id)
-            current_state = ConversationState.create_new(customer_id=ghl_customer_id)
     else:
         print("Starting new conversation...")
-        conversation_id = db.get_or_create_conversation(ghl_customer_id)
-        current_state = ConversationState.create_new(customer_id=ghl_customer_id)
+    conversation_id = db.get_or_create_conversation(ghl_customer_id)
     
     while True:
         try:
@@ -210,17 +304,10 @@ def main():
                 print("Ending conversation...")
                 break
             
-            # Update state with new message
-            current_state.context["current_message"] = user_input
-            
-            # Process through graph
-            result = graph.invoke(current_state)
-            
-            # Update state
-            current_state = result["state"]
-            
-            # Save to database
-            db.save_conversation_state(conversation_id, current_state)
+            # Process the new message through the graph, which resumes the conversation and saves what changed
+            current_state = ConversationState(**checkpointed_graph.invoke(
+                {"context": {"current_message": user_input}}, conversation_config(conversation_id)
+            ))
             
             # Print the last AI response
             for msg in reversed(current_state.messages):
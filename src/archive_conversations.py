@@ -0,0 +1,64 @@
+"""
+Archival job for the sales agent database.
+
+Closes conversations that have gone quiet, moves the messages of old closed conversations
+into the compressed message_archive table and hands the freed space back with a vacuum.
+Run it from cron, or leave it running with --every.
+"""
+import argparse
+import os
+import sys
+import time
+from database import ConversationStore, create_store
+
+# Shared code lives in common/ at the repo root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.structured_logging import configure_logging, get_logger, log_event
+
+# Close a conversation after this many days without a message
+CONVERSATION_IDLE_DAYS = float(os.getenv('CONVERSATION_IDLE_DAYS', 30))
+# Archive a closed conversation's messages once it's been idle this long
+MESSAGE_ARCHIVE_DAYS = float(os.getenv('MESSAGE_ARCHIVE_DAYS', 90))
+# Pages freed per incremental vacuum run (0 frees them all)
+VACUUM_PAGES = int(os.getenv('VACUUM_PAGES', 0))
+
+logger = get_logger(__name__)
+
+def run_archival(db: ConversationStore, idle_days: float, archive_days: float, vacuum: str, vacuum_pages: int):
+    """Run one pass of the archival job"""
+    closed = db.close_idle_conversations(idle_days)
+    archived = db.archive_old_messages(archive_days)
+    
+    if vacuum == 'full':
+        db.vacuum(full=True)
+    elif vacuum == 'incremental' and archived:
+        db.vacuum(pages=vacuum_pages)
+    
+    log_event(logger, "archival_complete", closed_conversations=closed, archived_messages=archived, vacuum=vacuum)
+    return closed, archived
+
+def main():
+    parser = argparse.ArgumentParser(description="Close idle conversations and archive old messages")
+    parser.add_argument('--db', help="Database file path or postgresql:// URL (default CONVERSATION_STORE_URL)")
+    parser.add_argument('--idle-days', type=float, default=CONVERSATION_IDLE_DAYS,
+                        help="Close conversations idle for this many days")
+    parser.add_argument('--archive-days', type=float, default=MESSAGE_ARCHIVE_DAYS,
+                        help="Archive messages of closed conversations idle for this many days")
+    parser.add_argument('--vacuum', choices=['incremental', 'full', 'none'], default='incremental',
+                        help="How to reclaim space afterwards (full blocks writers while it runs)")
+    parser.add_argument('--vacuum-pages', type=int, default=VACUUM_PAGES,
+                        help="Most pages to free per incremental vacuum (0 for all)")
+    parser.add_argument('--every', type=float, help="Keep running, once every this many hours")
+    args = parser.parse_args()
+    configure_logging()
+    
+    db = create_store(args.db)
+    while True:
+        closed, archived = run_archival(db, args.idle_days, args.archive_days, args.vacuum, args.vacuum_pages)
+        print(f"Closed {closed} idle conversations, archived {archived} messages")
+        if not args.every:
+            break
+        time.sleep(args.every * 3600)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+import asyncio
+import random
+from typing import Any, Dict, Iterator, Optional, Sequence
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    empty_checkpoint,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+    writes_sort_key,
+)
+from database import ConversationStore
+
+# State channels kept in the conversations and messages tables rather than as checkpoint blobs
+CONVERSATION_CHANNELS = ("messages", "pipeline_stage", "current_node", "context")
+
+def conversation_config(conversation_id: int) -> RunnableConfig:
+    """Graph config that checkpoints into the given conversation"""
+    return {"configurable": {"thread_id": str(conversation_id)}}
+
+class ConversationCheckpointer(BaseCheckpointSaver):
+    """
+    LangGraph checkpoint saver on the conversation store, with one thread per conversation.
+    
+    After each step only what changed is written: new messages are added to the messages table, a changed
+    pipeline stage, node or context updates the conversations row, and any other changed channel is stored
+    as a blob. Only each conversation's latest checkpoint is kept, so there is no time travel. A conversation
+    with no checkpoint yet (new, or saved before checkpointing) starts from its stored state.
+    
+    With history_messages, a turn only loads that many of the latest messages (as many as the prompt uses)
+    instead of the whole conversation, so resuming doesn't get slower as the conversation grows.
+    """
+    
+    def __init__(self, store: ConversationStore, serde=None, history_messages: Optional[int] = None):
+        super().__init__(serde=serde)
+        self.store = store
+        self.history_messages = history_messages
+        # Conversation id -> (checkpoint id, how many of its messages channel are already stored)
+        self._stored_messages = {}
+    
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = int(config["configurable"]["thread_id"])
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        row = self.store.get_graph_checkpoint(thread_id, checkpoint_ns, get_checkpoint_id(config))
+        if row is None:
+            if checkpoint_ns or get_checkpoint_id(config):
+                return None
+            return self._initial_checkpoint(thread_id)
+        
+        checkpoint = self.serde.loads_typed(row["checkpoint"])
+        versions = {channel: str(version) for channel, version in checkpoint["channel_versions"].items()}
+        mapped = [] if checkpoint_ns else [channel for channel in CONVERSATION_CHANNELS if channel in versions]
+        
+        blobs = self.store.get_graph_checkpoint_blobs(
+            thread_id, checkpoint_ns, {channel: version for channel, version in versions.items() if channel not in mapped}
+        )
+        values = {channel: self.serde.loads_typed(blob) for channel, blob in blobs.items() if blob[0] != "empty"}
+        if mapped:
+            values.update(self._conversation_values(thread_id, mapped, row["checkpoint_id"]))
+        
+        writes = sorted(
+            self.store.get_graph_checkpoint_writes(thread_id, checkpoint_ns, row["checkpoint_id"]),
+            key=lambda write: writes_sort_key(write[4], write[0], write[5])
+        )
+        return CheckpointTuple(
+            config=self._config(thread_id, checkpoint_ns, row["checkpoint_id"]),
+            checkpoint={**checkpoint, "channel_values": values},
+            metadata=self.serde.loads_typed(row["metadata"]),
+            parent_config=(
+                self._config(thread_id, checkpoint_ns, row["parent_checkpoint_id"])
+                if row["parent_checkpoint_id"] else None
+            ),
+            pending_writes=[
+                (task_id, channel, self.serde.loads_typed((value_type, value)))
+                for task_id, channel, value_type, value, _, _ in writes
+            ]
+        )
+    
+    def list(self, config: Optional[RunnableConfig], *, filter: Optional[Dict[str, Any]] = None,
+             before: Optional[RunnableConfig] = None, limit: Optional[int] = None) -> Iterator[CheckpointTuple]:
+        """Only the latest checkpoint of the config's conversation is kept, so that is all there is to list"""
+        if not config or limit == 0:
+            return
+        checkpoint_tuple = self.get_tuple(config)
+        if checkpoint_tuple is None:
+            return
+        if before and get_checkpoint_id(before) and checkpoint_tuple.checkpoint["id"] >= get_checkpoint_id(before):
+            return
+        if filter and any(checkpoint_tuple.metadata.get(key) != value for key, value in filter.items()):
+            return
+        yield checkpoint_tuple
+    
+    def put(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+            new_versions: ChannelVersions) -> RunnableConfig:
+        thread_id = int(config["configurable"]["thread_id"])
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        values = checkpoint["channel_values"]
+        stored = {key: value for key, value in checkpoint.items() if key != "channel_values"}
+        
+        blobs = []
+        conversation = {}
+        messages = None
+        for channel, version in new_versions.items():
+            if not checkpoint_ns and channel in CONVERSATION_CHANNELS and channel in values:
+                if channel == "messages":
+                    messages = values[channel]
+                else:
+                    conversation[channel] = values[channel]
+            else:
+                blob = self.serde.dumps_typed(values[channel]) if channel in values else ("empty", b"")
+                blobs.append((channel, str(version), *blob))
+        
+        # The messages channel holds the messages loaded for the turn plus the ones added since
+        stored_messages = None
+        if not checkpoint_ns:
+            loaded = self._stored_messages.pop(thread_id, None)
+            if loaded and loaded[0] == config["configurable"].get("checkpoint_id"):
+                stored_messages = loaded[1]
+                count = len(messages) if messages is not None else stored_messages
+                self._stored_messages[thread_id] = (checkpoint["id"], count)
+        
+        self.store.save_graph_checkpoint(
+            thread_id,
+            checkpoint_ns,
+            checkpoint["id"],
+            config["configurable"].get("checkpoint_id"),
+            self.serde.dumps_typed(stored),
+            self.serde.dumps_typed(get_checkpoint_metadata(config, metadata)),
+            blobs,
+            conversation=conversation,
+            messages=messages,
+            stored_messages=stored_messages
+        )
+        return self._config(thread_id, checkpoint_ns, checkpoint["id"])
+    
+    def put_writes(self, config: RunnableConfig, writes: Sequence[tuple], task_id: str, task_path: str = "") -> None:
+        thread_id = int(config["configurable"]["thread_id"])
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        rows = [
+            (task_id, task_path, WRITES_IDX_MAP.get(channel, idx), channel, *self.serde.dumps_typed(value))
+            for idx, (channel, value) in enumerate(writes)
+        ]
+        # Errors and interrupts replace an earlier write of the same kind, other writes are only saved once
+        replace = all(channel in WRITES_IDX_MAP for channel, _ in writes)
+        self.store.save_graph_checkpoint_writes(
+            thread_id, checkpoint_ns, config["configurable"]["checkpoint_id"], rows, replace=replace
+        )
+    
+    def delete_thread(self, thread_id: str) -> None:
+        self.store.delete_graph_checkpoints(int(thread_id))
+    
+    def get_next_version(self, current: Optional[str], channel: None) -> str:
+        """Versions sort as strings: a zero padded counter plus a random part"""
+        if current is None:
+            current_version = 0
+        elif isinstance(current, int):
+            current_version = current
+        else:
+            current_version = int(current.split(".")[0])
+        return f"{current_version + 1:032}.{random.random():016}"
+    
+    # The store is synchronous, the async versions run it on a worker thread
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.to_thread(self.get_tuple, config)
+    
+    async def alist(self, config: Optional[RunnableConfig], *, filter: Optional[Dict[str, Any]] = None,
+                    before: Optional[RunnableConfig] = None, limit: Optional[int] = None):
+        for checkpoint_tuple in await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        ):
+            yield checkpoint_tuple
+    
+    async def aput(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+                   new_versions: ChannelVersions) -> RunnableConfig:
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+    
+    async def aput_writes(self, config: RunnableConfig, writes: Sequence[tuple], task_id: str,
+                          task_path: str = "") -> None:
+        return await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+    
+    async def adelete_thread(self, thread_id: str) -> None:
+        return await asyncio.to_thread(self.delete_thread, thread_id)
+    
+    def _config(self, thread_id: int, checkpoint_ns: str, checkpoint_id: str) -> RunnableConfig:
+        return {"configurable": {"thread_id": str(thread_id), "checkpoint_ns": checkpoint_ns,
+                                 "checkpoint_id": checkpoint_id}}
+    
+    def _conversation_values(self, thread_id: int, channels: Sequence[str], checkpoint_id: str) -> Dict[str, Any]:
+        """Read the mapped state channels back from the conversation, with only the latest history_messages"""
+        conversation = self.store.get_conversation(thread_id) or {}
+        values = {channel: conversation[channel] for channel in channels
+                  if channel != "messages" and conversation.get(channel) is not None}
+        if "messages" in channels:
+            values["messages"] = self.store.get_conversation_messages(thread_id, limit=self.history_messages)
+            # So the next checkpoint only adds the messages after these
+            self._stored_messages[thread_id] = (checkpoint_id, len(values["messages"]))
+        return values
+    
+    def _initial_checkpoint(self, thread_id: int) -> Optional[CheckpointTuple]:
+        """A first checkpoint built from a conversation that has none yet"""
+        conversation = self.store.get_conversation(thread_id)
+        if conversation is None:
+            return None
+        
+        checkpoint = empty_checkpoint()
+        values = self._conversation_values(thread_id, CONVERSATION_CHANNELS, checkpoint["id"])
+        if conversation["ghl_customer_id"]:
+            values["customer_id"] = conversation["ghl_customer_id"]
+        checkpoint["channel_values"] = values
+        checkpoint["channel_versions"] = {channel: self.get_next_version(None, None) for channel in values}
+        return CheckpointTuple(
+            config=self._config(thread_id, "", checkpoint["id"]),
+            checkpoint=checkpoint,
+            metadata={"source": "input", "step": -1, "parents": {}},
+            parent_config=None,
+            pending_writes=[]
+        )
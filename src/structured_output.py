@@ -0,0 +1,46 @@
+import os
+from typing import Any, Dict, Optional
+from pydantic import BaseModel, Field
+
+# Ask the LLM for the reply and the extracted fields in one structured call (STRUCTURED_OUTPUT=true),
+# rather than a plain text reply
+STRUCTURED_OUTPUT = os.getenv("STRUCTURED_OUTPUT", "False").lower() == "true"
+
+class ExtractedFields(BaseModel):
+    """What the customer has told us so far, left empty when they haven't said"""
+    car_condition: Optional[str] = Field(None, description="How the customer describes the car's condition")
+    vehicle_make: Optional[str] = Field(None, description="Vehicle make, e.g. Toyota")
+    vehicle_model: Optional[str] = Field(None, description="Vehicle model, e.g. Tacoma")
+    vehicle_year: Optional[int] = Field(None, description="Vehicle model year, e.g. 2018")
+    address: Optional[str] = Field(None, description="Where the detailing should happen")
+    interested: Optional[bool] = Field(None, description="Whether the customer wants to go ahead with a detail")
+    preferred_time: Optional[str] = Field(None, description="When the customer would like the appointment")
+
+class AgentTurn(ExtractedFields):
+    """The SMS reply to send the customer, plus the fields extracted from the conversation"""
+    reply: str = Field(description="The SMS reply to send the customer")
+    
+    def context_updates(self) -> Dict[str, Any]:
+        """The extracted fields as conversation context keys, skipping the ones the LLM left empty"""
+        fields = self.model_dump(exclude={"reply"}, exclude_none=True)
+        updates = {}
+        if fields.get("car_condition"):
+            updates["has_car_condition"] = True
+            updates["car_condition_details"] = fields.pop("car_condition")
+        fields.pop("car_condition", None)
+        updates.update(fields)
+        return updates
+
+STRUCTURED_OUTPUT_INSTRUCTIONS = """
+Along with your reply, fill in any of the extraction fields the customer has told you about anywhere in the
+conversation. Leave a field empty if they haven't said."""
+
+def fallback_turn(raw: Any, fallback_reply: str) -> AgentTurn:
+    """
+    The turn to send when the function call couldn't be parsed: the message's own text if it has any,
+    otherwise fallback_reply, with nothing extracted
+    """
+    content = getattr(raw, "content", None)
+    if isinstance(content, str) and content.strip():
+        return AgentTurn(reply=content.strip())
+    return AgentTurn(reply=fallback_reply)
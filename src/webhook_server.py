@@ -1,12 +1,33 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 import json
+import logging
+import os
+import sys
 from datetime import datetime
 from typing import Dict, Any, Optional
-from database import SalesDatabase
-from agent import ConversationState, graph
+from database import create_store
+from agent import ConversationState, compile_checkpointed_graph
+from checkpointer import conversation_config
+
+# Shared code lives in common/ at the repo root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.fast_path import handle_fast_path
+from common.idempotency import WebhookDeduplicator, delivery_id
+from common.llm_resilience import request_deadline
+from common.metrics import CONTENT_TYPE, ERRORS, MESSAGES, WEBHOOK_LATENCY, render_metrics
+from common.structured_logging import configure_logging, get_logger, log_event, log_payload
 
 app = Flask(__name__)
-db = SalesDatabase()
+logger = get_logger(__name__)
+db = create_store()
+# Resumes each conversation from the store and writes back only what each step changes
+graph = compile_checkpointed_graph(db)
+# GHL retries slow webhooks, each message id is only answered once
+deliveries = WebhookDeduplicator(db, server='webhook_server')
+
+# Largest page the history endpoints will return, and rows read per query when exporting
+MAX_PAGE_SIZE = 500
+EXPORT_BATCH_SIZE = 500
 
 def extract_webhook_data(payload: Dict[str, Any]) -> Optional[Dict[str, str]]:
     """
@@ -16,13 +37,13 @@ def extract_webhook_data(payload: Dict[str, Any]) -> Optional[Dict[str, str]]:
         # Extract customer ID
         customer_id = payload.get('customerId')
         if not customer_id:
-            print("No customerId found in webhook payload")
+            log_event(logger, "webhook_missing_customer_id", logging.WARNING)
             return None
         
         # Extract SMS content
         message_content = payload.get('message', {}).get('content', '')
         if not message_content:
-            print("No message content found in webhook payload")
+            log_event(logger, "webhook_missing_message", logging.WARNING, customer_id=customer_id)
             return None
         
         # Extract pipeline stage (with fallback to default)
@@ -43,7 +64,7 @@ def extract_webhook_data(payload: Dict[str, Any]) -> Optional[Dict[str, str]]:
         }
     
     except Exception as e:
-        print(f"Error extracting webhook data: {e}")
+        log_event(logger, "webhook_extract_error", logging.ERROR, error=str(e))
         return None
 
 def process_sms_message(customer_id: str, message_content: str, pipeline_stage: str = "New Lead") -> Dict[str, Any]:
@@ -54,26 +75,24 @@ def process_sms_message(customer_id: str, message_content: str, pipeline_stage:
         # Get or create conversation with pipeline stage
         conversation_id = db.get_or_create_conversation(customer_id, pipeline_stage)
         
-        # Load existing state or create new one
-        current_state = db.load_conversation_state(conversation_id)
-        if not current_state:
-            # Only create new state if no existing conversation
-            current_state = ConversationState.create_new(
-                customer_id=customer_id,
-                pipeline_stage=pipeline_stage
-            )
-        
-        # Add the incoming message to context
-        current_state.context["current_message"] = message_content
-        
-        # Process through the graph - this will continue from current_node
-        result = graph.invoke(current_state)
-        
-        # Update state - the graph returns {"state": updated_state}
-        current_state = result["state"]
+        # STOP, thanks/ok and emoji-only messages are answered from templates (or not at all) without the agent
+        fast_path = handle_fast_path(db, customer_id, conversation_id, message_content)
+        if fast_path:
+            conversation = db.get_conversation(conversation_id)
+            return {
+                'success': True,
+                'conversation_id': conversation_id,
+                'ai_response': fast_path.reply or "",
+                'pipeline_stage': conversation['pipeline_stage'],
+                'current_node': conversation['current_node'],
+                'fast_path': fast_path.kind
+            }
         
-        # Save to database
-        db.save_conversation_state(conversation_id, current_state)
+        # Process through the graph - this will continue from current_node,
+        # checkpointing into the conversation, and returns the updated state's fields
+        current_state = ConversationState(**graph.invoke(
+            {"context": {"current_message": message_content}}, conversation_config(conversation_id)
+        ))
         
         # Get the AI response
         ai_response = ""
@@ -91,17 +110,20 @@ def process_sms_message(customer_id: str, message_content: str, pipeline_stage:
         }
     
     except Exception as e:
-        print(f"Error processing SMS message: {e}")
+        log_event(logger, "sms_processing_error", logging.ERROR, customer_id=customer_id, error=str(e))
         return {
             'success': False,
             'error': str(e)
         }
 
 @app.route('/webhook', methods=['POST'])
+@WEBHOOK_LATENCY.time(server='webhook_server')
+@request_deadline()  # LLM calls get what's left of the webhook's time budget
 def handle_sms_webhook():
     """
     Handle incoming SMS webhook from GoHighLevel
     """
+    message_id = None
     try:
         # Get the webhook payload
         payload = request.get_json()
@@ -109,7 +131,13 @@ def handle_sms_webhook():
         if not payload:
             return jsonify({'error': 'No payload received'}), 400
         
-        print(f"Received webhook payload: {json.dumps(payload, indent=2)}")
+        # A retry of a message we've already got, answered (or being answered) by the first delivery
+        message_id = delivery_id(payload)
+        if not deliveries.claim(message_id):
+            log_event(logger, "webhook_duplicate", message_id=message_id)
+            return jsonify({'success': True, 'duplicate': True})
+        
+        log_payload(logger, "webhook_received", payload)
         
         # Extract data from webhook
         webhook_data = extract_webhook_data(payload)
@@ -119,16 +147,21 @@ def handle_sms_webhook():
         customer_id = webhook_data['customer_id']
         message_content = webhook_data['message_content']
         pipeline_stage = webhook_data['pipeline_stage']
-        customer_name = webhook_data['customer_name']
         
-        print(f"Processing SMS from {customer_name}: {message_content}")
+        log_event(logger, "processing_sms", customer_id=customer_id, pipeline_stage=pipeline_stage,
+                  message=message_content)
+        MESSAGES.inc(direction='inbound')
         
         # Process the message through the sales agent
         result = process_sms_message(customer_id, message_content, pipeline_stage)
         
         if result['success']:
-            print(f"AI Response: {result['ai_response']}")
-            print(f"Pipeline Stage: {result['pipeline_stage']}")
+            if result['ai_response']:
+                MESSAGES.inc(direction='outbound')
+            log_event(logger, "sms_processed", customer_id=customer_id,
+                      conversation_id=result['conversation_id'], pipeline_stage=result['pipeline_stage'],
+                      current_node=result['current_node'], ai_response=result['ai_response'],
+                      fast_path=result.get('fast_path'))
             
             # Return success response
             return jsonify({
@@ -138,12 +171,23 @@ def handle_sms_webhook():
                 'pipeline_stage': result['pipeline_stage']
             })
         else:
+            ERRORS.inc(component='agent')
+            deliveries.release(message_id)
             return jsonify({'error': result['error']}), 500
     
     except Exception as e:
-        print(f"Error handling webhook: {e}")
+        log_event(logger, "webhook_error", logging.ERROR, error=str(e))
+        ERRORS.inc(component='webhook')
+        deliveries.release(message_id)
         return jsonify({'error': str(e)}), 500
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """
+    Prometheus metrics for this server
+    """
+    return Response(render_metrics(), content_type=CONTENT_TYPE)
+
 @app.route('/webhook/test', methods=['GET'])
 def test_webhook():
     """
@@ -155,20 +199,62 @@ def test_webhook():
         'timestamp': datetime.now().isoformat()
     })
 
+def get_page_args(default_limit: int):
+    """Read the cursor and limit query parameters, capping the page size"""
+    cursor = request.args.get('cursor', type=int)
+    limit = max(1, min(request.args.get('limit', default_limit, type=int), MAX_PAGE_SIZE))
+    return cursor, limit
+
 @app.route('/conversations/<customer_id>', methods=['GET'])
 def get_conversation_history(customer_id: str):
     """
-    Get conversation history for a customer
+    Get a page of conversation history for a customer, newest first.
+    Pass the returned next_cursor as ?cursor= to get the next page.
     """
     try:
-        history = db.get_conversation_history(customer_id)
+        cursor, limit = get_page_args(default_limit=50)
+        conversations = db.get_conversations_page(customer_id, before_id=cursor, limit=limit)
         return jsonify({
             'customer_id': customer_id,
-            'conversations': history
+            'conversations': conversations,
+            'next_cursor': conversations[-1]['id'] if len(conversations) == limit else None
         })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/conversations/<customer_id>/messages', methods=['GET'])
+def get_customer_messages(customer_id: str):
+    """
+    Get a page of a customer's messages, oldest first, optionally only from one conversation
+    (?conversation_id=). Pass the returned next_cursor as ?cursor= to get the next page.
+    """
+    try:
+        cursor, limit = get_page_args(default_limit=100)
+        conversation_ids = db.get_customer_conversation_ids(customer_id)
+        conversation_id = request.args.get('conversation_id', type=int)
+        if conversation_id is not None:
+            conversation_ids = [cid for cid in conversation_ids if cid == conversation_id]
+        
+        messages = db.get_messages_page(conversation_ids, after_id=cursor or 0, limit=limit)
+        return jsonify({
+            'customer_id': customer_id,
+            'messages': messages,
+            'next_cursor': messages[-1]['id'] if len(messages) == limit else None
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/conversations/<customer_id>/export', methods=['GET'])
+def export_customer_history(customer_id: str):
+    """
+    Stream a customer's full history as NDJSON: one line per conversation, each followed by its messages
+    """
+    def generate():
+        for record in db.iter_customer_history(customer_id, batch_size=EXPORT_BATCH_SIZE):
+            yield json.dumps(record) + '\n'
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
 @app.route('/stats', methods=['GET'])
 def get_stats():
     """
@@ -181,8 +267,11 @@ def get_stats():
         return jsonify({'error': str(e)}), 500
 
 if __name__ == '__main__':
+    configure_logging()
     print("Starting webhook server...")
     print("Webhook endpoint: http://localhost:5000/webhook")
     print("Test endpoint: http://localhost:5000/webhook/test")
     print("Stats endpoint: http://localhost:5000/stats")
+    print("History endpoints: http://localhost:5000/conversations/<customer_id>[/messages|/export]")
+    print("Metrics endpoint: http://localhost:5000/metrics")
     app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
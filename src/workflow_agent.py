@@ -1,10 +1,23 @@
 import json
 import os
+import sys
 from typing import Dict, Any, Optional
 from datetime import datetime
 from langchain_core.messages import HumanMessage, AIMessage
 from langchain_openai import ChatOpenAI
-from database import SalesDatabase
+from database import create_store
+from structured_output import STRUCTURED_OUTPUT, STRUCTURED_OUTPUT_INSTRUCTIONS, AgentTurn, fallback_turn
+
+# Shared code lives in common/ at the repo root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.extraction import SLOT_NAMES, describe_slots, extract_slots, merge_slots
+from common.fast_path import handle_fast_path
+from common.llm_resilience import FALLBACK_REPLY, LLM_TIMEOUT_SECONDS, LLMUnavailable, call_llm, call_priority
+from common.metrics import ERRORS
+from common.model_router import ModelChoice, choose_model, record_usage
+
+# Messages included in the prompt as conversation history
+HISTORY_MESSAGES = 5
 
 class WorkflowNode:
     def __init__(self, node_data: Dict[str, Any]):
@@ -19,17 +32,16 @@ class WorkflowNode:
         return self.model_options.get('newTemperature', 0.2)
 
 class WorkflowAgent:
-    def __init__(self, workflow_file: str):
+    def __init__(self, workflow_file: str, structured_output: bool = STRUCTURED_OUTPUT):
         self.workflow_file = workflow_file
+        # Get the reply and the customer's details from one structured LLM call
+        self.structured_output = structured_output
         self.nodes = {}
         self.edges = []
         self.global_config = {}
-        self.llm = ChatOpenAI(
-            model="gpt-3.5-turbo",
-            temperature=0.2,
-            api_key=os.getenv('OPENAI_API_KEY')
-        )
-        self.db = SalesDatabase()
+        # One client per model and temperature, picked for each turn by choose_model
+        self._llms = {}
+        self.db = create_store()
         self.load_workflow()
     
     def load_workflow(self):
@@ -51,6 +63,18 @@ class WorkflowAgent:
             if 'globalConfig' in node_data:
                 self.global_config = node_data['globalConfig']
     
+    def get_llm(self, choice: ModelChoice, temperature: float) -> ChatOpenAI:
+        """The client for a model, created the first time it's used"""
+        key = (choice.model, temperature)
+        if key not in self._llms:
+            self._llms[key] = ChatOpenAI(
+                model=choice.model,
+                temperature=temperature,
+                timeout=LLM_TIMEOUT_SECONDS,
+                api_key=os.getenv('OPENAI_API_KEY')
+            )
+        return self._llms[key]
+    
     def get_start_node(self) -> Optional[WorkflowNode]:
         """Find the start node"""
         for node in self.nodes.values():
@@ -94,7 +118,10 @@ class WorkflowAgent:
         return None
     
     def execute_node(self, node: WorkflowNode, context: Dict[str, Any], messages: list) -> str:
-        """Execute a workflow node and return the response"""
+        """
+        Execute a workflow node and return the response. In structured output mode the details
+        the LLM extracts along with the reply are added to context.
+        """
         
         if node.node_type == 'Webhook':
             # Webhook nodes typically just pass through
@@ -119,6 +146,7 @@ Current context:
 - Customer ID: {context.get('customer_id', 'Unknown')}
 - Pipeline Stage: {context.get('pipeline_stage', 'Unknown')}
 - Current Message: {context.get('current_message', '')}
+- Known Details: {describe_slots(context) or 'None yet'}
 
 Previous conversation:
 {self._format_conversation_history(messages)}
@@ -126,22 +154,53 @@ Previous conversation:
 Please respond to the customer's message.
 """
             
-            # Generate response
-            response = self.llm.invoke([
-                HumanMessage(content=full_prompt)
-            ])
+            # The node's modelOptions can pin a tier or model, otherwise it's picked from the message and stage
+            choice = choose_model(context.get('current_message', ''), node.name, context.get('pipeline_stage'),
+                                  node.model_options)
+            llm = self.get_llm(choice, node.get_temperature())
             
-            return response.content
+            try:
+                return self._generate(llm, choice, full_prompt, context,
+                                      call_priority(context.get('pipeline_stage'), node.name))
+            except LLMUnavailable as e:
+                # Out of time, or the provider is down: answer with the canned reply rather than an error
+                print(f"LLM unavailable, sending the fallback reply: {e}")
+                ERRORS.inc(component='llm')
+                return FALLBACK_REPLY
         
         return "Unknown node type"
     
+    def _generate(self, llm: ChatOpenAI, choice: ModelChoice, full_prompt: str, context: Dict[str, Any],
+                  priority: int) -> str:
+        """One LLM call for a node's reply, within the webhook's time budget (booking conversations first)"""
+        if self.structured_output:
+            # gpt-3.5-turbo has no JSON schema mode, the fields come back as a function call.
+            # The raw message is kept for its token usage.
+            structured_llm = llm.with_structured_output(AgentTurn, method="function_calling", include_raw=True)
+            result = call_llm(lambda: structured_llm.invoke([
+                HumanMessage(content=full_prompt + STRUCTURED_OUTPUT_INSTRUCTIONS)
+            ]), choice, priority=priority)
+            record_usage(choice, result["raw"])
+            if result["parsing_error"] or result["parsed"] is None:
+                # A malformed function call shouldn't fail the webhook (and have GHL retry the whole LLM call)
+                print(f"Couldn't parse the structured reply, sending it without extracted fields: {result['parsing_error']}")
+                ERRORS.inc(component='structured_output')
+                return fallback_turn(result["raw"], FALLBACK_REPLY).reply
+            context.update(result["parsed"].context_updates())
+            return result["parsed"].reply
+        
+        # Generate response
+        response = call_llm(lambda: llm.invoke([HumanMessage(content=full_prompt)]), choice, priority=priority)
+        record_usage(choice, response)
+        return response.content
+    
     def _format_conversation_history(self, messages: list) -> str:
         """Format conversation history for context"""
         if not messages:
             return "No previous conversation."
         
         formatted = []
-        for msg in messages[-5:]:  # Last 5 messages
+        for msg in messages[-HISTORY_MESSAGES:]:
             role = "Customer" if msg["role"] == "user" else "Agent"
             formatted.append(f"{role}: {msg['content']}")
         
@@ -153,8 +212,21 @@ Please respond to the customer's message.
         # Get or create conversation
         conversation_id = self.db.get_or_create_conversation(customer_id, pipeline_stage)
         
-        # Load existing state
-        existing_state = self.db.load_conversation_state(conversation_id)
+        # STOP, thanks/ok and emoji-only messages are answered from templates (or not at all) without the LLM
+        fast_path = handle_fast_path(self.db, customer_id, conversation_id, message)
+        if fast_path:
+            return {
+                'success': True,
+                'response': fast_path.reply or "",
+                'next_node': (self.db.get_conversation(conversation_id) or {}).get('current_node'),
+                'pipeline_stage': pipeline_stage,
+                'conversation_id': conversation_id,
+                'fast_path': fast_path.kind
+            }
+        
+        # Only the node it's at and the messages that go in the prompt are needed, not the whole history
+        conversation = self.db.get_conversation(conversation_id)
+        messages = self.db.get_conversation_messages(conversation_id, limit=HISTORY_MESSAGES)
         
         # Initialize context
         context = {
@@ -165,12 +237,15 @@ Please respond to the customer's message.
             'pipeline_status': pipeline_stage
         }
         
-        # Load or create messages
-        if existing_state:
-            messages = existing_state.messages
-            current_node_id = existing_state.current_node
-        else:
-            messages = []
+        # Slots extracted from earlier messages plus this one, so route conditions can use them
+        known_slots = {name: value for name, value in ((conversation or {}).get('context') or {}).items()
+                       if name in SLOT_NAMES}
+        context.update(known_slots)
+        context.update(merge_slots(known_slots, extract_slots(message)))
+        
+        # New conversations are created at the sales agent's first node, which isn't part of the workflow
+        current_node_id = conversation["current_node"] if conversation else None
+        if current_node_id not in self.nodes:
             current_node_id = None
         
         # Add current message
@@ -207,17 +282,10 @@ Please respond to the customer's message.
         next_node = self.get_next_node(current_node, context)
         next_node_id = next_node.id if next_node else None
         
-        # Save state
-        from agent import ConversationState
-        state = ConversationState(
-            customer_id=customer_id,
-            pipeline_stage=pipeline_stage,
-            current_node=next_node_id or current_node_id,
-            context=context,
-            messages=messages
-        )
-        
-        self.db.save_conversation_state(conversation_id, state)
+        # Save only what this message changed
+        self.db.add_message(conversation_id, "user", message)
+        self.db.add_message(conversation_id, "assistant", response)
+        self.db.update_conversation_state(conversation_id, pipeline_stage, next_node_id or current_node_id, context)
         
         return {
             'success': True,
@@ -1,11 +1,20 @@
-from flask import Flask, request, jsonify
-import json
+from flask import Flask, Response, request, jsonify
+import logging
 from datetime import datetime
 from typing import Dict, Any, Optional
 from workflow_agent import WorkflowAgent
 import os
+import sys
+
+# Shared code lives in common/ at the repo root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.idempotency import WebhookDeduplicator, delivery_id
+from common.llm_resilience import request_deadline
+from common.metrics import CONTENT_TYPE, ERRORS, MESSAGES, WEBHOOK_LATENCY, render_metrics
+from common.structured_logging import configure_logging, get_logger, log_event, log_payload
 
 app = Flask(__name__)
+logger = get_logger(__name__)
 
 # Initialize the workflow agent
 workflow_file = "WAXD Inbound Call - 36e52fcb-543b-40a2-a82e-bb8bd2407dc3.json"
@@ -16,6 +25,9 @@ else:
     workflow_agent = None
     print(f"❌ Workflow file {workflow_file} not found!")
 
+# GHL retries slow webhooks, each message id is only answered once
+deliveries = WebhookDeduplicator(workflow_agent.db if workflow_agent else None, server='workflow_webhook_server')
+
 def extract_webhook_data(payload: Dict[str, Any]) -> Optional[Dict[str, str]]:
     """
     Extract customer ID, SMS content, and pipeline stage from GoHighLevel webhook payload
@@ -24,13 +36,13 @@ def extract_webhook_data(payload: Dict[str, Any]) -> Optional[Dict[str, str]]:
         # Extract customer ID
         customer_id = payload.get('customerId')
         if not customer_id:
-            print("No customerId found in webhook payload")
+            log_event(logger, "webhook_missing_customer_id", logging.WARNING)
             return None
         
         # Extract SMS content
         message_content = payload.get('message', {}).get('content', '')
         if not message_content:
-            print("No message content found in webhook payload")
+            log_event(logger, "webhook_missing_message", logging.WARNING, customer_id=customer_id)
             return None
         
         # Extract pipeline stage (with fallback to default)
@@ -51,7 +63,7 @@ def extract_webhook_data(payload: Dict[str, Any]) -> Optional[Dict[str, str]]:
         }
     
     except Exception as e:
-        print(f"Error extracting webhook data: {e}")
+        log_event(logger, "webhook_extract_error", logging.ERROR, error=str(e))
         return None
 
 def process_sms_message(customer_id: str, message_content: str, pipeline_stage: str = "New Lead") -> Dict[str, Any]:
@@ -75,17 +87,20 @@ def process_sms_message(customer_id: str, message_content: str, pipeline_stage:
         return result
     
     except Exception as e:
-        print(f"Error processing SMS message: {e}")
+        log_event(logger, "sms_processing_error", logging.ERROR, customer_id=customer_id, error=str(e))
         return {
             'success': False,
             'error': str(e)
         }
 
 @app.route('/webhook', methods=['POST'])
+@WEBHOOK_LATENCY.time(server='workflow_webhook_server')
+@request_deadline()  # LLM calls get what's left of the webhook's time budget
 def handle_sms_webhook():
     """
     Handle incoming SMS webhook from GoHighLevel
     """
+    message_id = None
     try:
         # Get the webhook payload
         payload = request.get_json()
@@ -93,7 +108,13 @@ def handle_sms_webhook():
         if not payload:
             return jsonify({'error': 'No payload received'}), 400
         
-        print(f"Received webhook payload: {json.dumps(payload, indent=2)}")
+        # A retry of a message we've already got, answered (or being answered) by the first delivery
+        message_id = delivery_id(payload)
+        if not deliveries.claim(message_id):
+            log_event(logger, "webhook_duplicate", message_id=message_id)
+            return jsonify({'success': True, 'duplicate': True})
+        
+        log_payload(logger, "webhook_received", payload)
         
         # Extract data from webhook
         webhook_data = extract_webhook_data(payload)
@@ -103,17 +124,20 @@ def handle_sms_webhook():
         customer_id = webhook_data['customer_id']
         message_content = webhook_data['message_content']
         pipeline_stage = webhook_data['pipeline_stage']
-        customer_name = webhook_data['customer_name']
         
-        print(f"Processing SMS from {customer_name}: {message_content}")
+        log_event(logger, "processing_sms", customer_id=customer_id, pipeline_stage=pipeline_stage,
+                  message=message_content)
+        MESSAGES.inc(direction='inbound')
         
         # Process the message through the workflow agent
         result = process_sms_message(customer_id, message_content, pipeline_stage)
         
         if result['success']:
-            print(f"AI Response: {result['response']}")
-            print(f"Next Node: {result['next_node']}")
-            print(f"Pipeline Stage: {result['pipeline_stage']}")
+            if result['response']:
+                MESSAGES.inc(direction='outbound')
+            log_event(logger, "sms_processed", customer_id=customer_id,
+                      conversation_id=result['conversation_id'], pipeline_stage=result['pipeline_stage'],
+                      next_node=result['next_node'], ai_response=result['response'])
             
             # TODO: Send SMS response back via GoHighLevel
             # You can integrate with send_ghl_sms.py here
@@ -127,12 +151,23 @@ def handle_sms_webhook():
                 'pipeline_stage': result['pipeline_stage']
             })
         else:
+            ERRORS.inc(component='agent')
+            deliveries.release(message_id)
             return jsonify({'error': result['error']}), 500
     
     except Exception as e:
-        print(f"Error handling webhook: {e}")
+        log_event(logger, "webhook_error", logging.ERROR, error=str(e))
+        ERRORS.inc(component='webhook')
+        deliveries.release(message_id)
         return jsonify({'error': str(e)}), 500
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """
+    Prometheus metrics for this server
+    """
+    return Response(render_metrics(), content_type=CONTENT_TYPE)
+
 @app.route('/webhook/test', methods=['GET'])
 def test_webhook():
     """
@@ -190,11 +225,13 @@ def test_workflow():
         return jsonify({'error': str(e)}), 500
 
 if __name__ == '__main__':
+    configure_logging()
     print("Starting workflow webhook server...")
     print("Webhook endpoint: http://localhost:5001/webhook")
     print("Test endpoint: http://localhost:5001/webhook/test")
     print("Workflow status: http://localhost:5001/workflow/status")
     print("Workflow test: http://localhost:5001/workflow/test")
+    print("Metrics endpoint: http://localhost:5001/metrics")
     
     if workflow_agent:
         print("✅ Workflow agent initialized successfully")
@@ -0,0 +1,147 @@
+import os
+import sys
+from unittest import mock
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+
+import agent
+from agent import ConversationState, graph
+
+
+class FakeResponse:
+    content = "Thanks! What kind of shape is the car in?"
+
+
+def send(state, message):
+    """Run one inbound SMS through the graph, returning the new state and how many LLM calls it made"""
+    state.context["current_message"] = message
+    with mock.patch.object(agent.ChatOpenAI, 'invoke', return_value=FakeResponse()) as invoke:
+        new_state = ConversationState(**graph.invoke(state))
+    return new_state, invoke.call_count
+
+
+def test_one_llm_call_per_message(monkeypatch):
+    """Test each message gets one reply and the conversation resumes from current_node"""
+    monkeypatch.setenv('OPENAI_API_KEY', 'test')
+    state = ConversationState.create_new(customer_id='customer_1')
+
+    state, calls = send(state, "Hi")
+    assert calls == 1
+    assert state.current_node == "sales_node"
+    assert [m["role"] for m in state.messages] == ["user", "assistant"]
+
+    # Qualifies the customer: answered by sales, the next message goes to booking
+    state, calls = send(state, "yes the seats are really dirty, what's the price?")
+    assert calls == 1
+    assert state.current_node == "booking_node"
+    assert [m["role"] for m in state.messages] == ["user", "assistant"] * 2
+
+    state, calls = send(state, "Tuesday works")
+    assert calls == 1
+    assert state.current_node == "booking_node"
+    assert len(state.messages) == 6
+
+
+def test_resumes_from_stored_state(monkeypatch, tmp_path):
+    """Test a state loaded from the database resumes at its stored node"""
+    monkeypatch.setenv('OPENAI_API_KEY', 'test')
+    from database import SalesDatabase
+    db = SalesDatabase(str(tmp_path / 'sales_agent.db'))
+    conversation_id = db.get_or_create_conversation('customer_1')
+    db.update_conversation_state(conversation_id, 'New Lead', 'booking_node', {'has_car_condition': True})
+
+    state, calls = send(db.load_conversation_state(conversation_id), "Can you come Friday?")
+    assert calls == 1
+    assert state.current_node == "booking_node"
+
+
+def test_routes_on_extracted_slots(monkeypatch):
+    """Test qualification comes from the slots extracted from each message, not its length"""
+    monkeypatch.setenv('OPENAI_API_KEY', 'test')
+    state = ConversationState.create_new(customer_id='customer_1')
+
+    state, _ = send(state, "Hello there, I'd like to get a price please")
+    assert state.current_node == "sales_node"
+    assert state.context["has_car_condition"] is False
+
+    state, _ = send(state, "2019 tacoma, muddy from the weekend")
+    assert state.current_node == "sales_node"
+    assert state.context["vehicle_model"] == "Tacoma"
+    assert state.context["car_condition"] == ["mud"]
+
+    state, _ = send(state, "sounds good")
+    assert state.current_node == "booking_node"
+
+
+def test_structured_output(monkeypatch):
+    """Test one LLM call gives both the reply and the details it extracted, which qualify the customer"""
+    from langchain_core.messages import AIMessage
+    monkeypatch.setenv('OPENAI_API_KEY', 'test')
+    monkeypatch.setattr(agent, 'STRUCTURED_OUTPUT', True)
+    response = AIMessage(content="", tool_calls=[{
+        "name": "AgentTurn",
+        "id": "call_1",
+        "args": {
+            "reply": "Sounds great, where should we come to?",
+            "car_condition": "coffee all over the back seats",
+            "vehicle_make": "Honda",
+            "interested": True,
+            "preferred_time": "Saturday morning"
+        }
+    }])
+
+    state = ConversationState.create_new(customer_id='customer_1')
+    state.context["current_message"] = "My Honda has coffee all over the back seats, could you do Saturday morning?"
+    with mock.patch.object(agent.ChatOpenAI, 'invoke', return_value=response) as invoke:
+        state = ConversationState(**graph.invoke(state))
+
+    assert invoke.call_count == 1
+    assert state.messages[-1]["content"] == "Sounds great, where should we come to?"
+    assert state.current_node == "booking_node"
+    assert state.context["has_car_condition"] is True
+    assert state.context["car_condition_details"] == "coffee all over the back seats"
+    assert state.context["preferred_time"] == "Saturday morning"
+    assert "address" not in state.context
+
+
+def test_unparseable_structured_output(monkeypatch):
+    """Test a malformed function call gets the customer a reply instead of failing the webhook"""
+    from langchain_core.messages import AIMessage
+    from common.llm_resilience import FALLBACK_REPLY
+    from common.metrics import ERRORS
+    monkeypatch.setenv('OPENAI_API_KEY', 'test')
+    monkeypatch.setattr(agent, 'STRUCTURED_OUTPUT', True)
+    errors = ERRORS.labels(component='structured_output').value
+    malformed = AIMessage(content="", tool_calls=[{
+        "name": "AgentTurn",
+        "id": "call_1",
+        "args": {"reply": "Sounds great!", "vehicle_year": "sometime in the nineties"}
+    }])
+    plain_text = AIMessage(content="Sounds great, where should we come to?")
+
+    state = ConversationState.create_new(customer_id='customer_1')
+    for response in (malformed, plain_text):
+        state.context["current_message"] = "My Honda needs a clean"
+        with mock.patch.object(agent.ChatOpenAI, 'invoke', return_value=response):
+            state = ConversationState(**graph.invoke(state))
+
+    replies = [m["content"] for m in state.messages if m["role"] == "assistant"]
+    assert replies == [FALLBACK_REPLY, "Sounds great, where should we come to?"]
+    assert ERRORS.labels(component='structured_output').value == errors + 2
+    assert "vehicle_year" not in state.context
+
+
+def test_fallback_reply_when_llm_unavailable(monkeypatch):
+    """Test a failing provider gets the customer the canned reply, and then no more calls while the breaker is open"""
+    import common.llm_resilience as llm_resilience
+    monkeypatch.setenv('OPENAI_API_KEY', 'test')
+    monkeypatch.setattr(llm_resilience, 'OPENAI_BREAKER', llm_resilience.CircuitBreaker(failure_threshold=1))
+    state = ConversationState.create_new(customer_id='customer_1')
+
+    state.context["current_message"] = "Hi"
+    with mock.patch.object(agent.ChatOpenAI, 'invoke', side_effect=TimeoutError) as invoke:
+        state = ConversationState(**graph.invoke(state))
+        state.context["current_message"] = "Hello?"
+        state = ConversationState(**graph.invoke(state))
+
+    assert invoke.call_count == 1
+    assert [m["content"] for m in state.messages if m["role"] == "assistant"] == [llm_resilience.FALLBACK_REPLY] * 2
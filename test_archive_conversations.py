@@ -0,0 +1,64 @@
+import os
+import sqlite3
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+
+from database import SalesDatabase
+from archive_conversations import run_archival
+
+
+def age_conversation(db, conversation_id, days):
+    with sqlite3.connect(db.db_path) as conn:
+        conn.execute("UPDATE conversations SET last_updated = datetime('now', ?) WHERE id = ?",
+                     (f'-{days} days', conversation_id))
+
+
+def make_db(tmp_path):
+    db = SalesDatabase(str(tmp_path / 'sales_agent.db'), stats_cache_ttl=0)
+    old = db.get_or_create_conversation('customer_old', 'New Lead')
+    idle = db.get_or_create_conversation('customer_idle', 'New Lead')
+    recent = db.get_or_create_conversation('customer_recent', 'New Lead')
+    for conversation_id in (old, idle, recent):
+        for number in range(5):
+            db.add_message(conversation_id, 'user', f'message {number} ' + 'x' * 500)
+    age_conversation(db, old, 120)
+    age_conversation(db, idle, 45)
+    return db, old, idle, recent
+
+
+def test_archival(tmp_path):
+    """Test idle conversations close and only old closed ones lose their messages to the archive"""
+    db, old, idle, recent = make_db(tmp_path)
+
+    closed, archived = run_archival(db, idle_days=30, archive_days=90, vacuum='incremental', vacuum_pages=0)
+
+    assert closed == 2
+    assert archived == 5
+    assert db.get_conversation_stats()['active_conversations'] == 1
+    assert db.get_conversation_messages(old) == []
+    assert len(db.get_conversation_messages(idle)) == 5
+    assert len(db.get_conversation_messages(recent)) == 5
+
+    archived_messages = db.get_archived_messages(old)
+    assert [m['content'][:9] for m in archived_messages] == [f'message {n}' for n in range(5)]
+
+    # Archived messages still come out in the export
+    records = list(db.iter_customer_history('customer_old'))
+    assert len([r for r in records if r['type'] == 'message']) == 5
+
+    # Running it again has nothing left to do
+    assert run_archival(db, 30, 90, 'none', 0) == (0, 0)
+
+
+def test_full_vacuum_enables_incremental(tmp_path):
+    """Test a full vacuum switches an old database over to incremental vacuuming"""
+    db_path = str(tmp_path / 'sales_agent.db')
+    with sqlite3.connect(db_path) as conn:
+        conn.execute('CREATE TABLE legacy (id INTEGER)')
+    db = SalesDatabase(db_path)
+
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 0
+    db.vacuum(full=True)
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2
@@ -0,0 +1,114 @@
+import os
+import sqlite3
+import sys
+from unittest import mock
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+
+import agent
+from agent import compile_checkpointed_graph
+from checkpointer import conversation_config
+from database import SalesDatabase
+
+
+class FakeResponse:
+    content = "Great, when works for you?"
+
+
+def send(graph, conversation_id, message):
+    """Run one inbound SMS the way the webhook server does, returning the state and the LLM calls made"""
+    with mock.patch.object(agent.ChatOpenAI, 'invoke', return_value=FakeResponse()) as invoke:
+        state = graph.invoke({"context": {"current_message": message}}, conversation_config(conversation_id))
+    return state, invoke.call_args_list
+
+
+def table_rows(db, sql, params=()):
+    with sqlite3.connect(db.db_path) as conn:
+        return conn.execute(sql, params).fetchall()
+
+
+def test_conversation_resumes_from_checkpoints(monkeypatch, tmp_path):
+    """Test each message only adds its own rows and the next one picks up the saved state"""
+    monkeypatch.setenv('OPENAI_API_KEY', 'test')
+    db = SalesDatabase(str(tmp_path / 'sales_agent.db'))
+    conversation_id = db.get_or_create_conversation('customer_1', 'Qualified')
+
+    state, calls = send(compile_checkpointed_graph(db), conversation_id, "yes my seats are filthy, what's the price?")
+    assert len(calls) == 1
+    assert state['pipeline_stage'] == 'Qualified'
+    assert state['customer_id'] == 'customer_1'
+
+    conversation = db.get_conversation(conversation_id)
+    assert conversation['current_node'] == 'booking_node'
+    assert conversation['context']['has_car_condition'] is True
+    assert [m['role'] for m in db.get_conversation_messages(conversation_id)] == ['user', 'assistant']
+
+    # A restarted server resumes the conversation from the store
+    db = SalesDatabase(db.db_path)
+    state, calls = send(compile_checkpointed_graph(db), conversation_id, "Tuesday at 10?")
+    assert len(calls) == 1
+    assert state['current_node'] == 'booking_node'
+    assert "filthy" in calls[0].args[0][1].content  # earlier messages are in the prompt
+    assert [m['content'] for m in db.get_conversation_messages(conversation_id)] == [
+        "yes my seats are filthy, what's the price?", FakeResponse.content, "Tuesday at 10?", FakeResponse.content
+    ]
+
+    # Messages and conversation state are never stored again as checkpoint blobs
+    channels = {row[0] for row in table_rows(db, 'SELECT channel FROM graph_checkpoint_blobs')}
+    assert not channels & {'messages', 'context', 'current_node', 'pipeline_stage'}
+    # Only the latest version of each channel is kept
+    assert table_rows(db, 'SELECT COUNT(*) FROM graph_checkpoint_blobs')[0][0] == len(channels)
+
+
+def test_conversation_saved_before_checkpointing(monkeypatch, tmp_path):
+    """Test a conversation saved without checkpoints carries on from its stored state"""
+    monkeypatch.setenv('OPENAI_API_KEY', 'test')
+    db = SalesDatabase(str(tmp_path / 'sales_agent.db'))
+    conversation_id = db.get_or_create_conversation('customer_1', 'New Lead')
+    db.add_message(conversation_id, 'user', 'Hi, my truck is really muddy')
+    db.add_message(conversation_id, 'assistant', 'Sorry to hear that! Want a quote?')
+    db.update_conversation_state(conversation_id, 'New Lead', 'sales_node', {'has_car_condition': True})
+
+    state, calls = send(compile_checkpointed_graph(db), conversation_id, "yes please")
+    assert len(calls) == 1
+    assert state['current_node'] == 'booking_node'
+    assert len(db.get_conversation_messages(conversation_id)) == 4
+
+
+def test_messages_added_outside_the_graph(monkeypatch, tmp_path):
+    """Test messages stored without the graph (fast path replies) aren't stored again by the next checkpoint"""
+    monkeypatch.setenv('OPENAI_API_KEY', 'test')
+    db = SalesDatabase(str(tmp_path / 'sales_agent.db'))
+    graph = compile_checkpointed_graph(db)
+    conversation_id = db.get_or_create_conversation('customer_1')
+
+    send(graph, conversation_id, "Hi")
+    db.add_message(conversation_id, 'user', 'thanks!')
+    db.add_message(conversation_id, 'assistant', "You're welcome!")
+    send(graph, conversation_id, "my car is really dirty")
+    assert [m['content'] for m in db.get_conversation_messages(conversation_id)] == [
+        "Hi", FakeResponse.content, "thanks!", "You're welcome!", "my car is really dirty", FakeResponse.content
+    ]
+
+
+def test_only_recent_messages_loaded(monkeypatch, tmp_path):
+    """Test a turn loads only the messages the prompt uses, and still adds just its own to the conversation"""
+    monkeypatch.setenv('OPENAI_API_KEY', 'test')
+    db = SalesDatabase(str(tmp_path / 'sales_agent.db'))
+    graph = compile_checkpointed_graph(db)
+    conversation_id = db.get_or_create_conversation('customer_1')
+
+    send(graph, conversation_id, "Hi")
+    for i in range(10):
+        db.add_message(conversation_id, 'user', f'message {i}')
+
+    with mock.patch.object(db, 'get_conversation_messages', wraps=db.get_conversation_messages) as loaded:
+        state, calls = send(graph, conversation_id, "Tuesday at 10?")
+    assert {call.kwargs.get('limit') for call in loaded.call_args_list} == {agent.HISTORY_MESSAGES}
+    assert len(state['messages']) == agent.HISTORY_MESSAGES + 2
+    assert "message 9" in calls[0].args[0][1].content
+
+    send(graph, conversation_id, "See you then")
+    contents = [m['content'] for m in db.get_conversation_messages(conversation_id)]
+    assert contents == ["Hi", FakeResponse.content] + [f'message {i}' for i in range(10)] + [
+        "Tuesday at 10?", FakeResponse.content, "See you then", FakeResponse.content
+    ]
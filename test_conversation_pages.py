@@ -0,0 +1,62 @@
+import os
+import sqlite3
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+
+from database import SalesDatabase
+
+
+def make_history(tmp_path):
+    db = SalesDatabase(str(tmp_path / 'sales_agent.db'))
+    conversation_ids = []
+    for index in range(3):
+        conversation_id = db.get_or_create_conversation('customer_1', 'New Lead')
+        for number in range(4):
+            db.add_message(conversation_id, 'user', f'conversation {index} message {number}')
+        db.update_conversation_state(conversation_id, 'New Lead', 'sales_node', {})
+        # Close it so the next call starts a new conversation
+        with sqlite3.connect(db.db_path) as conn:
+            conn.execute('UPDATE conversations SET is_active = 0 WHERE id = ?', (conversation_id,))
+        conversation_ids.append(conversation_id)
+    db.get_or_create_conversation('customer_2', 'New Lead')
+    return db, conversation_ids
+
+
+def test_conversation_pages(tmp_path):
+    """Test conversations page newest first without repeats or gaps"""
+    db, conversation_ids = make_history(tmp_path)
+
+    first_page = db.get_conversations_page('customer_1', limit=2)
+    second_page = db.get_conversations_page('customer_1', before_id=first_page[-1]['id'], limit=2)
+
+    assert [c['id'] for c in first_page + second_page] == list(reversed(conversation_ids))
+    assert len(second_page) == 1
+
+
+def test_message_pages(tmp_path):
+    """Test messages page oldest first across a customer's conversations"""
+    db, conversation_ids = make_history(tmp_path)
+
+    seen = []
+    after_id = 0
+    while True:
+        page = db.get_messages_page(conversation_ids, after_id=after_id, limit=5)
+        seen.extend(page)
+        if len(page) < 5:
+            break
+        after_id = page[-1]['id']
+
+    assert len(seen) == 12
+    assert [m['id'] for m in seen] == sorted(m['id'] for m in seen)
+    assert db.get_messages_page([], after_id=0) == []
+
+
+def test_history_export(tmp_path):
+    """Test the export yields every conversation followed by its messages, in small batches"""
+    db, conversation_ids = make_history(tmp_path)
+
+    records = list(db.iter_customer_history('customer_1', batch_size=2))
+
+    assert [r['id'] for r in records if r['type'] == 'conversation'] == list(reversed(conversation_ids))
+    assert len([r for r in records if r['type'] == 'message']) == 12
+    assert records[1]['conversation_id'] == conversation_ids[-1]
@@ -0,0 +1,111 @@
+import os
+import sqlite3
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+
+from database import SalesDatabase
+
+
+def count_stats(db_path):
+    """The stats as the old full-table queries worked them out"""
+    with sqlite3.connect(db_path) as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT COUNT(*) FROM conversations WHERE is_active = 1')
+        active = cursor.fetchone()[0]
+        cursor.execute('SELECT COUNT(*) FROM conversations')
+        total = cursor.fetchone()[0]
+        cursor.execute('SELECT COUNT(DISTINCT ghl_customer_id) FROM conversations')
+        unique = cursor.fetchone()[0]
+        cursor.execute('''
+            SELECT pipeline_stage, COUNT(*) FROM conversations
+            WHERE is_active = 1 AND pipeline_stage IS NOT NULL
+            GROUP BY pipeline_stage
+        ''')
+        return {
+            "unique_customers": unique,
+            "active_conversations": active,
+            "total_conversations": total,
+            "pipeline_breakdown": dict(cursor.fetchall())
+        }
+
+
+def test_stats_follow_writes(tmp_path):
+    """Test the trigger-maintained counters match a full recount after inserts, updates and deletes"""
+    db_path = str(tmp_path / 'sales_agent.db')
+    db = SalesDatabase(db_path, stats_cache_ttl=0)
+
+    first = db.get_or_create_conversation('customer_1', 'New Lead')
+    db.get_or_create_conversation('customer_2', 'New Lead')
+    db.get_or_create_conversation('customer_3', 'Quoted')
+    db.update_conversation_state(first, 'Booked', 'booking_node', {})
+
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("UPDATE conversations SET is_active = 0 WHERE ghl_customer_id = 'customer_2'")
+    db.get_or_create_conversation('customer_2', 'Follow-up')
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("DELETE FROM conversations WHERE ghl_customer_id = 'customer_3'")
+
+    stats = db.get_conversation_stats()
+    assert stats == count_stats(db_path)
+    assert stats['unique_customers'] == 2
+    assert stats['total_conversations'] == 3
+    assert stats['pipeline_breakdown'] == {'Booked': 1, 'Follow-up': 1}
+
+
+def test_stats_skip_missing_pipeline_stage(tmp_path):
+    """Test conversations without a pipeline stage aren't counted in the breakdown, as in a full recount"""
+    db_path = str(tmp_path / 'sales_agent.db')
+    db = SalesDatabase(db_path, stats_cache_ttl=0)
+
+    db.get_or_create_conversation('customer_1', None)
+    db.get_or_create_conversation('customer_2', None)
+    first = db.get_or_create_conversation('customer_3', 'New Lead')
+    db.update_conversation_state(first, None, 'sales_node', {})
+
+    stats = db.get_conversation_stats()
+    assert stats == count_stats(db_path)
+    assert stats['pipeline_breakdown'] == {}
+    assert stats['active_conversations'] == 3
+
+
+def test_unchanged_stage_leaves_stats_alone(tmp_path):
+    """Test writing back the same pipeline stage every turn doesn't rewrite the counter rows"""
+    db_path = str(tmp_path / 'sales_agent.db')
+    db = SalesDatabase(db_path, stats_cache_ttl=0)
+    db.get_or_create_conversation('customer_1', 'New Lead')
+
+    with sqlite3.connect(db_path) as conn:
+        before = conn.total_changes
+        conn.execute("UPDATE conversations SET pipeline_stage = 'New Lead', is_active = 1")
+        # Only the conversation row itself, no trigger writes
+        assert conn.total_changes - before == 1
+
+        before = conn.total_changes
+        conn.execute("UPDATE conversations SET pipeline_stage = 'Quoted'")
+        assert conn.total_changes - before > 1
+
+    assert db.get_conversation_stats() == count_stats(db_path)
+
+
+def test_stats_backfilled_for_existing_database(tmp_path):
+    """Test a database created before the counters existed gets counted once on startup"""
+    db_path = str(tmp_path / 'sales_agent.db')
+    SalesDatabase(db_path).get_or_create_conversation('customer_1', 'New Lead')
+    with sqlite3.connect(db_path) as conn:
+        conn.execute('DROP TABLE conversation_stats')
+        conn.execute('DROP TABLE pipeline_stage_stats')
+
+    db = SalesDatabase(db_path, stats_cache_ttl=0)
+    assert db.get_conversation_stats() == count_stats(db_path)
+
+
+def test_stats_cache(tmp_path):
+    """Test stats are reused until the cache expires"""
+    db = SalesDatabase(str(tmp_path / 'sales_agent.db'), stats_cache_ttl=60)
+    assert db.get_conversation_stats()['total_conversations'] == 0
+
+    db.get_or_create_conversation('customer_1', 'New Lead')
+    assert db.get_conversation_stats()['total_conversations'] == 0
+
+    db._stats_cache = None
+    assert db.get_conversation_stats()['total_conversations'] == 1
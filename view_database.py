@@ -11,6 +11,9 @@ import os
 
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
+# Messages read per query when showing a conversation
+MESSAGE_PAGE_SIZE = 200
+
 def view_database(db_path="sales_agent.db"):
     """View database contents in a readable format"""
     
@@ -41,7 +44,7 @@ def view_database(db_path="sales_agent.db"):
         SELECT id, ghl_customer_id, pipeline_stage, 
                current_node, created_date, last_updated, is_active
         FROM conversations
-        ORDER BY created_date DESC
+        ORDER BY id DESC
         LIMIT 10
     """)
     
@@ -61,7 +64,7 @@ def view_database(db_path="sales_agent.db"):
                SUBSTR(m.content, 1, 50) || '...' as content_preview,
                m.timestamp
         FROM messages m
-        ORDER BY m.timestamp DESC
+        ORDER BY m.id DESC
         LIMIT 10
     """)
     
@@ -178,24 +181,34 @@ def view_conversation_details(db_path="sales_agent.db", conversation_id=None):
         except:
             print(f"Context: {context_json}")
     
-    # Get messages
-    cursor.execute("""
-        SELECT role, content, timestamp
-        FROM messages
-        WHERE conversation_id = ?
-        ORDER BY timestamp
-    """, (conversation_id,))
-    
-    messages = cursor.fetchall()
-    
-    print(f"\n💬 MESSAGES ({len(messages)} total)")
+    print(f"\n💬 MESSAGES")
     print("-" * 60)
     
-    for i, (role, content, timestamp) in enumerate(messages, 1):
-        role_icon = "👤" if role == "user" else "🤖"
-        print(f"{i}. {role_icon} {role.upper()} ({timestamp})")
-        print(f"   {content}")
-        print()
+    # Page through the messages by id so long conversations aren't loaded all at once
+    i = 0
+    last_id = 0
+    while True:
+        cursor.execute("""
+            SELECT id, role, content, timestamp
+            FROM messages
+            WHERE conversation_id = ? AND id > ?
+            ORDER BY id
+            LIMIT ?
+        """, (conversation_id, last_id, MESSAGE_PAGE_SIZE))
+        
+        messages = cursor.fetchall()
+        for message_id, role, content, timestamp in messages:
+            i += 1
+            role_icon = "👤" if role == "user" else "🤖"
+            print(f"{i}. {role_icon} {role.upper()} ({timestamp})")
+            print(f"   {content}")
+            print()
+        
+        if len(messages) < MESSAGE_PAGE_SIZE:
+            break
+        last_id = messages[-1][0]
+    
+    print(f"({i} messages total)")
     
     conn.close()
 